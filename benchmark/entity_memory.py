@@ -0,0 +1,79 @@
+"""
+Memory used by the game entities.
+Run from the root of the project: python -m benchmark.entity_memory [count] [--with-graphics]
+For each kind of entity, create count instances and report the memory allocated per instance (tracemalloc).
+With --with-graphics, the graphical component (EntitySprite) of each instance is also created and reported.
+"""
+import gc
+import os
+import sys
+import tracemalloc
+
+import pygame as pg
+
+from shared import GLOBAL
+from entity.building_deco import MuralLamp
+from entity.door import Door
+from entity.livingentities import FriendlyEntity, FighterEntity
+from entity.town import Town
+from utilities import MName
+
+ENTITY_FACTORIES = {
+    "FriendlyEntity": lambda i: FriendlyEntity("Friendly {}".format(i), (i % 100, i // 100)),
+    "FighterEntity": lambda i: FighterEntity(MName.person_name(), (i % 100, i // 100)),
+    "Door": lambda i: Door((i % 100, i // 100), "H"),
+    "MuralLamp": lambda i: MuralLamp((i % 100, i // 100)),
+    "Town": lambda i: Town(name="Town {}".format(i), pos=(i % 100, i // 100)),
+}
+
+
+def measure(factory, count, with_graphics=False):
+    """
+    :param factory: function creating the entity number i
+    :param count: the number of entities to create
+    :param with_graphics: if set, the graphical component of the entities is created as well
+    :return: a tuple (bytes per entity, bytes per graphical component or None)
+    """
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    entities = [factory(i) for i in range(count)]
+    after_entities, _ = tracemalloc.get_traced_memory()
+    graphics_size = None
+    if with_graphics:
+        group = pg.sprite.Group()
+        for entity in entities:
+            entity.attach_graphics(group)
+        after_graphics, _ = tracemalloc.get_traced_memory()
+        graphics_size = (after_graphics - after_entities) / count
+    tracemalloc.stop()
+    return (after_entities - start) / count, graphics_size
+
+
+def init_graphics():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pg.display.init()
+    pg.display.set_mode((1, 1))
+    GLOBAL.load_images()
+
+
+def main(args):
+    count = 1000
+    with_graphics = "--with-graphics" in args
+    numbers = [arg for arg in args if arg.isdigit()]
+    if numbers:
+        count = int(numbers[0])
+    if with_graphics:
+        init_graphics()
+
+    print("{} instances per entity type".format(count))
+    for name, factory in ENTITY_FACTORIES.items():
+        entity_size, graphics_size = measure(factory, count, with_graphics=with_graphics)
+        line = "{:<16} {:>8.0f} bytes/entity".format(name, entity_size)
+        if graphics_size is not None:
+            line += " {:>8.0f} bytes/graphics".format(graphics_size)
+        print(line)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,239 @@
+"""
+Save and load benchmark.
+Run from the root of the project:
+    python -m benchmark.save_benchmark [--towns 2,6,12] [--dimensions 81x121] [--friendly 20] [--seed 3]
+                                       [--output report.json] [--compare previous_report.json]
+For each combination of the parameters, a world is generated (without window), then saved and loaded in each format:
+- legacy: the whole world and the player pickled at once (with dill if installed), as the game used to do
+- records: one full record per region (see save.regionrecord)
+- seeded: the regions made by the RegionFactory saved as their seed and changes
+The time and the peak of memory allocated (tracemalloc, measured in a second run) of each step go to a JSON report.
+With --compare, the report is compared to a previous one, and the steps that got slower or bigger are listed.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame as pg
+
+from benchmark.save_roundtrip import create_game, directory_size, init_headless
+import default
+import main as game_main
+from save.savegame import SaveGame
+
+try:
+    import dill as legacy_pickle
+except ImportError:
+    legacy_pickle = pickle
+
+FORMATS = ("legacy", "records", "seeded")
+TOLERANCE = 0.2  # A step is reported as a regression when it is more than 20% slower or bigger
+OUTPUT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")  # Not versioned
+
+
+def timed(function):
+    """
+    :return: the result of the function, and the time it took (seconds)
+    """
+    start = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start
+
+
+def traced(function):
+    """
+    :return: the result of the function, and the peak of memory allocated while it ran (bytes)
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+def measure(steps):
+    """
+    Run the steps twice: once for the time, once for the memory (tracing slows everything down)
+    :param steps: function taking a measure function (timed or traced), running the steps with it and returning a
+    dictionary step -> value, plus the key "result" for anything to keep from the run
+    :return: the result of the first run, and a dictionary step -> {"seconds": ..., "peak_bytes": ...}
+    """
+    times = steps(timed)
+    peaks = steps(traced)
+    result = times.pop("result", None)
+    peaks.pop("result", None)
+    return result, {step: {"seconds": round(times[step], 6), "peak_bytes": peaks[step]} for step in times}
+
+
+def legacy_steps(game, directory):
+    def steps(measure_function):
+        path = os.path.join(directory, "legacy.sav")
+        content = {"world": {name: game.world[name] for name in game.world},
+                   "player": game.player,
+                   "current_region": game.current_region.name}
+
+        def save():
+            with open(path, "wb") as f:
+                legacy_pickle.dump(content, f)
+
+        def load():
+            with open(path, "rb") as f:
+                return legacy_pickle.load(f)
+
+        _, save_value = measure_function(save)
+        _, load_value = measure_function(load)
+        return {"save": save_value, "load": load_value, "result": os.path.getsize(path)}
+    return steps
+
+
+def record_steps(game, directory, seeded):
+    def steps(measure_function):
+        save = SaveGame(tempfile.mkdtemp(dir=directory), seeded=seeded)
+        _, save_value = measure_function(lambda: save.save(game))
+        size = directory_size(save.directory)
+        # Saving again to the same directory: only the current region is written
+        _, resave_value = measure_function(lambda: save.save(game))
+
+        loaded = game_main.Game()
+        loaded.post_init()
+        _, load_value = measure_function(lambda: save.load(loaded))
+        region = loaded.current_region
+        _, first_frame_value = measure_function(lambda: (region.background, region.all_groups))
+        _, other_regions_value = measure_function(lambda: [loaded.world[name] for name in loaded.world])
+        return {"save": save_value, "resave": resave_value, "load": load_value, "first_frame": first_frame_value,
+                "other_regions": other_regions_value, "result": size}
+    return steps
+
+
+def run_scenario(town_count, dimension, friendly_count, seed):
+    """
+    :return: the report of the scenario
+    """
+    report = {"name": "towns={} dimension={}x{} friendly={}".format(town_count, dimension[0], dimension[1],
+                                                                    friendly_count),
+              "towns": town_count,
+              "dimension": list(dimension),
+              "friendly": friendly_count,
+              "seed": seed}
+
+    def generation_steps(measure_function):
+        game, value = measure_function(lambda: create_game(seed, town_count=town_count, dimension=dimension,
+                                                           friendly_count=friendly_count))
+        return {"generation": value, "result": game}
+    game, steps = measure(generation_steps)
+    report.update(steps)
+    report["regions"] = len(game.world)
+    report["entities"] = sum(len(game.world[name].region_entities) for name in game.world)
+
+    report["formats"] = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for save_format in FORMATS:
+            if save_format == "legacy":
+                size, steps = measure(legacy_steps(game, directory))
+            else:
+                size, steps = measure(record_steps(game, directory, seeded=(save_format == "seeded")))
+            steps["bytes"] = size
+            report["formats"][save_format] = steps
+    return report
+
+
+def print_report(report):
+    for scenario in report["scenarios"]:
+        print("{} ({} regions, {} entities): generation {:.0f} ms".format(
+            scenario["name"], scenario["regions"], scenario["entities"], scenario["generation"]["seconds"] * 1000))
+        for save_format, steps in scenario["formats"].items():
+            line = "    {:<8} {:>9} bytes".format(save_format, steps["bytes"])
+            for step, values in steps.items():
+                if step != "bytes":
+                    line += "  {} {:.1f} ms/{:.0f} KB".format(step, values["seconds"] * 1000,
+                                                             values["peak_bytes"] / 1024)
+            print(line)
+
+
+def compare(report, previous, tolerance=TOLERANCE):
+    """
+    :return: the list of regressions, as text: the values more than tolerance above the previous report
+    """
+    regressions = []
+    previous_scenarios = {scenario["name"]: scenario for scenario in previous["scenarios"]}
+    for scenario in report["scenarios"]:
+        old_scenario = previous_scenarios.get(scenario["name"])
+        if old_scenario is None:
+            continue
+        values = [("generation", "seconds", scenario["generation"]["seconds"],
+                   old_scenario["generation"]["seconds"])]
+        for save_format, steps in scenario["formats"].items():
+            old_steps = old_scenario["formats"].get(save_format)
+            if old_steps is None:
+                continue
+            values.append((save_format, "bytes", steps["bytes"], old_steps["bytes"]))
+            for step, step_values in steps.items():
+                if step != "bytes" and step in old_steps:
+                    for unit in ("seconds", "peak_bytes"):
+                        values.append(("{} {}".format(save_format, step), unit, step_values[unit],
+                                       old_steps[step][unit]))
+        for label, unit, value, old_value in values:
+            if old_value and value > old_value * (1 + tolerance):
+                regressions.append("{}: {} {} {} -> {} (x{:.2f})".format(scenario["name"], label, unit, old_value,
+                                                                        value, value / old_value))
+    return regressions
+
+
+def parse_arguments(args):
+    parser = argparse.ArgumentParser(description="Save and load benchmark")
+    parser.add_argument("--towns", default="2,6,12", help="numbers of towns, comma separated")
+    parser.add_argument("--dimensions", default="81x121", help="wilderness dimensions (odd), comma separated")
+    parser.add_argument("--friendly", default="20", help="numbers of friendly entities, comma separated")
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", default=os.path.join(OUTPUT_DIRECTORY, "save_benchmark.json"),
+                        help="the JSON report to write (default in benchmark/output)")
+    parser.add_argument("--compare", default=None, help="a previous JSON report to compare with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    return parser.parse_args(args)
+
+
+def main(args):
+    arguments = parse_arguments(args)
+    init_headless()
+    report = {"game_version": default.GAME_VER,
+              "python": platform.python_version(),
+              "pygame": pg.version.ver,
+              "legacy_pickler": legacy_pickle.__name__,
+              "date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "scenarios": []}
+    for dimension in arguments.dimensions.split(","):
+        dimension = tuple(int(value) for value in dimension.split("x"))
+        for friendly_count in arguments.friendly.split(","):
+            for town_count in arguments.towns.split(","):
+                report["scenarios"].append(run_scenario(int(town_count), dimension, int(friendly_count),
+                                                        arguments.seed))
+
+    print_report(report)
+    output_directory = os.path.dirname(arguments.output)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    with open(arguments.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Report written to {}".format(arguments.output))
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as f:
+            regressions = compare(report, json.load(f), tolerance=arguments.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if not regressions:
+            print("No regression compared to {}".format(arguments.compare))
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
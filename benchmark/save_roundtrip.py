@@ -0,0 +1,128 @@
+"""
+Save and load of a generated world.
+Run from the root of the project: python -m benchmark.save_roundtrip [seed]
+Generate a world, save it in a temporary directory and load it back, then check that the loaded world is identical
+to the original one (tiles, entities, references between regions). This is done with full records, then with seeded
+records (regions generated again on load). Sizes and times are compared with a plain pickle of all the regions.
+"""
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+import pygame as pg
+
+import main as game_main
+from entity.player import Player
+from region.region import RegionFactory
+from region.world import generate_world
+from shared import GLOBAL
+from save.savegame import SaveGame
+
+
+def init_headless():
+    """
+    Initialize pygame without a window, and load the images and fonts
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    game_main.Launcher.init_pygame_subsystem()
+    game_main.Launcher.load_data()
+    game_main.Style.set_style()
+
+
+def create_game(seed, town_count=None, dimension=(81, 121), friendly_count=RegionFactory.FRIENDLY_COUNT):
+    """
+    Create a game and generate its world (init_headless must have been called)
+    :param seed: the random seed
+    :param town_count: the number of towns, see generate_world
+    :param dimension: the dimension of the wilderness
+    :param friendly_count: the number of friendly entities in the wilderness
+    :return: the game
+    """
+    random.seed(seed)
+    GLOBAL.game = game_main.Game()
+    GLOBAL.game.post_init()
+    GLOBAL.game.player = Player(player_dict={"Name": "Benchmark", "Gender": "Male", "Race": "Human",
+                                             "Strength": 10, "Charisma": 10, "Friendship": 10, "Erudition": 10})
+    wilderness, player_position = generate_world(GLOBAL.game.world, town_count=town_count, dimension=dimension,
+                                                 friendly_count=friendly_count)
+    GLOBAL.game.current_region = wilderness
+    GLOBAL.game.player.assign_entity_to_region(wilderness)
+    (GLOBAL.game.player.x, GLOBAL.game.player.y) = player_position
+    return GLOBAL.game
+
+
+def tile_signature(region):
+    return [[(tile.tile_type, tile.tile_subtype, tile.explored) for tile in column] for column in region.tiles]
+
+
+def entity_signature(region):
+    return sorted((entity.uid, entity.pos, entity.name, type(entity).__name__) for entity in region.region_entities)
+
+
+def check_identical(original, loaded):
+    """
+    Raise an AssertionError if the loaded game differs from the original one
+    """
+    assert set(original.world) == set(loaded.world), "Regions differ"
+    assert loaded.player.name == original.player.name and loaded.player.pos == original.player.pos, "Player differs"
+    assert loaded.player.region is loaded.current_region, "Player not in the current region"
+    for name in original.world:
+        region, loaded_region = original.world[name], loaded.world[name]
+        assert tile_signature(region) == tile_signature(loaded_region), "Tiles differ in {}".format(name)
+        assert entity_signature(region) == entity_signature(loaded_region), "Entities differ in {}".format(name)
+        for entity in loaded_region.region_entities:
+            assert entity.region is loaded_region, "{} does not refer to its region".format(entity.name)
+        town = getattr(loaded_region, "town", None)
+        if town is not None:
+            assert town in loaded.world[town.wilderness_index].region_entities, "Town of {} lost".format(name)
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, file_name)) for file_name in os.listdir(directory))
+
+
+def main(args):
+    seed = int(args[0]) if args else 3
+    init_headless()
+    game = create_game(seed)
+    print("World of {} regions".format(len(game.world)))
+
+    start = time.perf_counter()
+    plain = pickle.dumps([game.world[name] for name in game.world], protocol=pickle.HIGHEST_PROTOCOL)
+    plain_save = time.perf_counter() - start
+    start = time.perf_counter()
+    pickle.loads(plain)
+    plain_load = time.perf_counter() - start
+
+    results = [("pickle", len(plain), plain_save, plain_load)]
+    for label, seeded in (("records", False), ("seeded", True)):
+        with tempfile.TemporaryDirectory() as directory:
+            save = SaveGame(directory, seeded=seeded)
+            start = time.perf_counter()
+            save.save(game)
+            record_save = time.perf_counter() - start
+            record_size = directory_size(directory)
+
+            loaded = game_main.Game()
+            loaded.post_init()
+            start = time.perf_counter()
+            save.load(loaded)
+            record_load = time.perf_counter() - start
+
+            # The regions other than the current one are only read now, when accessed
+            check_identical(game, loaded)
+        results.append((label, record_size, record_save, record_load))
+
+    print("{:<8} {:>10} {:>10} {:>10}".format("", "bytes", "save ms", "load ms"))
+    for label, size, save_time, load_time in results:
+        print("{:<8} {:>10} {:>10.1f} {:>10.1f}".format(label, size, save_time * 1000, load_time * 1000))
+    print("Round trips identical")
+    pg.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
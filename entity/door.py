@@ -3,6 +3,8 @@ from entity.gameentity import GameEntity, ActionableEntity
 
 class Door(GameEntity):
 
+    __slots__ = ("closed",)
+
     def __init__(self, position, door_type, closed=True):
         assert door_type in ("H", "V"), "Door type must be H or V and was found {}".format(door_type)
 
@@ -13,16 +15,30 @@ class Door(GameEntity):
             image_ref += "_CLOSED"
 
         if closed:
-            GameEntity.__init__(self, pos=position, image_ref=image_ref, z_level=1, blocks=True,
+            GameEntity.__init__(self, pos=position, image_ref=image_ref, z_level=1, blocks=True, blocks_view=True,
                                 actionable=ActionableEntity(radius=0,
                                                             actionable_by_player_only=True,
                                                             function=open_door))
         else:
             GameEntity.__init__(self, pos=position, image_ref=image_ref, z_level=1)
 
+    def open(self):
+        self.closed = False
+        self.update_graphics(self.image_ref[0:7] + "OPEN")
+        self.actionable = None
+        self.blocks = False
+        self.blocks_view = False
+        self.region.invalidate_flow_fields(self.pos)
+        self.region.remove_view_blocker(self.pos)
+
+    def delta_state(self):
+        return {"closed": self.closed}
+
+    def apply_delta_state(self, state):
+        if self.closed and not state["closed"]:
+            self.open()
+
 
 def open_door(door_entity, entity_that_triggers):
     print("{} passed a door at {}, was it closed: {}".format(entity_that_triggers, door_entity.pos, door_entity.closed))
-    door_entity.update_graphics(door_entity.image_ref[0:7] + "OPEN")
-    door_entity.actionable = None
-    door_entity.blocks = False
+    door_entity.open()
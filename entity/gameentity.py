@@ -1,9 +1,7 @@
-from pygame.sprite import Sprite
-from pygame import Surface
-import pygame as pg
 from math import sqrt
+from entity.graphics import EntitySprite
+from region.flowfield import FlowField
 from shared import GLOBAL
-from default import *
 import random as rd
 
 """
@@ -12,9 +10,19 @@ Most of the object base code will go there
 """
 
 
-class GameEntity(Sprite):
+class GameEntity:
+    """
+    Entities use __slots__ (as do all their subclasses, which must declare their own attributes), as a world holds
+    a lot of them. The graphical part lives in a separate component (EntitySprite), only created while the region of
+    the entity is displayed.
+    """
+
+    __slots__ = ("uid", "x", "y", "name", "z_level", "image_ref", "last_direction", "current_region_name",
+                 "_current_region", "blocking_tile_list", "blocking_view_list", "blocks", "blocks_view",
+                 "base_vision_radius", "_actionable", "ai", "graphics", "spawn_key")
 
     COUNTER = 0
+    UID_COUNTER = 0  # Unique identifier of the entities, kept across saves
 
     def __init__(self,
                  name=None,
@@ -25,10 +33,13 @@ class GameEntity(Sprite):
                  blocking_view_list=None,
                  vision=1,
                  blocks=False,
+                 blocks_view=False,
                  actionable=None,
                  ai=None):
 
-        Sprite.__init__(self)
+        GameEntity.UID_COUNTER += 1
+        self.uid = GameEntity.UID_COUNTER
+
         if not pos:
             pos = (-1, -1)
         (self.x, self.y) = pos
@@ -41,65 +52,120 @@ class GameEntity(Sprite):
         # Image settings
         self.z_level = z_level  # The depth. Default is 2, min is 0.
         self.image_ref = image_ref
-        self.image = None
-        self.animated = False
+        self.last_direction = (1, 0)  # Used to orient the animated images
+        self.graphics = None  # The EntitySprite, only while the region is displayed
         self.current_region_name = None
         self._current_region = None
-        self.init_graphics()
 
         # Blocking: what the object can go over, what it can see over, and if the object prevents movement upon itself
         self.blocking_tile_list = blocking_tile_list
         self.blocking_view_list = blocking_view_list
         self.blocks = blocks
+        self.blocks_view = blocks_view  # Only for entities that do not move (closed doors...)
         self.base_vision_radius = vision
 
         # Components
+        self._actionable = None
         self.actionable = actionable
-        if self.actionable:
-            self.actionable.owner = self
 
         self.ai = ai
         if self.ai:
             self.ai.owner = self
 
+        self.spawn_key = None  # Creation number of the entity, if it was generated with its region
+
+    def __getstate__(self):
+        """
+        Slots based state, without the graphical component
+        """
+        state = {}
+        for klass in type(self).__mro__:
+            for slot in klass.__dict__.get("__slots__", ()):
+                if slot != "graphics" and slot not in state and hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        return state
+
+    def __setstate__(self, state):
+        self.graphics = None
+        self.spawn_key = None
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def delta_state(self):
+        """
+        What the game may have changed on the entity since it was generated with its region, besides its position.
+        Used when the region is saved as its seed and changes (see save.regionrecord).
+        :return: a dictionary, given back to apply_delta_state
+        """
+        return {}
+
+    def apply_delta_state(self, state):
+        """
+        Apply to a freshly generated entity the changes returned by delta_state
+        :param state: the dictionary
+        """
+        pass
+
     @property
     def pos(self):
         return self.x, self.y
 
+    @property
+    def actionable(self):
+        return self._actionable
+
+    @actionable.setter
+    def actionable(self, actionable):
+        """
+        Replace the actionable component, keeping the trigger map of the region up to date
+        """
+        if self._actionable is not None and self._current_region is not None:
+            self._current_region.triggers.unregister(self._actionable)
+        self._actionable = actionable
+        if self._actionable is not None:
+            self._actionable.owner = self
+            if self._current_region is not None:
+                self._current_region.triggers.register(self._actionable)
+
+    def position_changed(self):
+        """
+        To be called each time the position of an entity changes once it is part of a region
+        """
+        if self._actionable is not None and self._current_region is not None:
+            self._current_region.triggers.refresh(self._actionable)
+
     @property
     def region(self):
         assert self._current_region is not None, "Tried accessing a region that is not yet set {}".format(self.name)
         return self._current_region
 
     # GRAPHICAL RELATED FUNCTIONS
+    def attach_graphics(self, sprite_group):
+        """
+        Create the graphical component and add it to the group used to draw the region
+        :param sprite_group: the group matching the z level of the entity
+        :return: Nothing
+        """
+        if self.graphics is None:
+            self.graphics = EntitySprite(self)
+        self.graphics.add(sprite_group)
+
+    def detach_graphics(self):
+        """
+        Drop the graphical component (the entity is no longer displayed)
+        :return: Nothing
+        """
+        if self.graphics is not None:
+            self.graphics.kill()
+            self.graphics = None
+
     def init_graphics(self):
         """
-        Initiate all graphical objects
+        Rebuild the graphical objects, if the entity is currently displayed
         :return: Nothing
         """
-        if type(self.image_ref) is Surface:
-            # This is the case for the special visual effect
-            self.image = self.image_ref
-        else:
-            image = GLOBAL.img(self.image_ref)
-            if type(image) is tuple:
-                # for decode purpose
-                self.image = Surface(TILESIZE_SCREEN)
-                self.image.fill(image)
-            elif type(image) is list or type(image) is dict:
-                self.animated = True
-                self.current_frame = 0
-                self.last_update = 0
-                if type(image) is list:
-                    self.list_image = image
-                    self.image = self.list_image[self.current_frame]
-                else:
-                    self.last_direction = (1, 0)
-                    self.dict_image = image
-                    self.image = self.dict_image['E'][self.current_frame]
-            else:
-                self.image = image
-        self._reposition_rect()
+        if self.graphics is not None:
+            self.graphics.init_graphics()
 
     def update_graphics(self, new_image_ref):
         """
@@ -110,79 +176,34 @@ class GameEntity(Sprite):
         self.image_ref = new_image_ref
         self.init_graphics()
 
-    def clean_before_save(self, image_only=False):
-        """
-        Clean all graphical objects, remove from sprite dictionary and remove the game reference
-        :return:
-        """
-        self.image = None
-        self.animated = False
-        if hasattr(self, "dict_image"):
-            # self.dict_image = None
-            delattr(self, "dict_image")
-        if hasattr(self, "list_image"):
-            self.list_image = None
-            delattr(self, "list_image")
-
-    def _reposition_rect(self):
-        self.rect = self.image.get_rect()
-        self.rect.centerx = self.x * TILESIZE_SCREEN[0] + int(TILESIZE_SCREEN[1] / 2)  # initial position for the camera
-        self.rect.centery = self.y * TILESIZE_SCREEN[0] + int(TILESIZE_SCREEN[1] / 2)
-
     def assign_entity_to_region(self, region):
-        self.add(region.all_groups[self.z_level])
+        if region.displayed:
+            self.attach_graphics(region.all_groups[self.z_level])
         self.current_region_name = region.name
         self._current_region = region
         region.region_entities.add(self)
+        if self.actionable is not None:
+            region.triggers.register(self.actionable)
         if self.ai is not None:
             region.ticker.schedule_turn(self.ai.speed, self.ai)
+        if FlowField.is_static_blocker(self):
+            region.invalidate_flow_fields(self.pos)
+        if self.blocks_view:
+            region.add_view_blocker(self.pos)
 
     def remove_entity_from_region(self, region):
-        self.remove(region.all_groups[self.z_level])
+        self.detach_graphics()
+        self.spawn_key = None  # Only meaningful in the region the entity was generated with
         self.current_region_name = None
         self._current_region = None
         region.region_entities.remove(self)
+        if self.actionable is not None:
+            region.triggers.unregister(self.actionable)
         region.ticker.unregister(self.ai)
-
-    def animate(self):
-        now = pg.time.get_ticks()
-        delta = 200
-        if hasattr(self, "ai") and self.ai is not None:
-            if hasattr(self.ai, "speed"):
-                delta = self.ai.speed * 30
-        elif hasattr(self, "speed"):
-            delta = self.speed * 30
-        if now - self.last_update > delta:
-            self.last_update = now
-            reference = 'E'
-            if hasattr(self, "dict_image"):
-                if self.last_direction[0] < 0:
-                    reference = 'W'
-                if self.last_direction[0] > 0:
-                    reference = 'E'
-                if self.last_direction[1] < 0:
-                    reference = 'N'
-                if self.last_direction[1] > 0:
-                    reference = 'S'
-                if "NW" in self.dict_image:
-                    if self.last_direction == (-1, -1):
-                        reference = "NW"
-                    elif self.last_direction == (1, 1):
-                        reference = "SE"
-                    elif self.last_direction == (-1, 1):
-                        reference = "SW"
-                    elif self.last_direction == (1, -1):
-                        reference = "NE"
-                self.current_frame = (self.current_frame + 1) % len(self.dict_image[reference])
-                self.image = self.dict_image[reference][self.current_frame]
-            else:
-                self.current_frame = (self.current_frame + 1) % len(self.list_image)
-                self.image = self.list_image[self.current_frame]
-
-    def update(self):
-        if self.animated:
-            self.animate()
-        self._reposition_rect()
+        if FlowField.is_static_blocker(self):
+            region.invalidate_flow_fields(self.pos)
+        if self.blocks_view:
+            region.remove_view_blocker(self.pos)
 
     def move(self, dx=0, dy=0):
         """
@@ -192,29 +213,17 @@ class GameEntity(Sprite):
 
         # Test if we enter the actionable zone of an entity
         # Note: this can be a door to open, or a fight!
-        for entity in GLOBAL.game.current_region.region_entities:
-            if entity != self and hasattr(entity, "actionable") and entity.actionable is not None and \
-                            (self.x + dx, self.y + dy) in entity.actionable.action_field:
+        for actionable in GLOBAL.game.current_region.triggers.at((self.x + dx, self.y + dy)):
+            if actionable.owner != self:
                 self.x += dx
                 self.y += dy
-                ok_to_move = entity.actionable.action(self)
+                ok_to_move = actionable.action(self)
                 self.x -= dx
                 self.y -= dy
                 if ok_to_move is not None and not ok_to_move:
                     # We triggered an object, and it prevented the move (like a door not opening)
                     return False
 
-            if entity != self and hasattr(entity, "fighter") and entity.fighter is not None and \
-                            (self.x + dx, self.y + dy) in entity.fighter.action_field:
-                self.x += dx
-                self.y += dy
-                ok_to_move = entity.fighter.action(self)
-                self.x -= dx
-                self.y -= dy
-                if ok_to_move is not None and not ok_to_move:
-                    # We came in a fight...
-                    return False
-
         # Test if we collide with the terrain, and terrain only
         destination_tile = GLOBAL.game.current_region.tiles[self.x + dx][self.y + dy]
         if not destination_tile.block_for(self):
@@ -225,8 +234,9 @@ class GameEntity(Sprite):
             # success
             self.x += dx
             self.y += dy
-            if self.animated and (dx != 0 or dy != 0):
+            if dx != 0 or dy != 0:
                 self.last_direction = (dx, dy)
+            self.position_changed()
 
             GLOBAL.game.invalidate_fog_of_war = True
             # self.game.ticker.ticks_to_advance += self.speed_cost_for(c.AC_ENV_MOVE)
@@ -239,29 +249,66 @@ class ActionableEntity:
     """
     An actionable entity is an object which is triggered when something (player, monster...) is around (or directly in).
     This is typically a door, a trap, a town...
+    The zone that triggers the action (footprint) is either a cross of the given radius around the owner, or a
+    rectangle (area) for multi tiles objects like buildings.
     """
-    def __init__(self, radius=0, actionable_by_player_only=True, function=None):
-        self.radius = radius  # the radius for triggering the function
+
+    __slots__ = ("_radius", "_area", "owner", "actionable_by_player_only", "function")
+
+    def __init__(self, radius=0, actionable_by_player_only=True, function=None, area=None):
+        """
+        :param radius: the radius for triggering the function
+        :param actionable_by_player_only: if set, the function is only called when the player triggers it
+        :param function: the function called, with the owner and the entity that triggered it
+        :param area: optional (dx, dy, width, height) rectangle, relative to the owner position. Replaces the radius.
+        """
+        self._radius = radius
+        self._area = area
         self.owner = None
         self.actionable_by_player_only = actionable_by_player_only
-        self._action_field = None
         self.function = function
 
+    @property
+    def radius(self):
+        return self._radius
+
+    @radius.setter
+    def radius(self, radius):
+        self._radius = radius
+        self._refresh_owner_triggers()
+
+    @property
+    def area(self):
+        return self._area
+
+    @area.setter
+    def area(self, area):
+        self._area = area
+        self._refresh_owner_triggers()
+
+    def _refresh_owner_triggers(self):
+        if self.owner is not None:
+            self.owner.position_changed()
+
+    def footprint(self):
+        """
+        The positions that trigger the action, computed from the current owner position
+        :return: a list of positions
+        """
+        if self.owner is None:
+            return []
+        x, y = self.owner.pos
+        if self._area is not None:
+            (dx, dy, width, height) = self._area
+            return [(x + dx + i, y + dy + j) for i in range(width) for j in range(height)]
+        field = [(x, y)]
+        for i in range(1, self._radius + 1):
+            field.extend(((x - i, y), (x + i, y), (x, y - i), (x, y + i)))
+        return field
+
     @property
     def action_field(self):
-        if self._action_field is not None:
-            return self._action_field
-        else:
-            if self.owner is not None:
-                self._action_field = [self.owner.pos]
-                for i in range(-self.radius, self.radius):
-                    if (self.owner.pos[0] + i, self.owner.pos[1]) not in self._action_field:
-                        self._action_field.append((self.owner.pos[0] + i, self.owner.pos[1]))
-                    if (self.owner.pos[0], self.owner.pos[1] + i) not in self._action_field:
-                        self._action_field.append((self.owner.pos[0], self.owner.pos[1] + i))
-                return self._action_field
-            else:
-                return []
+        return self.footprint()
 
     def action(self, entity_that_actioned):
         if self.function is None:
@@ -276,6 +323,8 @@ class ActionableEntity:
 
 class AIEntity:
 
+    __slots__ = ("owner", "speed")
+
     def __init__(self, speed=1):
         self.owner = None
         self.speed = speed  # the speed represents the time between two turns
@@ -296,7 +345,19 @@ class AIEntity:
         return self.owner.move(dx, dy)
 
     def move_towards_entity(self, other_entity):
-        self.move_towards_position(other_entity.pos)
+        return self.move_along_flow_field(other_entity.pos)
+
+    def move_along_flow_field(self, target):
+        """
+        Move one step closer to the target, going around the obstacles.
+        The path comes from the region flow field, shared with all the other entities going to the same target.
+        :param target: the position to reach
+        :return: True if the entity moved
+        """
+        step = self.owner.region.get_flow_field(target, self.owner).next_step(self.owner.x, self.owner.y)
+        if step is None:
+            return False
+        return self.owner.move(step[0], step[1])
 
     def move_randomly(self, with_fight=False):
         """
@@ -318,10 +379,60 @@ class AIEntity:
 
 class WanderingAIEntity(AIEntity):
 
+    __slots__ = ()
+
+    DIRECTIONS = ((-1, -1), (-1, 0), (-1, 1), (0, 1), (0, -1), (1, -1), (1, 0), (1, 1))
+
     def __init__(self, speed):
         AIEntity.__init__(self, speed=speed)
 
     def take_turn(self):
         self.move_randomly(with_fight=False)
-        print("{} moves to {}".format(self.owner.name, self.owner.pos))
-        GLOBAL.game.world[self.owner.current_region_name].ticker.schedule_turn(self.speed, self)
+        self.owner.region.ticker.schedule_turn(self.speed, self)
+
+    @classmethod
+    def take_group_turn(cls, ai_list, ticker):
+        """
+        Resolve in one pass the moves of the wanderers that are due one after the other on the same tick.
+        The occupancy of the region is computed once: each wanderer, in the order it was scheduled, claims its
+        destination in it, so that two wanderers never end on the same cell. The wanderers are then rescheduled.
+        :param ai_list: the list of wandering AI to play
+        :param ticker: the ticker that triggered the turn, used to reschedule
+        :return: Nothing
+        """
+        playing = [ai for ai in ai_list if ai.owner is not None and ai.owner.current_region_name is not None]
+        if len(playing) > 0:
+            region = playing[0].owner.region
+            occupied = {entity.pos for entity in region.region_entities if entity.blocks}
+            moved = False
+
+            for ai in playing:
+                owner = ai.owner
+                directions = list(cls.DIRECTIONS)
+                rd.shuffle(directions)
+                for (dx, dy) in directions:
+                    x, y = owner.x + dx, owner.y + dy
+                    if (x, y) in occupied or not (0 <= x < region.tile_width and 0 <= y < region.tile_height) or \
+                            region.tiles[x][y].block_for(owner):
+                        continue
+                    if any(not actionable.actionable_by_player_only for actionable in region.triggers.at((x, y))):
+                        # Rare case: something else than the player can trigger it, let the regular move handle it
+                        old_pos = owner.pos
+                        if not owner.move(dx, dy):
+                            continue
+                    else:
+                        old_pos = owner.pos
+                        owner.x, owner.y = x, y
+                        owner.last_direction = (dx, dy)
+                        owner.position_changed()
+                        moved = True
+                    if owner.blocks:
+                        occupied.discard(old_pos)
+                        occupied.add(owner.pos)
+                    break
+
+            if moved:
+                GLOBAL.game.invalidate_fog_of_war = True
+
+        for ai in ai_list:
+            ticker.schedule_turn(ai.speed, ai)
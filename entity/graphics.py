@@ -0,0 +1,109 @@
+from pygame.sprite import Sprite
+from pygame import Surface
+import pygame as pg
+from shared import GLOBAL
+from default import *
+
+"""
+Graphical part of the game entities (image, position on screen, animation).
+It is only created for the entities of a region that is displayed, see Region.all_groups.
+"""
+
+
+class EntitySprite(Sprite):
+    """
+    The sprite drawn for a game entity.
+    The entity only keeps its image reference, its position and its last direction: everything else is built here,
+    and can be dropped and rebuilt at any time.
+    """
+
+    def __init__(self, entity):
+        Sprite.__init__(self)
+        self.entity = entity
+        self.image = None
+        self.rect = None
+        self.animated = False
+        self.current_frame = 0
+        self.last_update = 0
+        self.list_image = None
+        self.dict_image = None
+        self.init_graphics()
+
+    def init_graphics(self):
+        """
+        Initiate all graphical objects from the image reference of the entity
+        :return: Nothing
+        """
+        self.animated = False
+        self.list_image = None
+        self.dict_image = None
+        image_ref = self.entity.image_ref
+        if type(image_ref) is Surface:
+            # This is the case for the special visual effect
+            self.image = image_ref
+        else:
+            image = GLOBAL.img(image_ref)
+            if type(image) is tuple:
+                # for decode purpose
+                self.image = Surface(TILESIZE_SCREEN)
+                self.image.fill(image)
+            elif type(image) is list or type(image) is dict:
+                self.animated = True
+                self.current_frame = 0
+                self.last_update = 0
+                if type(image) is list:
+                    self.list_image = image
+                    self.image = self.list_image[self.current_frame]
+                else:
+                    self.dict_image = image
+                    self.image = self.dict_image['E'][self.current_frame]
+            else:
+                self.image = image
+        self._reposition_rect()
+
+    def _reposition_rect(self):
+        self.rect = self.image.get_rect()
+        # initial position for the camera
+        self.rect.centerx = self.entity.x * TILESIZE_SCREEN[0] + int(TILESIZE_SCREEN[1] / 2)
+        self.rect.centery = self.entity.y * TILESIZE_SCREEN[0] + int(TILESIZE_SCREEN[1] / 2)
+
+    def animate(self):
+        now = pg.time.get_ticks()
+        delta = 200
+        if self.entity.ai is not None:
+            if hasattr(self.entity.ai, "speed"):
+                delta = self.entity.ai.speed * 30
+        elif hasattr(self.entity, "speed"):
+            delta = self.entity.speed * 30
+        if now - self.last_update > delta:
+            self.last_update = now
+            reference = 'E'
+            if self.dict_image is not None:
+                last_direction = self.entity.last_direction
+                if last_direction[0] < 0:
+                    reference = 'W'
+                if last_direction[0] > 0:
+                    reference = 'E'
+                if last_direction[1] < 0:
+                    reference = 'N'
+                if last_direction[1] > 0:
+                    reference = 'S'
+                if "NW" in self.dict_image:
+                    if last_direction == (-1, -1):
+                        reference = "NW"
+                    elif last_direction == (1, 1):
+                        reference = "SE"
+                    elif last_direction == (-1, 1):
+                        reference = "SW"
+                    elif last_direction == (1, -1):
+                        reference = "NE"
+                self.current_frame = (self.current_frame + 1) % len(self.dict_image[reference])
+                self.image = self.dict_image[reference][self.current_frame]
+            else:
+                self.current_frame = (self.current_frame + 1) % len(self.list_image)
+                self.image = self.list_image[self.current_frame]
+
+    def update(self):
+        if self.animated:
+            self.animate()
+        self._reposition_rect()
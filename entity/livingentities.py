@@ -1,9 +1,12 @@
 from entity.gameentity import GameEntity, WanderingAIEntity
+from entity.stats import StatField, StatHolder
 from utilities import MName, roll
 import random
 
 class FriendlyEntity(GameEntity):
 
+    __slots__ = ()
+
     def __init__(self, name, position, image_ref=None):
 
         if not image_ref:
@@ -13,13 +16,25 @@ class FriendlyEntity(GameEntity):
                             ai=WanderingAIEntity(speed=10))
 
 
-class FighterEntity(FriendlyEntity):
+class FighterEntity(StatHolder, FriendlyEntity):
+
+    __slots__ = ("stat_id", "inventory", "equipment", "gender", "race")
+
+    attack = StatField("attack")
+    protection = StatField("protection")
+    wage_base = StatField("wage_base")
+    strength = StatField("strength")
+    friendship = StatField("friendship")
+    money = StatField("money")
+    food_level = StatField("food_level")
+    age = StatField("age")
 
     def __init__(self, name, position, image_ref=None, fighter_dict={}):
         if not image_ref:
             image_ref = "GUARD_" + str(random.randint(1, 9))
 
         FriendlyEntity.__init__(self, name, position, image_ref=image_ref)
+        self.allocate_stats()
 
         self.attack = 10
         self.protection = 10
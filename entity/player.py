@@ -1,11 +1,23 @@
 import random
 
 from entity.gameentity import GameEntity
+from entity.stats import StatField, StatHolder
 from region.tile import Tile
 from shared import GLOBAL
 
 
-class Player(GameEntity):
+class Player(StatHolder, GameEntity):
+
+    __slots__ = ("stat_id", "mule_list", "fighter_list", "inventory", "equipment", "speed", "gender", "race",
+                 "married_with", "child")
+
+    charisma = StatField("charisma")
+    friendship = StatField("friendship")
+    erudition = StatField("erudition")
+    strength = StatField("strength")
+    money = StatField("money")
+    food_level = StatField("food_level")
+    age = StatField("age")
 
     def __init__(self, player_dict=None):
         assert player_dict is not None, "No data as part of the player dict"
@@ -14,6 +26,7 @@ class Player(GameEntity):
             ("PLAYER_ENGINEER", "PLAYER_MAGE", "PLAYER_PALADIN", "PLAYER_ROGUE", "PLAYER_WARRIOR"))
 
         GameEntity.__init__(self, pos=(1, 1), image_ref=image_ref, z_level=2, blocks=True)
+        self.allocate_stats()
 
         self.mule_list = []
         self.fighter_list = []
@@ -41,17 +54,11 @@ class Player(GameEntity):
 
     @property
     def protection(self):
-        prot = 0
-        for fighter in self.fighter_list:
-            prot += fighter.protection
-        return prot
+        return GLOBAL.stats.sum("protection", [fighter.stat_id for fighter in self.fighter_list])
 
     @property
     def attack(self):
-        att = 0
-        for fighter in self.fighter_list:
-            att += fighter.attack
-        return att
+        return GLOBAL.stats.sum("attack", [fighter.stat_id for fighter in self.fighter_list])
 
     @property
     def max_allies(self):
@@ -62,6 +69,9 @@ class Player(GameEntity):
 
     def switch_region(self, old_region, new_region):
         self.remove_entity_from_region(old_region)
+        old_region.release_graphics()
+        GLOBAL.game.world.mark_dirty(old_region.name)
+        GLOBAL.game.world.mark_dirty(new_region.name)
 
         GLOBAL.game.current_region = new_region
         if new_region.last_player_position is None:
@@ -82,15 +92,14 @@ class Player(GameEntity):
         GLOBAL.game.current_region.last_player_position = self.pos
 
         # Test if we enter the actionable zone of an entity
-        for entity in GLOBAL.game.current_region.region_entities:
-            if entity != self and entity.actionable is not None and \
-                    (self.x + dx, self.y + dy) in entity.actionable.action_field:
+        for actionable in GLOBAL.game.current_region.triggers.at((self.x + dx, self.y + dy)):
+            if actionable.owner != self:
                 self.x += dx
                 self.y += dy
-                ok_to_move = entity.actionable.action(self)
+                ok_to_move = actionable.action(self)
                 self.x -= dx
                 self.y -= dy
-                if entity.blocks:
+                if actionable.owner.blocks:
                     if ok_to_move is not None and not ok_to_move:
                         # We triggered an object, and it prevented the move (like a door not opening)
                         return False
@@ -107,8 +116,9 @@ class Player(GameEntity):
             # success
             self.x += dx
             self.y += dy
-            if self.animated and (dx != 0 or dy != 0):
+            if dx != 0 or dy != 0:
                 self.last_direction = (dx, dy)
+            self.position_changed()
 
             GLOBAL.game.invalidate_fog_of_war = True
 
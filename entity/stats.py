@@ -0,0 +1,82 @@
+from shared import GLOBAL
+
+"""
+Numerical stats of the entities, kept in the StatStore (GLOBAL.stats) rather than on the entities themselves.
+"""
+
+
+class StatField:
+    """
+    Descriptor giving access to a column of the StatStore, for the row of the entity (its stat_id)
+    """
+
+    def __init__(self, column):
+        self.column = column
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return GLOBAL.stats.columns[self.column][instance.stat_id]
+
+    def __set__(self, instance, value):
+        GLOBAL.stats.columns[self.column][instance.stat_id] = value
+
+
+class StatHolder:
+    """
+    Base for the entities holding stats. Must come before GameEntity in the bases, and the class must have a stat_id
+    slot.
+    The stat_id is None until the row is allocated, on creation (or on load). The row is released when the entity is
+    garbage collected. When pickled, the values are saved with the entity, and a new row is allocated on load.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        # Also reached when unpickling, without __init__: the slot must not stay unset
+        instance = super().__new__(cls)
+        instance.stat_id = None
+        return instance
+
+    def allocate_stats(self):
+        self.stat_id = GLOBAL.stats.allocate()
+
+    @classmethod
+    def stat_fields(cls):
+        """
+        :return: the names of all the StatField of the class
+        """
+        fields = []
+        for klass in cls.__mro__:
+            for name, value in klass.__dict__.items():
+                if isinstance(value, StatField) and name not in fields:
+                    fields.append(name)
+        return fields
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop("stat_id", None)
+        state["stats"] = {name: getattr(self, name) for name in self.stat_fields()}
+        return state
+
+    def __setstate__(self, state):
+        stats = state.pop("stats")
+        super().__setstate__(state)
+        if self.stat_id is None:  # Set again on an entity already loaded: keep its row
+            self.allocate_stats()
+        for name, value in stats.items():
+            setattr(self, name, value)
+
+    def delta_state(self):
+        state = super().delta_state()
+        state["stats"] = {name: getattr(self, name) for name in self.stat_fields()}
+        return state
+
+    def apply_delta_state(self, state):
+        super().apply_delta_state(state)
+        for name, value in state["stats"].items():
+            setattr(self, name, value)
+
+    def __del__(self):
+        if self.stat_id is not None and GLOBAL is not None:
+            GLOBAL.stats.release(self.stat_id)
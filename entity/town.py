@@ -12,6 +12,8 @@ Town and its content
 
 class Town(GameEntity):
 
+    __slots__ = ("wilderness_index",)
+
     TOWN_INDEX = 1
 
     def __init__(self, name=None, pos=None, wilderness_index=0):
@@ -44,6 +46,8 @@ Town buildings
 
 class Building(GameEntity):
 
+    __slots__ = ("size", "top_left_pos", "town_name")
+
     def __init__(self):
         self.size = None
         self.top_left_pos = None
@@ -71,6 +75,8 @@ class Building(GameEntity):
 
 class Bank(Building):
 
+    __slots__ = ()
+
     BANK_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -91,6 +97,9 @@ class Bank(Building):
 
 
 class GuildFighter(Building):
+
+    __slots__ = ("fighter_list",)
+
     GF_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -124,6 +133,13 @@ class GuildFighter(Building):
         # for i in range(random.randint(1, 7)):
         #    self.fighter_list.append(FighterEntity())
 
+    def delta_state(self):
+        # The fighters who left (recruited) are no longer in the region, and have lost their spawn key
+        return {"fighters": [fighter.spawn_key for fighter in self.fighter_list if fighter.spawn_key is not None]}
+
+    def apply_delta_state(self, state):
+        self.fighter_list = [fighter for fighter in self.fighter_list if fighter.spawn_key in state["fighters"]]
+
 
     def is_guild_fighter(self):
         return True
@@ -138,6 +154,9 @@ def enter_fighter_guild(building_entity, entity_that_triggers):
 
 
 class GuildMule(Building):
+
+    __slots__ = ()
+
     GM_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -158,6 +177,9 @@ class GuildMule(Building):
 
 
 class Shop(Building):
+
+    __slots__ = ()
+
     SHOP_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -178,6 +200,9 @@ class Shop(Building):
 
 
 class Tavern(Building):
+
+    __slots__ = ()
+
     TAVERN_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -198,6 +223,9 @@ class Tavern(Building):
 
 
 class Temple(Building):
+
+    __slots__ = ()
+
     TEMPLE_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -218,6 +246,9 @@ class Temple(Building):
 
 
 class Townhall(Building):
+
+    __slots__ = ()
+
     TH_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -238,6 +269,9 @@ class Townhall(Building):
 
 
 class Trade(Building):
+
+    __slots__ = ()
+
     TRADE_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
@@ -258,6 +292,9 @@ class Trade(Building):
 
 
 class Entrance(Building):
+
+    __slots__ = ()
+
     ENTRANCE_INDEX = 1
 
     def __init__(self, name=None, pos=None, town_name=None):
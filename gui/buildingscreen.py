@@ -1,10 +1,7 @@
-import os
-
 import pygame as pg
 
-from default import BGCOLOR, FONT_FOLDER, FONT_NAME, WHITE
-from gui.guicontainer import LineAlignedContainer
-from gui.guiwidget import TextButton
+from default import BGCOLOR, FONT_NAME, WHITE
+from gui.guiwidget import VirtualList
 from gui.screen import Screen, enroll_fighter
 from shared import GLOBAL
 
@@ -18,58 +15,61 @@ class BuildingScreen(Screen):
     def __init__(self):
         Screen.__init__(self)
         self.building = None
+        self.fighter_list = None  # The VirtualList of the fighters to enroll
 
     def attach_building(self, building):
         self.building = building
-        self.widgets = []
+        self.fighter_list = None
+        self.widgets.clear()
 
         if self.building.is_guild_fighter() and len(self.building.fighter_list) > 0:
-            for fighter in self.building.fighter_list:
-                button = TextButton(text=fighter.name,
-                                    callback_function=lambda myfighter=fighter, buildingscreen=self: enroll_fighter(
-                                        myfighter, buildingscreen),
-                                    grow_width_with_text=True,
-                                    grow_height_with_text=True)
-                self.widgets.append(button)
+            screen_rect = pg.display.get_surface().get_rect()
+            self.fighter_list = VirtualList(callback_function=lambda fighter: enroll_fighter(fighter, self),
+                                            items=self.building.fighter_list,
+                                            item_text=lambda fighter: fighter.name,
+                                            dimension=(int(screen_rect.width / 3), int(screen_rect.height * 2 / 3)))
+            self.fighter_list.move(screen_rect.centerx - self.fighter_list.rect.centerx,
+                                   screen_rect.centery - self.fighter_list.rect.centery)
+            self.widgets.add(self.fighter_list)
 
-            line = LineAlignedContainer(int(pg.display.get_surface().get_rect().width / 2),
-                                        alignment=LineAlignedContainer.VERTICAL_CENTER,
-                                        widgets=self.widgets, space=50)
-            line.move(0, int((pg.display.get_surface().get_rect().height - line.rect.height) / 2))
+    def fighters_changed(self):
+        """
+        To call when the fighters of the building changed: only the rows of the list which changed are drawn again
+        """
+        if len(self.building.fighter_list) == 0:
+            self.fighter_list = None
+            self.widgets.clear()
+        elif self.fighter_list is not None:
+            self.fighter_list.refresh()
 
     def draw(self):
+        if not self.widgets.needs_redraw:
+            return  # Nothing changed since the last frame
+
         # Erase All
         screen = pg.display.get_surface()
         screen.fill(BGCOLOR)
 
         if len(self.widgets) == 0:
-            font = pg.font.Font(os.path.join(FONT_FOLDER, FONT_NAME), 20)
-            text = font.render("Building " + self.building.name, True, WHITE)
+            text = GLOBAL.text(FONT_NAME, 20, "Building " + self.building.name, WHITE)
             text_rect = text.get_rect()
 
             left_x = screen.get_rect().centerx - int(text_rect.width / 2)
             top_y = screen.get_rect().centery - int(text_rect.height / 2)
             screen.blit(text, (left_x, top_y))
+            self.widgets.dirty = False
         else:
-            for widget in self.widgets:
-                widget.draw(screen)
+            self.widgets.draw(screen)
 
         pg.display.flip()
 
-    def update(self):
-        for widget in self.widgets:
-            widget.update()
-
     def events(self):
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 GLOBAL.game.quit()
             elif event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE:
-                self.building = None
-                self.widgets = []
+                self.building = self.fighter_list = None
+                self.widgets.clear()
                 GLOBAL.game.update_state(GLOBAL.game.GAME_STATE_PLAYING)
             else:
-                handled = False
-                for widget in self.widgets:
-                    if not handled:
-                        handled = widget.handle_event(event)
+                self.widgets.handle_event(event)
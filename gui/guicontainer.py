@@ -292,3 +292,247 @@ class LineAlignedContainer(Container):
                 position = position[1]
             for widget_id in self.widget_id_order:
                 self.widgets[widget_id].move(0, position - self.widgets[widget_id].rect.centery)
+
+
+class Layout:
+    """
+    Base of the layouts (Box, Grid), placing widgets and other layouts in a rect, in one pass.
+    Unlike the containers, a layout does not move its children when they are added: the size it needs is measured once,
+    and kept until a child is added, removed, or changes size (see Widget.size_changed). Placing it in another rect,
+    when the window is resized, reuses the sizes and only moves the widgets whose position changed.
+    Once placed, a layout places itself again when invalidated.
+    """
+
+    START = "START"
+    CENTER = "CENTER"
+    END = "END"
+    STRETCH = "STRETCH"
+    SPREAD = "SPREAD"
+
+    def __init__(self, children=None):
+        self.children = []
+        self.layout_parent = None
+        self.rect = None  # The rect given at the last layout, None if never placed
+        self._size = None  # The size measured, None when to be measured again
+        for child in children or ():
+            self.add(child)
+
+    def add(self, child):
+        """
+        Add a widget or a layout, after the others. It is removed from its previous layout.
+        """
+        if child.layout_parent is not None:
+            child.layout_parent.remove(child)
+        child.layout_parent = self
+        self.children.append(child)
+        self.invalidate()
+
+    def remove(self, child):
+        if child in self.children:
+            child.layout_parent = None
+            self.children.remove(child)
+            self.invalidate()
+
+    def invalidate(self):
+        """
+        To call when the size of a child changed: the layouts up to the root are measured and placed again
+        """
+        self._size = None
+        if self.layout_parent is not None:
+            self.layout_parent.invalidate()
+        elif self.rect is not None:
+            self.layout(self.rect)
+
+    @property
+    def size(self):
+        """
+        :return: the size needed to show the children, measured only when invalidated
+        """
+        if self._size is None:
+            self._size = self._measure()
+        return self._size
+
+    def layout(self, rect):
+        """
+        Place the children in the rect. The widget trees of the widgets moved are told to index them again.
+        :param rect: the rect to place the children in (a Pygame Rect, or anything a Rect can be made of)
+        """
+        trees = set()
+        self._place(pg.Rect(rect), trees)
+        for tree in trees:
+            tree.reindex()
+
+    def _measure(self):
+        """
+        Redefined by the layouts. By default the children are on top of each other.
+        :return: the size needed by the children, as a tuple
+        """
+        sizes = [Layout._child_size(child) for child in self.children]
+        return max((size[0] for size in sizes), default=0), max((size[1] for size in sizes), default=0)
+
+    def _place(self, rect, trees):
+        """
+        Place the children in the rect. Redefined by the layouts: by default they are all at its top left.
+        :param trees: the set of the widget trees of the widgets moved
+        """
+        self.rect = rect
+        for child in self.children:
+            Layout._place_child(child, pg.Rect(rect.topleft, Layout._child_size(child)), trees)
+
+    @staticmethod
+    def _child_size(child):
+        if isinstance(child, Layout):
+            return child.size
+        return child.rect.size
+
+    @staticmethod
+    def _place_child(child, rect, trees):
+        if isinstance(child, Layout):
+            child.rect = rect
+            child._place(rect, trees)
+        else:
+            dx = rect.left - child.rect.left
+            dy = rect.top - child.rect.top
+            if dx or dy:
+                child.move(dx, dy)
+                if child.parent is not None:
+                    trees.add(child.parent)
+
+
+class Box(Layout):
+    """
+    A layout placing its children in a line, from the left to the right (horizontal) or from the top to the bottom
+    (vertical)
+    """
+
+    HORIZONTAL = "HORIZONTAL"
+    VERTICAL = "VERTICAL"
+
+    def __init__(self,
+                 orientation=VERTICAL,
+                 children=None,
+                 space=0,
+                 align=Layout.START,
+                 justify=Layout.START):
+        """
+        :param orientation: HORIZONTAL or VERTICAL
+        :param children: the widgets and layouts to place, in order
+        :param space: the minimum space between two children
+        :param align: where the children are across the line: START, CENTER, END, or STRETCH (the layouts among the
+        children get the whole width of a vertical box, the whole height of an horizontal box. A widget is at the start.)
+        :param justify: where the children are along the line, when there is more room than needed: START, CENTER,
+        END, or SPREAD (the room left goes between the children)
+        """
+        self.orientation = orientation
+        self.space = space
+        self.align = align
+        self.justify = justify
+        Layout.__init__(self, children=children)
+
+    @property
+    def axis(self):
+        """
+        :return: the index, in a position or size, of the coordinate along the line
+        """
+        return 0 if self.orientation == Box.HORIZONTAL else 1
+
+    def _measure(self):
+        if len(self.children) == 0:
+            return 0, 0
+        axis = self.axis
+        sizes = [Layout._child_size(child) for child in self.children]
+        length = sum(size[axis] for size in sizes) + self.space * (len(sizes) - 1)
+        thickness = max(size[1 - axis] for size in sizes)
+        return (length, thickness) if axis == 0 else (thickness, length)
+
+    def _place(self, rect, trees):
+        self.rect = rect
+        axis = self.axis
+        room = rect.size[axis] - self.size[axis]
+        position = rect.topleft[axis]
+        space = self.space
+        if room > 0:
+            if self.justify == Layout.CENTER:
+                position += int(room / 2)
+            elif self.justify == Layout.END:
+                position += room
+            elif self.justify == Layout.SPREAD and len(self.children) > 1:
+                space += room / (len(self.children) - 1)
+
+        for child in self.children:
+            size = Layout._child_size(child)
+            cross_position = rect.topleft[1 - axis]
+            cross_size = size[1 - axis]
+            cross_room = rect.size[1 - axis] - cross_size
+            if self.align == Layout.CENTER:
+                cross_position += int(cross_room / 2)
+            elif self.align == Layout.END:
+                cross_position += cross_room
+            elif self.align == Layout.STRETCH and isinstance(child, Layout):
+                cross_size = rect.size[1 - axis]
+            if axis == 0:
+                child_rect = pg.Rect(int(position), cross_position, size[0], cross_size)
+            else:
+                child_rect = pg.Rect(cross_position, int(position), cross_size, size[1])
+            Layout._place_child(child, child_rect, trees)
+            position += size[axis] + space
+
+
+class Grid(Layout):
+    """
+    A layout placing its children in a grid, row by row: each column is as wide as its widest child, each row as high as
+    its highest child. The grid is placed at the top left of its rect.
+    """
+
+    def __init__(self,
+                 columns,
+                 children=None,
+                 space_x=0,
+                 space_y=0,
+                 column_align=None):
+        """
+        :param columns: the number of columns
+        :param children: the widgets and layouts to place, row by row
+        :param space_x: the space between two columns
+        :param space_y: the space between two rows
+        :param column_align: for each column, where the children are in it: START, CENTER or END (START if not given)
+        """
+        self.columns = columns
+        self.space_x = space_x
+        self.space_y = space_y
+        self.column_align = column_align or [Layout.START] * columns
+        assert len(self.column_align) == columns, "One alignment needed per column"
+        self.column_widths = []
+        self.row_heights = []
+        Layout.__init__(self, children=children)
+
+    def _measure(self):
+        self.column_widths = [0] * self.columns
+        self.row_heights = [0] * (int((len(self.children) - 1) / self.columns) + 1 if self.children else 0)
+        for index, child in enumerate(self.children):
+            width, height = Layout._child_size(child)
+            column, row = index % self.columns, int(index / self.columns)
+            self.column_widths[column] = max(self.column_widths[column], width)
+            self.row_heights[row] = max(self.row_heights[row], height)
+        if len(self.children) == 0:
+            return 0, 0
+        return (sum(self.column_widths) + self.space_x * (self.columns - 1),
+                sum(self.row_heights) + self.space_y * (len(self.row_heights) - 1))
+
+    def _place(self, rect, trees):
+        self.rect = rect
+        self.size  # Measure the columns and rows if needed
+        column_lefts = [rect.left]
+        for width in self.column_widths[:-1]:
+            column_lefts.append(column_lefts[-1] + width + self.space_x)
+        top = rect.top
+        for row, height in enumerate(self.row_heights):
+            for column, child in enumerate(self.children[row * self.columns:(row + 1) * self.columns]):
+                width, child_height = Layout._child_size(child)
+                left = column_lefts[column]
+                if self.column_align[column] == Layout.CENTER:
+                    left += int((self.column_widths[column] - width) / 2)
+                elif self.column_align[column] == Layout.END:
+                    left += self.column_widths[column] - width
+                Layout._place_child(child, pg.Rect(left, top, width, child_height), trees)
+            top += height + self.space_y
@@ -1,13 +1,20 @@
-import os
 import random
+from collections import deque
 
 import pygame as pg
 
 import default
 from shared import GLOBAL
+from utilities import SurfaceCache
 
 
 class Widget:
+    # How a WidgetTree handles the widget: only the widgets changing by themselves (following a value, blinking...)
+    # are updated at each frame, only the widgets handling keys get the key events, and the mouse events only go to the
+    # widgets under the mouse, except for the widgets following the mouse
+    updated_every_frame = False
+    handles_keys = False
+    follows_mouse = False
 
     def __init__(self):
         self.position = (0, 0)
@@ -17,6 +24,10 @@ class Widget:
         self.container_parent = None
         self.id_in_container = None
 
+        self.parent = None  # The WidgetTree the widget is in
+        self.layout_parent = None  # The layout (Box, Grid) placing the widget
+        self.dirty = True
+
     def update(self):
         """
         In general this method is not really usefull, but it is called from the master.
@@ -41,6 +52,21 @@ class Widget:
         assert self.rect, "Rect doesn't exist so can't blit"
         screen.blit(self.image, self.rect)
 
+    def mark_dirty(self):
+        """
+        To call when the image of the widget changed, so that it is drawn again
+        """
+        self.dirty = True
+        if self.parent is not None:
+            self.parent.mark_dirty()
+
+    def size_changed(self):
+        """
+        To call when the size of the widget changed, so that its layout places the widgets again
+        """
+        if self.layout_parent is not None:
+            self.layout_parent.invalidate()
+
     def move(self, dx, dy):
         """
         Move the widget position according to dx, dy parameters. Perticularly important for composite widgets.
@@ -134,6 +160,8 @@ class MouseWidget(Widget):
     BOTTOM_LEFT = "bottom_left"
     BOTTOM_RIGHT = "bottom_right"
 
+    follows_mouse = True
+
     def __init__(self, image_surface, image_click_position=CENTER):
         """
         Initialize the mouse widget
@@ -186,6 +214,7 @@ class MouseWidget(Widget):
                     self.rect.bottomright = event.pos
                 else:
                     raise Exception("Invalid click position on image: {}".format(self.click_position))
+                self.mark_dirty()
 
 
 class ProgressBar(Widget):
@@ -195,6 +224,8 @@ class ProgressBar(Widget):
     HORIZONTAL = "Horizontal"
     VERTICAL = "Vertical"
 
+    updated_every_frame = True  # Follows the value of its object
+
     DEFAULT_OPTIONS = {
         "font_name": default.FONT_NAME,
         "font_size": 14,
@@ -250,17 +281,19 @@ class ProgressBar(Widget):
         self.theme = self.style_dict.get("theme", ProgressBar.DEFAULT_OPTIONS["theme"])
 
         if self.with_text:
-            self.font = GLOBAL.font(self.style_dict.get("font_name", ProgressBar.DEFAULT_OPTIONS["font_name"]),
-                                    self.style_dict.get("font_size", ProgressBar.DEFAULT_OPTIONS["font_size"]))
-            test_rect = self.font.render(str(max_value), True, (0, 0, 0)).get_rect()
-            self.dimension = [max(dimension[0], test_rect.width),
-                              max(dimension[1], test_rect.height)]
+            self.font_key = (self.style_dict.get("font_name", ProgressBar.DEFAULT_OPTIONS["font_name"]),
+                             self.style_dict.get("font_size", ProgressBar.DEFAULT_OPTIONS["font_size"]))
+            self.font = GLOBAL.font(*self.font_key)
+            test_size = self.font.size(str(max_value))
+            self.dimension = [max(dimension[0], test_size[0]),
+                              max(dimension[1], test_size[1])]
 
         self.object_to_follow = object_to_follow
         self.attribute_to_follow = attribute_to_follow
         self.current_value = getattr(self.object_to_follow, self.attribute_to_follow)
 
         self.background_image = None
+        self.bar_image = None  # The bar is drawn there, to be blitted on the image
         self._prepare_image(recreate_background=True)
 
         self.rect = self.image.get_rect()
@@ -277,7 +310,12 @@ class ProgressBar(Widget):
             self._prepare_image()
 
     def _prepare_image(self, recreate_background=False):
-        self.image = pg.Surface(self.dimension, pg.SRCALPHA)
+        # The surfaces are made once: when the value changes, they are only drawn again
+        if recreate_background:
+            self.image = pg.Surface(self.dimension, pg.SRCALPHA)
+            self.bar_image = pg.Surface(self.dimension, pg.SRCALPHA)
+        else:
+            self.image.fill((0, 0, 0, 0))
 
         rounded = self.style_dict.get("rounded", ProgressBar.DEFAULT_OPTIONS["rounded"])
         bg_color = self.style_dict.get("bg_color", ProgressBar.DEFAULT_OPTIONS["bg_color"]) or (0, 0, 0, 0)
@@ -296,67 +334,139 @@ class ProgressBar(Widget):
         self.image.blit(self.background_image, (0, 0))
 
         # Bar itself
+        # The bar stays within the image when the value goes above the maximum
         if self.orientation == ProgressBar.HORIZONTAL:
-            computed = max(0, int(float(self.current_value) / self.max_value * self.dimension[0]))
+            computed = max(0, min(int(float(self.current_value) / self.max_value * self.dimension[0]),
+                                  self.dimension[0]))
         else:
-            computed = max(0, int(float(self.current_value) / self.max_value * self.dimension[1]))
+            computed = max(0, min(int(float(self.current_value) / self.max_value * self.dimension[1]),
+                                  self.dimension[1]))
 
         color = self.style_dict.get("color", ProgressBar.DEFAULT_OPTIONS["color"])
         if self.orientation == ProgressBar.HORIZONTAL:
-            if rounded:
-                bar_image = rounded_surface(pg.Rect((0, 0), (computed, self.dimension[1])), color, radius=1)
-            else:
-                bar_image = pg.Surface((computed, self.dimension[1]))
-                bar_image.fill(color)
+            bar_rect = pg.Rect((0, 0), (computed, self.dimension[1]))
         else:
-            if rounded:
-                bar_image = rounded_surface(pg.Rect((0, 0), (self.dimension[0], computed)), color, radius=1)
-            else:
-                bar_image = pg.Surface((self.dimension[0], computed))
-                bar_image.fill(color)
-
-        self.image.blit(bar_image, (0, 0))
+            bar_rect = pg.Rect((0, 0), (self.dimension[0], computed))
+        if rounded:
+            self.image.blit(rounded_surface(bar_rect, color, radius=1, surface=self.bar_image.subsurface(bar_rect)),
+                            (0, 0))
+        else:
+            self.image.fill(color, bar_rect)
 
         if self.with_text:
             font_color = self.style_dict.get("font_color", ProgressBar.DEFAULT_OPTIONS["font_color"])
             if self.theme:
                 font_color = self.theme["font_color"]
-            fontsurface = self.font.render(str(self.current_value) + '/' + str(self.max_value), True, font_color)
+            fontsurface = GLOBAL.text(*self.font_key, str(self.current_value) + '/' + str(self.max_value),
+                                      font_color)
             self.image.blit(fontsurface, (int((self.image.get_rect().width - fontsurface.get_rect().width) / 2), 0))
 
 
-def rounded_surface(rect, color, radius=1):
+# The backgrounds of the labels, shared by all the labels alike (see Label._create_background)
+BACKGROUNDS = SurfaceCache()
+
+
+def _hashable(value):
+    """
+    :return: the value (a theme, a colour...) turned into something that can be a dictionary key
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+def decoration_polygons(dimension, margin, seed):
+    """
+    The small triangles decorating the borders of a themed background, no more than 1 every 75 pixels in average
+    on each side
+    :param dimension: the dimension of the background
+    :param margin: the width of the borders
+    :param seed: the variant of the decoration: the same seed gives the same triangles
+    :return: the list of the triangles, as lists of points
+    """
+    generator = random.Random(seed)
+    width, height = dimension
+    polygons = []
+    for i in range(generator.randint(0, int(width / 75))):
+        # Top
+        x = generator.randint(2 * margin, width - 2 * margin)
+        polygons.append([(x, margin), (x + 4, margin), (x + 2, margin + 2)])
+    for i in range(generator.randint(0, int(width / 75))):
+        # Bottom
+        x = generator.randint(2 * margin, width - 2 * margin)
+        y = height - 1
+        polygons.append([(x, y - margin), (x + 4, y - margin), (x + 2, y - margin - 2)])
+    for i in range(generator.randint(0, int(height / 75))):
+        # Left
+        y = generator.randint(2 * margin, height - 2 * margin)
+        polygons.append([(margin, y), (margin, y + 4), (margin + 2, y + 2)])
+    for i in range(generator.randint(0, int(height / 75))):
+        # Right
+        y = generator.randint(2 * margin, height - 2 * margin)
+        x = width - 1
+        polygons.append([(x - margin, y), (x - margin, y + 4), (x - margin - 2, y + 2)])
+    return polygons
+
+
+# The shapes of the rounded surfaces, by (size, diameter of the corners): black where the surface is drawn
+ROUNDED_MASKS = SurfaceCache(max_bytes=2 * 1024 * 1024)
+
+
+def _rounded_mask(size, diameter):
+    """
+    :param size: the size of the surface
+    :param diameter: the diameter of the corners
+    :return: the shape of the rounded surface, black on transparent, antialiased
+    """
+    key = (size, diameter)
+    mask = ROUNDED_MASKS.get(key)
+    if mask is None:
+        rect = pg.Rect((0, 0), size)
+        mask = pg.Surface(size, pg.SRCALPHA)
+
+        circle = pg.Surface([min(size) * 3] * 2, pg.SRCALPHA)
+        pg.draw.ellipse(circle, (0, 0, 0), circle.get_rect(), 0)
+        circle = pg.transform.smoothscale(circle, [diameter] * 2)
+
+        corner = mask.blit(circle, (0, 0))
+        corner.bottomright = rect.bottomright
+        mask.blit(circle, corner)
+        corner.topright = rect.topright
+        mask.blit(circle, corner)
+        corner.bottomleft = rect.bottomleft
+        mask.blit(circle, corner)
+
+        mask.fill((0, 0, 0), rect.inflate(-corner.w, 0))
+        mask.fill((0, 0, 0), rect.inflate(0, -corner.h))
+        mask = ROUNDED_MASKS.put(key, mask)
+    return mask
+
+
+def rounded_surface(rect, color, radius=1, surface=None):
     """
     AAfilledRoundedRect(surface,rect,color,radius=0.4)
+    The shape (see _rounded_mask) is kept for the next surfaces of the same size: only the colour is applied.
 
-    surface : destination
     rect    : rectangle
     color   : rgb or rgba
     radius  : 0 <= radius <= 1
+    surface : if given, the rounded rectangle is drawn on it (it must have the size of the rect, and an alpha channel)
+              instead of on a new surface
     """
 
     rect = pg.Rect(rect)
     color = pg.Color(*color)
     alpha = color.a
     color.a = 0
-    rect.topleft = 0, 0
-    rect_surface = pg.Surface(rect.size, pg.SRCALPHA)
-
-    circle = pg.Surface([min(rect.size) * 3] * 2, pg.SRCALPHA)
-    pg.draw.ellipse(circle, (0, 0, 0), circle.get_rect(), 0)
-    circle = pg.transform.smoothscale(circle, [int(min(rect.size) * radius)] * 2)
-
-    radius = rect_surface.blit(circle, (0, 0))
-    radius.bottomright = rect.bottomright
-    rect_surface.blit(circle, radius)
-    radius.topright = rect.topright
-    rect_surface.blit(circle, radius)
-    radius.bottomleft = rect.bottomleft
-    rect_surface.blit(circle, radius)
-
-    rect_surface.fill((0, 0, 0), rect.inflate(-radius.w, 0))
-    rect_surface.fill((0, 0, 0), rect.inflate(0, -radius.h))
+    if surface is None:
+        rect_surface = pg.Surface(rect.size, pg.SRCALPHA)
+    else:
+        rect_surface = surface
+        rect_surface.fill((0, 0, 0, 0))
 
+    rect_surface.blit(_rounded_mask(rect.size, int(min(rect.size) * radius)), (0, 0))
     rect_surface.fill(color, special_flags=pg.BLEND_RGBA_MAX)
     rect_surface.fill((255, 255, 255, alpha), special_flags=pg.BLEND_RGBA_MIN)
 
@@ -364,6 +474,8 @@ def rounded_surface(rect, color, radius=1):
 
 
 class Label(Widget):
+    DECORATION_VARIANTS = 8  # Labels alike share their background: only a few variants of the decoration are drawn
+
     DEFAULT_OPTIONS = {
         "font_name": default.FONT_NAME,
         "font_size": 14,
@@ -433,10 +545,13 @@ class Label(Widget):
             self.number_of_lines = 0
 
         # Get the style attributes
-        self.font = GLOBAL.font(self.style_dict.get("font_name", Label.DEFAULT_OPTIONS["font_name"]),
-                                self.style_dict.get("font_size", Label.DEFAULT_OPTIONS["font_size"]))
+        font_name = self.style_dict.get("font_name", Label.DEFAULT_OPTIONS["font_name"])
+        font_size = self.style_dict.get("font_size", Label.DEFAULT_OPTIONS["font_size"])
+        self.font_key = (font_name, font_size)
+        self.font = GLOBAL.font(font_name, font_size)
+        self.text_measure = GLOBAL.text_measure(font_name, font_size)  # To wrap the text without rendering it
         self.theme = self.style_dict.get("theme", Label.DEFAULT_OPTIONS["theme"])
-        self.decoration_instructions = []
+        self.decoration_seed = 0  # Which variant of the decoration, see decoration_polygons
 
         if self.theme:
             assert type(self.theme) is dict, "Theme must be a dictionnary if set"
@@ -468,7 +583,7 @@ class Label(Widget):
         if self.multiline:
             self._compute_multiline_text_image(scroll_index=self.scroll_index)
         else:
-            self.text_image = self.font.render(text, True, self.font_color)
+            self.text_image = GLOBAL.text(*self.font_key, text, self.font_color)
 
         self.text_rect = self.text_image.get_rect()
 
@@ -477,6 +592,7 @@ class Label(Widget):
             self._create_background(force_recreate_decoration=force_recreate_decoration)
 
         # Now we can create the final image: we copy the background and the text
+        previous_size = self.rect.size if self.rect else None
         self.image = self.background_image.copy()
         self.rect = self.image.get_rect()
 
@@ -484,6 +600,9 @@ class Label(Widget):
 
         # And we finally move to the position
         self.rect.topleft = self.position
+        self.mark_dirty()
+        if previous_size is not None and previous_size != self.rect.size:
+            self.size_changed()
 
     @property
     def text_position(self):
@@ -525,7 +644,7 @@ class Label(Widget):
         assert available_dimension_x > 20, "X dimension not set or too small"
         lines = self._wrap_text(available_dimension_x)
         line_images = [
-            self.font.render(line, True, self.font_color) for line in lines
+            GLOBAL.text(*self.font_key, line, self.font_color) for line in lines
         ]
         self.number_of_lines = len(line_images)
         if len(line_images) <= 1 and self.scrollable:
@@ -605,11 +724,54 @@ class Label(Widget):
             self.dimension[1] = self.margin_y_top + self.margin_y_bottom + 1
 
     def _create_background(self, force_recreate_decoration=False):
+        """
+        Set the background image. It is shared by all the labels with the same look (theme, dimension, decoration...)
+        so it must not be drawn on.
+        :param force_recreate_decoration: if set, draw new places for the decoration
+        """
         # this assumes that dimension is correctly set
-        self.background_image = pg.Surface(self.dimension, pg.SRCALPHA)
+        if force_recreate_decoration:
+            self.decoration_seed = random.randrange(Label.DECORATION_VARIANTS)
 
         bg_color = self.style_dict.get("bg_color", Label.DEFAULT_OPTIONS["bg_color"])
+        scrollable_position = scrollable_color = None
+        if self.scrollable:
+            scrollable_position = self.style_dict.get("scrollable_position",
+                                                      Label.DEFAULT_OPTIONS["scrollable_position"])
+            scrollable_color = self.style_dict.get("scrollable_color", Label.DEFAULT_OPTIONS["scrollable_color"])
+            if self.theme and self.theme["borders"]:
+                scrollable_color = self.theme["borders"][-1][1]
+            self._position_scroll_rects(scrollable_position)
+
+        key = (_hashable(self.theme), tuple(self.dimension), _hashable(bg_color), scrollable_position,
+               _hashable(scrollable_color), self.margin_x_left, self.margin_x_right, self.margin_y_top,
+               self.margin_y_bottom, self.decoration_seed)
+        self.background_image = BACKGROUNDS.get(key)
+        if self.background_image is None:
+            self.background_image = BACKGROUNDS.put(key, self._render_background(bg_color, scrollable_color))
+
+    def _position_scroll_rects(self, scrollable_position):
+        """
+        Set the rects of the scroll arrows, on screen
+        """
+        pos_scrollable_x = 0
+        if scrollable_position == "LEFT":
+            pos_scrollable_x = self.margin_x_left - 15
+        elif scrollable_position == "RIGHT":
+            pos_scrollable_x = self.dimension[0] - (self.margin_x_right - 15)
+        self.scroll_top_rect = pg.Rect((pos_scrollable_x, self.margin_y_top), (10, 12)).move(self.position[0],
+                                                                                             self.position[1])
+        self.scroll_bottom_rect = pg.Rect((pos_scrollable_x, self.dimension[1] - self.margin_y_bottom - 12),
+                                          (10, 12)).move(self.position[0], self.position[1])
+
+    def _render_background(self, bg_color, scrollable_color):
+        """
+        Draw the background: theme (borders, decoration) or background colour, and scroll arrows
+        :return: the surface
+        """
+        background_image = pg.Surface(self.dimension, pg.SRCALPHA)
         margin = 0  # Also used in decoration later
+        color = None
 
         if self.theme:
             rect = pg.Rect((0, 0), self.dimension)
@@ -618,12 +780,12 @@ class Label(Widget):
 
                 margin = self.theme["borders"][0][0]
                 color = self.theme["borders"][0][1]
-                self.background_image = rounded_surface(rect, color, radius=self.theme["rounded_angle"])
+                background_image = rounded_surface(rect, color, radius=self.theme["rounded_angle"])
 
                 if len(self.theme["borders"]) > 1:
                     for index in range(1, len(self.theme["borders"])):
                         color = self.theme["borders"][index][1]
-                        self.background_image.blit(
+                        background_image.blit(
                             rounded_surface(rect.inflate(-margin * 2, -margin * 2),
                                             color,
                                             radius=self.theme["rounded_angle"]),
@@ -631,125 +793,44 @@ class Label(Widget):
                         )
                         margin += self.theme["borders"][index][0]
                 # add the internal:
-                self.background_image.blit(rounded_surface(rect.inflate(-margin * 2, -margin * 2),
-                                                           self.theme["bg_color"],
-                                                           radius=self.theme["rounded_angle"]),
-                                           (margin, margin))
+                background_image.blit(rounded_surface(rect.inflate(-margin * 2, -margin * 2),
+                                                      self.theme["bg_color"],
+                                                      radius=self.theme["rounded_angle"]),
+                                      (margin, margin))
 
             elif self.theme["bg_color"]:
                 # We just do something for the background
-                self.background_image = rounded_surface(rect, self.theme["bg_color"],
-                                                        radius=self.theme["rounded_angle"])
+                background_image = rounded_surface(rect, self.theme["bg_color"],
+                                                   radius=self.theme["rounded_angle"])
         elif bg_color:
-            self.background_image.fill(bg_color)
+            background_image.fill(bg_color)
 
         if self.scrollable:
-            scrollable_position = self.style_dict.get("scrollable_position",
-                                                      Label.DEFAULT_OPTIONS["scrollable_position"])
-            scrollable_color = self.style_dict.get("scrollable_color", Label.DEFAULT_OPTIONS["scrollable_color"])
-            if self.theme and self.theme["borders"]:
-                scrollable_color = self.theme["borders"][-1][1]
-
-            pos_scrollable_x = 0
-            if scrollable_position == "LEFT":
-                pos_scrollable_x = self.margin_x_left - 15
-            elif scrollable_position == "RIGHT":
-                pos_scrollable_x = self.background_image.get_rect().width - (self.margin_x_right - 15)
-
-            # Top arrow - aligned with margin_y_top
-            y_arrow_up_ref = self.margin_y_top
-            pg.draw.polygon(self.background_image, scrollable_color,
-                            ((pos_scrollable_x, y_arrow_up_ref + 12),
-                             (pos_scrollable_x + 10, y_arrow_up_ref + 12),
-                             (pos_scrollable_x + 5, y_arrow_up_ref)), 0)
-            self.scroll_top_rect = pg.Rect((pos_scrollable_x, self.margin_y_top), (10, 12)).move(self.position[0],
-                                                                                                 self.position[1])
-
-            # Bottom arrow - aligned with margin_y_bottom
-            y_arrow_bottom_ref = self.background_image.get_rect().height - self.margin_y_bottom
-            pg.draw.polygon(self.background_image, scrollable_color, (
-                (pos_scrollable_x, y_arrow_bottom_ref - 12),
-                (pos_scrollable_x + 10, y_arrow_bottom_ref - 12),
-                (pos_scrollable_x + 5, y_arrow_bottom_ref)), 0)
-            self.scroll_bottom_rect = pg.Rect((pos_scrollable_x, y_arrow_bottom_ref - 12), (10, 12)).move(
-                self.position[0], self.position[1])
-
-        if self.theme and "with_decoration" in self.theme and self.theme["with_decoration"]:
-            if force_recreate_decoration:
-                self.decoration_instruction = []
-                # No more than 1 every 75 pixels in average...
-                for i in range(random.randint(0, int(self.background_image.get_rect().width / 75))):
-                    # Top
-                    x = random.randint(2 * margin, self.background_image.get_rect().width - 2 * margin)
-                    self.decoration_instruction.append(
-                        "pg.draw.polygon(self.background_image, color, "
-                        "[({x}, {margin}), ({x}+4, {margin}), ({x}+2, {margin} + 2)], 0)".format(
-                            x=x, margin=margin))
-                for i in range(random.randint(0, int(self.background_image.get_rect().width / 75))):
-                    # Bottom
-                    x = random.randint(2 * margin, self.background_image.get_rect().width - 2 * margin)
-                    y = self.background_image.get_rect().height - 1
-                    self.decoration_instruction.append(
-                        "pg.draw.polygon(self.background_image, color, "
-                        "[({x}, {y}-{margin}), ({x}+4, {y}-{margin}), ({x}+2, {y}-{margin}-2)], 0)".format(
-                            x=x, margin=margin, y=y))
-                for i in range(random.randint(0, int(self.background_image.get_rect().height / 75))):
-                    # Left
-                    y = random.randint(2 * margin, self.background_image.get_rect().height - 2 * margin)
-                    self.decoration_instruction.append(
-                        "pg.draw.polygon(self.background_image, color, "
-                        "[({margin}, {y}), ({margin}, {y}+4), ({margin}+2, {y}+2)], 0)".format(
-                            y=y, margin=margin))
-                # No more than 1 every 75 pixels in average...
-                for i in range(random.randint(0, int(self.background_image.get_rect().height / 75))):
-                    # Right
-                    y = random.randint(2 * margin, self.background_image.get_rect().height - 2 * margin)
-                    x = self.background_image.get_rect().width - 1
-                    self.decoration_instruction.append(
-                        "pg.draw.polygon(self.background_image, color, "
-                        "[({x}-{margin},{y}), ({x}-{margin},{y}+4), ({x}-{margin}-2,{y}+2)], 0)".format(
-                            x=x, margin=margin, y=y))
-
-            for instruction in self.decoration_instruction:
-                exec(instruction)
-
-    def _wrap_text(self, available_dimension, separator=" "):
+            # The arrows, where the scroll rects are
+            x, top_y = self.scroll_top_rect.move(-self.position[0], -self.position[1]).topleft
+            bottom_y = self.scroll_bottom_rect.move(-self.position[0], -self.position[1]).bottom
+            pg.draw.polygon(background_image, scrollable_color,
+                            ((x, top_y + 12), (x + 10, top_y + 12), (x + 5, top_y)), 0)
+            pg.draw.polygon(background_image, scrollable_color,
+                            ((x, bottom_y - 12), (x + 10, bottom_y - 12), (x + 5, bottom_y)), 0)
+
+        # The decoration takes the color of the last border
+        if self.theme and self.theme.get("with_decoration") and color is not None:
+            for polygon in decoration_polygons(self.dimension, margin, self.decoration_seed):
+                pg.draw.polygon(background_image, color, polygon, 0)
+
+        return background_image
+
+    def _wrap_text(self, available_dimension, separator=" ", text=None):
         """
         Splits a string into a list of strings which font representation is no longer than available dimension.
+        :param text: the string to split, the text of the label if None
         """
-        if self.text is None:
-            self.text = ""
-        words = self.text.split(separator)
-        word_lengths = []
-        for word in words:
-            length = self.font.render(word, True, (0, 0, 0)).get_rect().width
-            word_lengths.append(length)
-            if length > available_dimension:
-                raise Exception("Dimension too small for word! {}".format(word))
-
-        separator_length = self.font.render(separator, True, (0, 0, 0)).get_rect().width
-
-        lines = []
-        current_line = ""
-        current_length = 0
-
-        for counter, word in enumerate(words):
-            word_length = word_lengths[counter]
-            if current_length == 0:
-                current_length = word_length
-                current_line = word
-            else:
-                if current_length + separator_length + word_length <= available_dimension:
-                    current_line = current_line + separator + word
-                    current_length += separator_length + word_length
-                else:
-                    lines.append(current_line)
-                    current_line = word
-                    current_length = word_length
-        if current_line != "":
-            lines.append(current_line)
-
-        return lines
+        if text is None:
+            if self.text is None:
+                self.text = ""
+            text = self.text
+        return self.text_measure.wrap(text, available_dimension, separator=separator)
 
     def handle_event(self, event):
         if event.type == pg.MOUSEBUTTONDOWN:
@@ -776,7 +857,7 @@ class Label(Widget):
         self.rect.move_ip(dx, dy)
         if self.scrollable:
             self.scroll_bottom_rect.move_ip(dx, dy)
-            self.scroll_top_rect.mov(dx, dy)
+            self.scroll_top_rect.move_ip(dx, dy)
 
 
 class SimpleLabel(Label):
@@ -807,6 +888,104 @@ class SimpleLabel(Label):
                        style_dict=style_dict)
 
 
+class LogLabel(Label):
+    """
+    A scrollable multiline label showing a log: each text added is wrapped and rendered once, and its lines kept as
+    images in a ring buffer (the oldest lines are dropped past the capacity). Redrawing only blits the lines in view.
+    When the view shows the last lines, it follows the new ones.
+    """
+
+    def __init__(self,
+                 text=None,
+                 position=(0, 0),
+                 dimension=(10, 10),
+                 style_dict=None,
+                 capacity=200):
+        """
+        :param capacity: the maximum number of lines kept
+        """
+        self.line_images = deque(maxlen=capacity)
+        Label.__init__(self,
+                       text=text,
+                       position=position,
+                       dimension=dimension,
+                       style_dict=style_dict,
+                       multiline=True,
+                       scrollable=True)
+
+    def set_text(self, text, recreate_background=True, force_recreate_decoration=False):
+        """
+        Replace the whole log by the text
+        """
+        self.line_images.clear()
+        self.scroll_index = 0
+        self._add_lines(text or "")
+        Label.set_text(self, text, recreate_background=recreate_background,
+                       force_recreate_decoration=force_recreate_decoration)
+
+    def add_text(self, text):
+        """
+        Add the text to the log, on a new line
+        """
+        following = self.scroll_index >= self.number_of_lines - self.number_of_lines_to_display
+        dropped = self._add_lines(text)
+        if following:
+            self.scroll_index = max(0, self.number_of_lines - self.number_of_lines_to_display)
+        else:
+            self.scroll_index = max(0, self.scroll_index - dropped)
+        self._redraw()
+
+    def _add_lines(self, text):
+        """
+        Wrap and render the text, and add its lines to the buffer
+        :return: the number of lines dropped from the buffer to make room
+        """
+        available_dimension_x = self.dimension[0] - self.margin_x_left - self.margin_x_right
+        assert available_dimension_x > 20, "X dimension not set or too small"
+        lines = self._wrap_text(available_dimension_x, text=text)
+        dropped = max(0, len(self.line_images) + len(lines) - self.line_images.maxlen)
+        self.line_images.extend(self.font.render(line, True, self.font_color) for line in lines)
+        self.number_of_lines = len(self.line_images)
+        return dropped
+
+    def _compute_multiline_text_image(self, scroll_index=0):
+        available_dimension_x = self.dimension[0] - self.margin_x_left - self.margin_x_right
+        available_dimension_y = self.dimension[1] - self.margin_y_top - self.margin_y_bottom
+        line_height = self.font.get_height()
+        assert available_dimension_y >= line_height, "Y dimension too small for multiline"
+        self.number_of_lines_to_display = int(available_dimension_y / line_height)
+
+        self.text_image = pg.Surface((available_dimension_x, available_dimension_y), pg.SRCALPHA)
+        position_x = self.style_dict.get("text_align_x", Label.DEFAULT_OPTIONS["text_align_x"])
+        last_line = min(scroll_index + self.number_of_lines_to_display, len(self.line_images))
+        for i in range(scroll_index, last_line):
+            line_image = self.line_images[i]
+            x = 0
+            if position_x == "CENTER":
+                x = int((available_dimension_x - line_image.get_width()) / 2)
+            elif position_x == "RIGHT":
+                x = available_dimension_x - line_image.get_width()
+            self.text_image.blit(line_image, (x, (i - scroll_index) * line_height))
+
+    def _redraw(self):
+        """
+        Compose the image again from the background and the lines in view
+        """
+        self._compute_multiline_text_image(scroll_index=self.scroll_index)
+        self.text_rect = self.text_image.get_rect()
+        self.image = self.background_image.copy()
+        self._blit_text_on_image()
+        self.mark_dirty()
+
+    def scroll(self, direction):
+        if direction == "UP":
+            self.scroll_index = max(0, self.scroll_index - 1)
+        elif direction == "BOTTOM":
+            self.scroll_index = max(0, min(self.scroll_index + 1,
+                                           self.number_of_lines - self.number_of_lines_to_display))
+        self._redraw()
+
+
 class TextButton(Widget):
     """
     A simple Button, based on a label (without an image)
@@ -882,14 +1061,17 @@ class TextButton(Widget):
 
     def handle_event(self, event):
         if event.type == pg.MOUSEBUTTONDOWN and self.hover:
-            self.hover = False
+            self.set_hover(False)
             self.callback_function()
             return True
         elif event.type == pg.MOUSEMOTION:
-            if self.rect.collidepoint(event.pos):
-                self.hover = True
-            else:
-                self.hover = False
+            self.set_hover(bool(self.rect.collidepoint(event.pos)))
+
+    def set_hover(self, hover):
+        if hover != self.hover:
+            self.hover = hover
+            self.update()
+            self.mark_dirty()
 
     def update(self):
         if self.hover:
@@ -901,6 +1083,233 @@ class TextButton(Widget):
         self.rect.move_ip(dx, dy)
 
 
+class _ListRow:
+    """
+    A row of a VirtualList: an idle and a hover label, given one item after the other while the list scrolls
+    """
+
+    def __init__(self, width, idle_style, hover_style):
+        state = random.getstate()
+        self.idle_label = Label(text=" ", dimension=(width, 10), style_dict=idle_style, grow_height_with_text=True)
+        random.setstate(state)  # Same decoration places for both labels
+        self.hover_label = Label(text=" ", dimension=(width, 10), style_dict=hover_style, grow_height_with_text=True)
+        self.text = None  # The text shown, None if the row is empty
+
+    def set_text(self, text):
+        """
+        :return: True if the text changed
+        """
+        if text == self.text:
+            return False
+        self.text = text
+        if text is not None:
+            self.idle_label.set_text(text, recreate_background=False)
+            self.hover_label.set_text(text, recreate_background=False)
+        return True
+
+
+class VirtualList(Widget):
+    """
+    A scrollable list of items to click on, one row of text per item. Only the rows in view exist: a fixed set of row
+    labels, given another item when the list scrolls, so that the memory and the time to draw do not depend on the
+    number of items.
+    The list keeps the items by reference: when they change, call refresh (only the rows whose text changed are
+    rendered again) or refresh_item for a single item.
+    """
+
+    DEFAULT_OPTIONS = {
+        "font_name": default.FONT_NAME,
+        "font_size": 14,
+
+        "text_margin_x": 5,  # Minimum margin on the right & left, only relevant if a background is set (Color/image)
+        "text_margin_y": 5,  # Minimum margin on the top & down, only relevant if a background is set (Color/image)
+        "text_align_x": "LEFT",
+        "text_align_y": "TOP",
+
+        "font_color_idle": (0, 0, 0),
+        "font_color_hover": (255, 0, 0),
+
+        "bg_color_idle": (255, 255, 255),
+        "bg_color_hover": (0, 255, 255),
+
+        # To set the theme
+        "theme_idle": None,  # the Theme to use when nothing is there
+        "theme_hover": None,  # the Theme to use when the mouse is over
+
+        "row_space": 5,  # Vertical space between two rows
+        "scrollbar_width": 8,
+        "scrollbar_color": (128, 128, 128),
+    }
+
+    def __init__(self,
+                 callback_function=None,
+                 items=None,
+                 item_text=str,
+                 position=(0, 0),
+                 dimension=(200, 300),
+                 style_dict=None):
+        """
+        :param callback_function: called with the item clicked
+        :param items: the list of items, kept by reference
+        :param item_text: function giving the text of an item
+        """
+        assert callback_function, "List defined without callback function"
+
+        Widget.__init__(self)
+
+        self.callback_function = callback_function
+        self.items = items if items is not None else []
+        self.item_text = item_text
+        self.position = position
+        self.dimension = dimension
+        self.style_dict = style_dict or {}
+        self.rect = pg.Rect(position, dimension)
+        self.image = pg.Surface(dimension, pg.SRCALPHA)
+
+        self.row_space = self._option("row_space")
+        self.scrollbar_width = self._option("scrollbar_width")
+        self.scrollbar_color = self._option("scrollbar_color")
+
+        row_width = dimension[0] - self.scrollbar_width
+        idle_style = dict(self.style_dict, font_color=self._option("font_color_idle"),
+                          bg_color=self._option("bg_color_idle"), theme=self._option("theme_idle"))
+        hover_style = dict(self.style_dict, font_color=self._option("font_color_hover"),
+                           bg_color=self._option("bg_color_hover"), theme=self._option("theme_hover"))
+        self.rows = [_ListRow(row_width, idle_style, hover_style)]
+        self.row_height = self.rows[0].idle_label.rect.height
+        row_count = max(1, (dimension[1] + self.row_space) // (self.row_height + self.row_space))
+        self.rows += [_ListRow(row_width, idle_style, hover_style) for _ in range(row_count - 1)]
+
+        self.first_index = 0  # Index of the item in the first row
+        self.hover_row = None  # Index of the row under the mouse
+        self._scrollbar_state = None  # (Number of items, first index) when the scrollbar was drawn
+        self.refresh()
+
+    def _option(self, name):
+        return self.style_dict.get(name, VirtualList.DEFAULT_OPTIONS[name])
+
+    @property
+    def max_first_index(self):
+        return max(0, len(self.items) - len(self.rows))
+
+    def set_items(self, items):
+        """
+        Show another list of items, from the start
+        """
+        self.items = items
+        self.first_index = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        To call when the items changed (added, removed, renamed...): the rows whose text changed are drawn again, and
+        the scrollbar if the number of items or the scroll position changed
+        """
+        self.first_index = min(self.first_index, self.max_first_index)
+        changed = False
+        for row_index in range(len(self.rows)):
+            changed = self._bind_row(row_index) or changed
+        scrollbar_state = (len(self.items), self.first_index)
+        if scrollbar_state != self._scrollbar_state:
+            self._scrollbar_state = scrollbar_state
+            self._draw_scrollbar()
+            changed = True
+        if changed:
+            self.mark_dirty()
+
+    def refresh_item(self, item_index):
+        """
+        To call when an item changed: its row is drawn again if it is in view
+        """
+        row_index = item_index - self.first_index
+        if 0 <= row_index < len(self.rows) and self._bind_row(row_index):
+            self.mark_dirty()
+
+    def _bind_row(self, row_index):
+        """
+        Give the row the item it shows now, and draw it on the image if its text changed
+        :return: True if the row changed
+        """
+        item_index = self.first_index + row_index
+        text = self.item_text(self.items[item_index]) if item_index < len(self.items) else None
+        row = self.rows[row_index]
+        if not row.set_text(text):
+            return False
+        self._draw_row(row_index)
+        return True
+
+    def _row_rect(self, row_index):
+        """
+        :return: the rect of the row, on the image
+        """
+        return pg.Rect(0, row_index * (self.row_height + self.row_space),
+                       self.rect.width - self.scrollbar_width, self.row_height)
+
+    def _draw_row(self, row_index):
+        row = self.rows[row_index]
+        row_rect = self._row_rect(row_index)
+        self.image.fill((0, 0, 0, 0), row_rect)
+        if row.text is not None:
+            label = row.hover_label if row_index == self.hover_row else row.idle_label
+            self.image.blit(label.image, row_rect)
+
+    def _draw_scrollbar(self):
+        scrollbar_rect = pg.Rect(self.rect.width - self.scrollbar_width, 0, self.scrollbar_width, self.rect.height)
+        self.image.fill((0, 0, 0, 0), scrollbar_rect)
+        if len(self.items) > len(self.rows):
+            height = max(self.scrollbar_width, scrollbar_rect.height * len(self.rows) // len(self.items))
+            top = (scrollbar_rect.height - height) * self.first_index // self.max_first_index
+            pg.draw.rect(self.image, self.scrollbar_color,
+                         pg.Rect(scrollbar_rect.left + 2, top, self.scrollbar_width - 4, height))
+
+    def _row_at(self, pos):
+        """
+        :return: the index of the row at the position on screen, None if not on an item
+        """
+        if not self.rect.collidepoint(pos):
+            return None
+        row_index = (pos[1] - self.rect.top) // (self.row_height + self.row_space)
+        if row_index < len(self.rows) and self._row_rect(row_index).move(self.rect.topleft).collidepoint(pos) \
+                and self.rows[row_index].text is not None:
+            return row_index
+        return None
+
+    def set_hover(self, row_index):
+        if row_index != self.hover_row:
+            previous, self.hover_row = self.hover_row, row_index
+            for index in (previous, row_index):
+                if index is not None:
+                    self._draw_row(index)
+            self.mark_dirty()
+
+    def scroll(self, rows):
+        """
+        :param rows: the number of rows to scroll down (up if negative)
+        """
+        first_index = max(0, min(self.first_index + rows, self.max_first_index))
+        if first_index != self.first_index:
+            self.first_index = first_index
+            self.refresh()
+
+    def handle_event(self, event):
+        if event.type == pg.MOUSEMOTION:
+            self.set_hover(self._row_at(event.pos))
+        elif event.type == pg.MOUSEBUTTONDOWN and event.button == 1:
+            row_index = self._row_at(event.pos)
+            if row_index is not None:
+                self.callback_function(self.items[self.first_index + row_index])
+                self.set_hover(self._row_at(event.pos))  # The row may show another item now
+                return True
+        elif event.type == pg.MOUSEWHEEL and self.rect.collidepoint(pg.mouse.get_pos()):
+            self.scroll(-event.y)
+            return True
+
+    def move(self, dx, dy):
+        self.position = (self.position[0] + dx,
+                         self.position[1] + dy)
+        self.rect.move_ip(dx, dy)
+
+
 class SelectButton(Widget):
     """
     A widget that allows to switch between values
@@ -996,13 +1405,16 @@ class SelectButton(Widget):
                 self.index_list = (self.index_list - 1) % len(self.text_labels)
             else:
                 self.index_list = (self.index_list + 1) % len(self.text_labels)
+            self.update()
+            self.mark_dirty()
             self.callback_function(self.texts[self.index_list])
             return True
         elif event.type == pg.MOUSEMOTION:
-            if self.rect.collidepoint(event.pos):
-                self.hover = True
-            else:
-                self.hover = False
+            hover = bool(self.rect.collidepoint(event.pos))
+            if hover != self.hover:
+                self.hover = hover
+                self.update()
+                self.mark_dirty()
 
     def update(self):
         if self.hover:
@@ -1045,14 +1457,17 @@ class ImageButton(Widget):
 
     def handle_event(self, event):
         if event.type == pg.MOUSEBUTTONDOWN and self.hover:
-            self.hover = False
+            self.set_hover(False)
             self.callback_function()
             return True
         elif event.type == pg.MOUSEMOTION:
-            if self.rect.collidepoint(event.pos):
-                self.hover = True
-            else:
-                self.hover = False
+            self.set_hover(bool(self.rect.collidepoint(event.pos)))
+
+    def set_hover(self, hover):
+        if hover != self.hover:
+            self.hover = hover
+            self.update()
+            self.mark_dirty()
 
     def update(self):
         if self.hover:
@@ -1260,6 +1675,7 @@ class RadioButtonGroup(Widget):
                 self._create_foreground()
                 self.image = self.background_image.copy()
                 self.image.blit(self.foreground_image, (self.margin_x_left, self.margin_y_top))
+                self.mark_dirty()
 
                 self.callback_function(self.texts[self.selected_index])
                 return True
@@ -1269,6 +1685,9 @@ class RadioButtonGroup(Widget):
 
 
 class TextInput(Widget):
+    updated_every_frame = True  # The cursor blinks
+    handles_keys = True
+
     DEFAULT_OPTIONS = {
         "font_name": default.FONT_NAME,
         "font_size": 14,
@@ -1528,7 +1947,7 @@ def display_single_message_on_screen(text, position="CENTER", font_size=18, eras
     :return:
     """
     # Maybe optimize the stuff below
-    font = pg.font.Font(os.path.join(default.FONT_FOLDER, default.FONT_NAME), font_size)
+    font = GLOBAL.font(default.FONT_NAME, font_size)
 
     screen = pg.display.get_surface()
     if erase_screen_first:
@@ -1,17 +1,17 @@
 import random
 import sys
 
-import dill as pick
 import pygame as pg
 
 from default import *
 from entity.player import Player
 from entity.town import Entrance, Bank, GuildFighter, GuildMule, Shop, Tavern, Trade, Townhall, Temple
-from gui import guiwidget
-from gui.guicontainer import LineAlignedContainer
+from gui.guicontainer import Box, Grid
 from gui.guiwidget import Widget, SimpleLabel, \
-    RadioButtonGroup, SelectButton, TextInput, TextButton, Label
-from region.region import RegionFactory
+    RadioButtonGroup, SelectButton, TextInput, TextButton, Label, LogLabel, ProgressBar
+from gui.widgettree import WidgetTree
+from region.world import WorldGeneration
+from save.savegame import SaveGame
 from shared import GLOBAL
 from utilities import FieldOfView
 from utilities import MName
@@ -20,23 +20,29 @@ from utilities import MName
 class Screen:
 
     def __init__(self):
-        self.widgets = []
+        self.widgets = WidgetTree()
+
+    def enter(self):
+        """
+        Called when the screen becomes the current one: it is drawn again entirely
+        """
+        self.widgets.mark_dirty()
 
     def events(self):
         pass
 
     def update(self):
-        for widget in self.widgets:
-            widget.update()
-
+        self.widgets.update()
 
     def draw(self):
+        if not self.widgets.needs_redraw:
+            return  # Nothing changed since the last frame
+
         # Erase All
         screen = pg.display.get_surface()
         screen.fill(BGCOLOR)
 
-        for widget in self.widgets:
-            widget.draw(screen)
+        self.widgets.draw(screen)
 
         pg.display.flip()
 
@@ -50,12 +56,13 @@ class Screen:
 
 class PlayingScreen(Screen):
     class Camera:
-        def __init__(self):
+        def __init__(self, view_dimension=(PLAYABLE_WIDTH, PLAYABLE_HEIGHT)):
             width_map, height_map = 10, 10  # Will be updated later in the update function,
             # this depends from current map
             self.camera = pg.Rect(0, 0, width_map, height_map)
             self.width = width_map
             self.height = height_map
+            self.view_dimension = view_dimension  # The part of the map shown, in pixels at the tile resolution
 
         def apply(self, entity):
             return entity.rect.move(self.camera.topleft)
@@ -66,15 +73,16 @@ class PlayingScreen(Screen):
         def update(self, pos_tile):
             self.width = GLOBAL.game.current_region.background.get_width()
             self.height = GLOBAL.game.current_region.background.get_height()
+            view_width, view_height = self.view_dimension
 
-            x = -pos_tile[0] * TILESIZE_SCREEN[0] + int(PLAYABLE_WIDTH / 2)
-            y = -pos_tile[1] * TILESIZE_SCREEN[1] + int(PLAYABLE_HEIGHT / 2)
+            x = -pos_tile[0] * TILESIZE_SCREEN[0] + int(view_width / 2)
+            y = -pos_tile[1] * TILESIZE_SCREEN[1] + int(view_height / 2)
 
             # limit scrolling to map size
             x = min(0, x)  # left
             y = min(0, y)  # up
-            x = max(-(self.width - PLAYABLE_WIDTH), x)
-            y = max(-(self.height - PLAYABLE_HEIGHT), y)
+            x = max(-(self.width - view_width), x)
+            y = max(-(self.height - view_height), y)
 
             # and apply it to the camera rect
             self.camera = pg.Rect(x, y, self.width, self.height)
@@ -89,11 +97,62 @@ class PlayingScreen(Screen):
             return screen_x - cam_x, screen_y - cam_y
 
     class PlayableScreen(Widget):
+        """
+        The map around the player. It is drawn at the resolution of the tiles on an offscreen surface (the view), which
+        is then scaled once to the size of the widget on screen: resizing the window or zooming never draws the region
+        background or the images again.
+        Zooming changes how much of the map the view shows: one view surface is kept per zoom level.
+        """
+        updated_every_frame = True
+        handles_keys = True
+
+        ZOOM_LEVELS = (0.5, 1, 1.5, 2)
+
         def __init__(self, top_left):
+            Widget.__init__(self)
             self.top_left = top_left
-            self.dimension = (PLAYABLE_WIDTH, PLAYABLE_HEIGHT)
-            self.camera = PlayingScreen.Camera()
+            self.dimension = (PLAYABLE_WIDTH, PLAYABLE_HEIGHT)  # On screen
+            self.rect = pg.Rect(top_left, self.dimension)
+            self.zoom = 1
+            self.camera = PlayingScreen.Camera(view_dimension=self.view_dimension)
             self.fog_of_war_mask = None
+            self.views = {}  # zoom -> the offscreen surface the map is drawn on
+            self.scaled_view = None  # The view scaled to the dimension, reused from one frame to the next
+
+        @property
+        def view_dimension(self):
+            """
+            :return: the dimension of the part of the map shown, in pixels at the tile resolution
+            """
+            return int(PLAYABLE_WIDTH / self.zoom), int(PLAYABLE_HEIGHT / self.zoom)
+
+        def set_zoom(self, zoom):
+            if zoom != self.zoom:
+                self.zoom = zoom
+                self.camera.view_dimension = self.view_dimension
+                self.camera.update(GLOBAL.game.player.pos)
+                self.fog_of_war_mask = None  # It follows the camera
+                self.mark_dirty()
+
+        def zoom_in(self, steps=1):
+            """
+            :param steps: the number of zoom levels to go through, negative to zoom out
+            """
+            index = PlayingScreen.PlayableScreen.ZOOM_LEVELS.index(self.zoom) + steps
+            index = max(0, min(index, len(PlayingScreen.PlayableScreen.ZOOM_LEVELS) - 1))
+            self.set_zoom(PlayingScreen.PlayableScreen.ZOOM_LEVELS[index])
+
+        def fit(self, area):
+            """
+            Take the biggest dimension fitting in the area, keeping the proportions of the map
+            :param area: the rect available on screen
+            """
+            scale = min(area.width / PLAYABLE_WIDTH, area.height / PLAYABLE_HEIGHT)
+            self.top_left = area.topleft
+            self.dimension = (max(1, int(PLAYABLE_WIDTH * scale)), max(1, int(PLAYABLE_HEIGHT * scale)))
+            self.rect = pg.Rect(self.top_left, self.dimension)
+            if self.parent is not None:
+                self.parent.reindex()
 
         def update(self):
             for sprite_group in GLOBAL.game.current_region.all_groups:
@@ -103,9 +162,13 @@ class PlayingScreen(Screen):
 
         def draw(self, screen):
             # Playable Background
-            playable_background = pg.Surface(self.dimension)
+            view_dimension = self.view_dimension
+            playable_background = self.views.get(self.zoom)
+            if playable_background is None:
+                playable_background = self.views[self.zoom] = pg.Surface(view_dimension)
+            playable_background.fill(BGCOLOR)
             playable_background.blit(GLOBAL.game.current_region.background,
-                                     self.camera.apply_rect(pg.Rect(0, 0, PLAYABLE_WIDTH, PLAYABLE_HEIGHT)))
+                                     self.camera.apply_rect(pg.Rect((0, 0), view_dimension)))
 
             # Add all the game objects on the playable entity
             for sprite_group in GLOBAL.game.current_region.all_groups:
@@ -117,7 +180,7 @@ class PlayingScreen(Screen):
                 # Recompute the player vision matrix, that flag the explored part
                 FieldOfView.get_vision_matrix_for(GLOBAL.game.player, GLOBAL.game.current_region, flag_explored=True)
 
-                self.fog_of_war_mask = pg.Surface((PLAYABLE_WIDTH, PLAYABLE_HEIGHT), pg.SRCALPHA, 32)
+                self.fog_of_war_mask = pg.Surface(view_dimension, pg.SRCALPHA, 32)
 
                 black = pg.Surface(TILESIZE_SCREEN)
                 black.fill(BGCOLOR)
@@ -139,8 +202,14 @@ class PlayingScreen(Screen):
 
             playable_background.blit(self.fog_of_war_mask, (0, 0))
 
-            # Playable background commit
-            screen.blit(playable_background, pg.Rect(self.top_left, (PLAYABLE_WIDTH, PLAYABLE_HEIGHT)))
+            # Playable background commit, scaled to the dimension on screen
+            if view_dimension == self.dimension:
+                screen.blit(playable_background, self.rect)
+            else:
+                if self.scaled_view is None or self.scaled_view.get_size() != self.dimension:
+                    self.scaled_view = pg.Surface(self.dimension)
+                pg.transform.scale(playable_background, self.dimension, self.scaled_view)
+                screen.blit(self.scaled_view, self.rect)
 
         def handle_event(self, event):
 
@@ -160,24 +229,30 @@ class PlayingScreen(Screen):
                     GLOBAL.game.player.move(dy=1)
                     return True
 
+                # Zoom
+                if event.key in (pg.K_PLUS, pg.K_EQUALS, pg.K_KP_PLUS):
+                    self.zoom_in()
+                    return True
+                if event.key in (pg.K_MINUS, pg.K_KP_MINUS):
+                    self.zoom_in(-1)
+                    return True
+
                 # Save
                 if event.key == pg.K_s:
-                    print("SAVING and EXIT")
-                    GLOBAL.game.clean_graphics_before_save()
-                    GLOBAL.clean_before_save()
-                    self.fog_of_war_mask = None
-
-                    with open("savegame", "wb") as f:
-                        pick.dump([GLOBAL.game], f)
-                    GLOBAL.game.quit()
+                    GLOBAL.logger.inform("Saving...")
+                    GLOBAL.game.autosave.save_in_background(GLOBAL.game, SaveGame(), message="Game saved")
+                    return True
 
             if event.type == pg.MOUSEBUTTONDOWN:
                 (button1, button2, button3) = pg.mouse.get_pressed()
                 (x, y) = pg.mouse.get_pos()
-                if not pg.Rect(self.top_left, (PLAYABLE_WIDTH, PLAYABLE_HEIGHT)).collidepoint(x, y):
+                if not self.rect.collidepoint(x, y):
                     return False
                 if button1:
-                    (rev_x, rev_y) = self.camera.reverse((x - self.top_left[0], y - self.top_left[1]))
+                    # From the screen to the view, then to the map
+                    view_width, view_height = self.view_dimension
+                    (rev_x, rev_y) = self.camera.reverse((int((x - self.rect.left) * view_width / self.rect.width),
+                                                          int((y - self.rect.top) * view_height / self.rect.height)))
                     (x, y) = (int(rev_x / TILESIZE_SCREEN[0]), int(rev_y / TILESIZE_SCREEN[1]))
                     print(GLOBAL.game.current_region.tiles[x][y].tile_type)
                     return True
@@ -185,12 +260,13 @@ class PlayingScreen(Screen):
 
     def __init__(self):
         Screen.__init__(self)
-        self.widgets.append(PlayingScreen.PlayableScreen((10, 10)))
+        self.playable_screen = PlayingScreen.PlayableScreen((10, 10))
+        self.widgets.add(self.playable_screen)
 
     def post_init(self):
-        self.widgets.append(MainTextAreaWidget.get_widget())
+        self.widgets.add(MainTextAreaWidget.get_widget())
         pass
-        '''self.widgets.append(ProgressBar(
+        '''self.widgets.add(ProgressBar(
             position=(10, 10),
             dimension=(100, 10),
             object_to_follow=GLOBAL.game.player,
@@ -207,20 +283,29 @@ class PlayingScreen(Screen):
 
     def update(self):
         # Update region
-        GLOBAL.game.current_region.ticker.advance_ticks()
+        if GLOBAL.game.current_region.ticker.advance_ticks():
+            GLOBAL.game.autosave.end_of_turn(GLOBAL.game)
 
-        for widget in self.widgets:
-            widget.update()
+        self.widgets.update()
 
     def events(self):
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 GLOBAL.game.quit()
+            elif event.type == pg.VIDEORESIZE:
+                self.resize(pg.display.get_surface().get_rect())
             else:
-                handled = False
-                for widget in self.widgets:
-                    if not handled:
-                        handled = widget.handle_event(event)
+                self.widgets.handle_event(event)
+
+    def resize(self, screen_rect):
+        """
+        The map takes the room left above the text area, which stays at the bottom
+        """
+        self.playable_screen.fit(pg.Rect(10, 10, screen_rect.width - 20,
+                                         screen_rect.height - MainTextAreaWidget.HEIGHT - 20))
+        text_area = MainTextAreaWidget.get_widget()
+        text_area.move(0, screen_rect.height - MainTextAreaWidget.HEIGHT - text_area.rect.top)
+        self.widgets.reindex()
 
 
 class PlayerCreationScreen(Screen):
@@ -234,6 +319,7 @@ class PlayerCreationScreen(Screen):
         self.label_charisma_value = None
         self.label_friendship_value = None
         self.label_erudition_value = None
+        self.form = None  # The layout of the widgets
 
         self.build_widgets()
 
@@ -268,43 +354,19 @@ class PlayerCreationScreen(Screen):
         nameinput= TextInput(max_displayed_input=30, property_to_follow=self.name,
                              callback_function=self.validate, style_dict={"text":"Let's go!"})
 
-        # First we align all widgets vertically
-        LineAlignedContainer((50, 100), end_position=(50, pg.display.get_surface().get_rect().height - 100),
-                             alignment=LineAlignedContainer.VERTICAL_LEFT, auto_space=True,
-                             widgets=(label_gender,
-                                      label_race,
-                                      label_characteristics,
-                                      label_strength,
-                                      label_charisma,
-                                      label_friendship,
-                                      label_erudition,
-                                      reroll,
-                                      nameinput))
-
-        # Now the lines (note we don't care about the y position on the end position)
-        LineAlignedContainer(label_gender.rect.topleft, widgets=(label_gender, genderchoice),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        LineAlignedContainer(label_race.rect.topleft, widgets=(label_race, racechoice),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        LineAlignedContainer(label_strength.rect.topleft, widgets=(label_strength, self.label_strength_value),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        LineAlignedContainer(label_charisma.rect.topleft, widgets=(label_charisma, self.label_charisma_value),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        LineAlignedContainer(label_friendship.rect.topleft, widgets=(label_friendship, self.label_friendship_value),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        LineAlignedContainer(label_erudition.rect.topleft, widgets=(label_erudition, self.label_erudition_value),
-                             alignment=LineAlignedContainer.HORIZONTAL_TOP,
-                             end_position=(pg.display.get_surface().get_rect().width - 50, 0), auto_space=True)
-        # Last let's align the characteristics vertically for better effect
-        LineAlignedContainer(self.label_strength_value.rect.topright,
-                             alignment=LineAlignedContainer.VERTICAL_RIGHT,
-                             widgets=(self.label_strength_value, self.label_charisma_value,
-                                      self.label_friendship_value, self.label_erudition_value))
+        # One layout for the form: the lines spread from the top to the bottom, the choices at the right
+        self.form = Box(Box.VERTICAL, justify=Box.SPREAD, align=Box.STRETCH, children=(
+            Box(Box.HORIZONTAL, children=(label_gender, genderchoice), justify=Box.SPREAD),
+            Box(Box.HORIZONTAL, children=(label_race, racechoice), justify=Box.SPREAD),
+            label_characteristics,
+            Grid(2, children=(label_strength, self.label_strength_value,
+                              label_charisma, self.label_charisma_value,
+                              label_friendship, self.label_friendship_value,
+                              label_erudition, self.label_erudition_value),
+                 space_x=50, space_y=10, column_align=(Grid.START, Grid.END)),
+            reroll,
+            nameinput))
+        self._layout_form()
 
         for w in (label_gender, genderchoice, label_race, racechoice,
                   label_characteristics,
@@ -313,10 +375,14 @@ class PlayerCreationScreen(Screen):
                   self.label_friendship_value, self.label_erudition_value,
                   reroll, nameinput
                   ):
-            self.widgets.append(w)
+            self.widgets.add(w)
 
         self.reroll_chosen()
 
+    def _layout_form(self):
+        screen_rect = pg.display.get_surface().get_rect()
+        self.form.layout(pg.Rect(50, 100, screen_rect.width - 100, screen_rect.height - 200))
+
     def events(self):
         for event in pg.event.get():
             if event.type == pg.QUIT:
@@ -325,11 +391,11 @@ class PlayerCreationScreen(Screen):
                 else:
                     pg.quit()
                     sys.exit()
+            elif event.type == pg.VIDEORESIZE:
+                self._layout_form()
+                self.widgets.mark_dirty()
             else:
-                handled = False
-                for widget in self.widgets:
-                    if not handled:
-                        handled = widget.handle_event(event)
+                self.widgets.handle_event(event)
 
     def gender_chosen(self, *args, **kwargs):
         self.playershell["Gender"] = str(args[0])
@@ -359,64 +425,81 @@ class PlayerCreationScreen(Screen):
 
 
 class WorldCreationScreen(Screen):
+    """
+    Generates the world one step (one region) per frame, with a progress bar and the time taken by each step. The
+    events are handled between two steps, so that the window stays responsive.
+    """
 
     def __init__(self):
         Screen.__init__(self)
+        self.generation = None  # The WorldGeneration in progress
+        self.stage_label = None
+        self.timings_label = None
+        self.layout = None
+
+    def enter(self):
+        screen_rect = pg.display.get_surface().get_rect()
+        self.generation = WorldGeneration(GLOBAL.game.world)
+        self.stage_label = SimpleLabel(text="Generating World")
+        progress_bar = ProgressBar(dimension=(int(screen_rect.width / 2), 20),
+                                   object_to_follow=self.generation,
+                                   attribute_to_follow="done",
+                                   max_value=self.generation.step_count,
+                                   style_dict={"color": LIGHTGREY, "bg_color": DARKGREY})
+        self.timings_label = LogLabel(dimension=(int(screen_rect.width / 2), 150))
+        self.widgets.clear()
+        self.widgets.add_all((self.stage_label, progress_bar, self.timings_label))
+        self.layout = Box(Box.VERTICAL, children=(self.stage_label, progress_bar, self.timings_label), space=20,
+                          align=Box.CENTER, justify=Box.CENTER)
+        self.layout.layout(screen_rect)
+        Screen.enter(self)
 
-    def update(self):
+    def events(self):
+        for event in pg.event.get():
+            if event.type == pg.QUIT:
+                GLOBAL.game.quit()
+            elif event.type == pg.VIDEORESIZE:
+                self.layout.layout(pg.display.get_surface().get_rect())
+                self.widgets.mark_dirty()
+            else:
+                self.widgets.handle_event(event)
 
-        guiwidget.display_single_message_on_screen("Generating World")
-
-        guiwidget.display_single_message_on_screen("Generating World - Wilderness")
-        player_spawn_pos = None  # this will be a town on a wilderness
-
-        name = None
-        for _i in range(1):
-            name = MName.place_name()
-            town_list = []
-            for _j in range(random.randint(2, 6)):
-                name_town = "{}'s Town".format(MName.person_name())
-                town_region = RegionFactory.invoke(name_town,
-                                                   wilderness_index=name,
-                                                   region_type=RegionFactory.REGION_TOWN,
-                                                   building_list=(Entrance(),
-                                                                  # Bank(),
-                                                                  # GuildMule(),
-                                                                  GuildFighter(),
-                                                                  # Shop(),
-                                                                  # Tavern(), Trade(), Townhall(), Temple()
-                                                                  )
-                                                   )
-                town_list.append(town_region)
-                GLOBAL.game.world[name_town] = town_region
-
-            GLOBAL.game.world[name] = RegionFactory.invoke(name,
-                                                    region_type=RegionFactory.REGION_WILDERNESS,
-                                                    town_list=town_list)
-            player_spawn_pos = town_list[0].town.pos  # small hack
-
-        guiwidget.display_single_message_on_screen("World ok")
-
-        GLOBAL.game.current_region = GLOBAL.game.world[name]
-        # We start the player, and we add it at his spawning position (a town of hte latest wilderness)
-        #self.player = Player()
-        GLOBAL.game.player.assign_entity_to_region(GLOBAL.game.current_region)
-        (GLOBAL.game.player.x, GLOBAL.game.player.y) = player_spawn_pos
-        GLOBAL.game.update_state(GLOBAL.game.GAME_STATE_PLAYING)
+    def update(self):
+        timing_count = len(self.generation.timings)
+        finished = self.generation.step()
+        for stage, seconds in self.generation.timings[timing_count:]:
+            self.timings_label.add_text("{} - {:.0f} ms".format(stage, seconds * 1000))
+        Screen.update(self)  # The progress bar follows the steps done
+
+        if finished:
+            GLOBAL.logger.trace("World generated in {:.0f} ms".format(
+                sum(seconds for _, seconds in self.generation.timings) * 1000))
+            wilderness, player_spawn_pos = self.generation.result  # this will be a town on a wilderness
+            self.generation = self.layout = None
+            self.widgets.clear()
+
+            GLOBAL.game.current_region = wilderness
+            # We start the player, and we add it at his spawning position (a town of hte latest wilderness)
+            GLOBAL.game.player.assign_entity_to_region(GLOBAL.game.current_region)
+            (GLOBAL.game.player.x, GLOBAL.game.player.y) = player_spawn_pos
+            GLOBAL.game.update_state(GLOBAL.game.GAME_STATE_PLAYING)
+        else:
+            self.stage_label.set_text("Generating World - " + self.generation.stage)
 
 
 ## Shared Widgets
 
 
-class MainTextAreaWidget(Label):
+class MainTextAreaWidget(LogLabel):
 
     HEIGHT = 60
+    CAPACITY = 500  # Number of lines kept in the log
 
     def __init__(self):
-        Label.__init__(self, text="Welcome", multiline=True,
-                       scrollable=True,
-                       dimension=(pg.display.get_surface().get_width(), MainTextAreaWidget.HEIGHT),
-                       position=(0, pg.display.get_surface().get_height() - MainTextAreaWidget.HEIGHT))
+        LogLabel.__init__(self, text="Welcome",
+                          dimension=(pg.display.get_surface().get_width(), MainTextAreaWidget.HEIGHT),
+                          position=(0, pg.display.get_surface().get_height() - MainTextAreaWidget.HEIGHT),
+                          capacity=MainTextAreaWidget.CAPACITY)
 
         GLOBAL.bus.register(self, function_to_call=MainTextAreaWidget.add_text_to_box)
 
@@ -438,7 +521,6 @@ def enroll_fighter(fighter, buildingscreen):
         GLOBAL.logger.inform(fighter.name + " joined the player")
         GLOBAL.bus.publish(buildingscreen, {"text":"YOYOYO"})
         buildingscreen.building.fighter_list.remove(fighter)  # we remove the fighter from eth building as well
-        buildingscreen.attach_building(
-            buildingscreen.building)  # and ask to redraw the widgets (seem there is a pb for the  last  fighter)
+        buildingscreen.fighters_changed()  # and the list shows it
     else:
         print("Impossible to add the player to player list!")
@@ -0,0 +1,149 @@
+import pygame as pg
+
+
+class WidgetTree:
+    """
+    The widgets of a screen, kept from one frame to the next:
+    - the mouse events only go to the widgets under the mouse, found with a spatial index of their rects (a grid of
+      cells, each listing the widgets overlapping it), and to the widgets following the mouse (except the wheel
+      events). The key events only go to the widgets handling keys.
+    - only the widgets changing by themselves (updated_every_frame) are updated at each frame.
+    - a widget whose image changes marks itself dirty (see Widget.mark_dirty), and so the tree: the screen only needs
+      to be drawn again when the tree is dirty, or has widgets changing by themselves.
+    The index is built again when widgets are added or removed. When widgets are moved, call reindex.
+    """
+
+    CELL_SIZE = 64  # In pixels
+    MOUSE_EVENTS = (pg.MOUSEMOTION, pg.MOUSEBUTTONDOWN, pg.MOUSEBUTTONUP)
+    KEY_EVENTS = (pg.KEYDOWN, pg.KEYUP, pg.TEXTINPUT)
+
+    def __init__(self, widgets=None):
+        self.widgets = []
+        self.dirty = True
+        self._order = {}  # widget -> its position in the tree: the events are given in this order
+        self._cells = None  # (cell x, cell y) -> widgets overlapping the cell. None when to be built again.
+        self._following_mouse = []
+        self._handling_keys = []
+        self._updated_every_frame = []
+        self._under_mouse = []  # The widgets under the mouse at the last move, to tell them when the mouse leaves
+        if widgets:
+            self.add_all(widgets)
+
+    def __iter__(self):
+        return iter(self.widgets)
+
+    def __len__(self):
+        return len(self.widgets)
+
+    def __contains__(self, widget):
+        return widget in self._order
+
+    def add(self, widget):
+        """
+        Add a widget, on top of the others
+        """
+        assert widget not in self._order, "Widget already in the tree"
+        widget.parent = self
+        self.widgets.append(widget)
+        self._changed()
+
+    def add_all(self, widgets):
+        for widget in widgets:
+            self.add(widget)
+
+    def remove(self, widget):
+        if widget in self._order:
+            widget.parent = None
+            self.widgets.remove(widget)
+            self._changed()
+
+    def clear(self):
+        for widget in self.widgets:
+            widget.parent = None
+        self.widgets = []
+        self._changed()
+
+    def _changed(self):
+        self._order = {widget: index for index, widget in enumerate(self.widgets)}
+        self._following_mouse = [widget for widget in self.widgets if widget.follows_mouse]
+        self._handling_keys = [widget for widget in self.widgets if widget.handles_keys]
+        self._updated_every_frame = [widget for widget in self.widgets if widget.updated_every_frame]
+        self._under_mouse = [widget for widget in self._under_mouse if widget in self._order]
+        self.reindex()
+
+    def reindex(self):
+        """
+        To call when widgets moved: the index of their rects is built again when next needed
+        """
+        self._cells = None
+        self.mark_dirty()
+
+    def _build_index(self):
+        self._cells = {}
+        size = WidgetTree.CELL_SIZE
+        for widget in self.widgets:
+            rect = widget.rect
+            if rect is None or rect.width <= 0 or rect.height <= 0:
+                continue
+            for x in range(rect.left // size, (rect.right - 1) // size + 1):
+                for y in range(rect.top // size, (rect.bottom - 1) // size + 1):
+                    self._cells.setdefault((x, y), []).append(widget)
+
+    def widgets_at(self, pos):
+        """
+        :param pos: a position on the screen
+        :return: the widgets which rect contains the position, in the order of the tree
+        """
+        if self._cells is None:
+            self._build_index()
+        cell = (pos[0] // WidgetTree.CELL_SIZE, pos[1] // WidgetTree.CELL_SIZE)
+        return [widget for widget in self._cells.get(cell, ()) if widget.rect.collidepoint(pos)]
+
+    def mark_dirty(self):
+        self.dirty = True
+
+    @property
+    def needs_redraw(self):
+        return self.dirty or len(self._updated_every_frame) > 0
+
+    def handle_event(self, event):
+        """
+        Give the event to the widgets concerned, in order, until one handles it
+        :param event: a Pygame Event
+        :return: True if a widget handled the event
+        """
+        if event.type == pg.MOUSEWHEEL:
+            # A wheel event has no position: it goes to the widgets under the mouse
+            targets = self.widgets_at(pg.mouse.get_pos())
+        elif event.type in WidgetTree.MOUSE_EVENTS:
+            targets = self.widgets_at(event.pos)
+            if event.type == pg.MOUSEMOTION:
+                left = [widget for widget in self._under_mouse if widget not in targets]
+                self._under_mouse = targets
+                targets = targets + left
+            targets += [widget for widget in self._following_mouse if widget not in targets]
+            targets.sort(key=self._order.get)
+        elif event.type in WidgetTree.KEY_EVENTS:
+            targets = self._handling_keys
+        else:
+            # Window events (resized, exposed...): everything may have to be drawn again
+            self.mark_dirty()
+            targets = self.widgets
+        for widget in targets:
+            if widget.handle_event(event):
+                return True
+        return False
+
+    def update(self):
+        for widget in self._updated_every_frame:
+            widget.update()
+
+    def draw(self, screen):
+        """
+        Draw all the widgets, in order
+        :param screen: the surface to draw on
+        """
+        for widget in self.widgets:
+            widget.draw(screen)
+            widget.dirty = False
+        self.dirty = False
@@ -1,14 +1,17 @@
 # import random
 import sys
 
-import dill as pick
 import pygame as pg
 
 import default
 from gui.buildingscreen import BuildingScreen
-from gui.guicontainer import LineAlignedContainer
+from gui.guicontainer import Box
 from gui.guiwidget import TextButton, Style
+from gui.widgettree import WidgetTree
 from gui.screen import PlayingScreen, PlayerCreationScreen, WorldCreationScreen
+from region.world import World
+from save.autosave import AutoSave
+from save.savegame import SaveGame, SAVE_DIRECTORY
 from shared import GLOBAL
 
 
@@ -40,7 +43,8 @@ class Game:
         self.player = None
         self.invalidate_fog_of_war = True
 
-        self.world = {}  # The world contains all the wilderness regions and all towns
+        self.world = World()  # The world contains all the wilderness regions and all towns
+        self.autosave = AutoSave()
 
     def post_init(self):
         # Post init on screens
@@ -60,6 +64,7 @@ class Game:
             if self._switching_state is not None:
                 self._state = self._switching_state
                 self._switching_state = None
+                self.screens[self._state].enter()
 
             if self._switching_state is None:
                 self.screens[self._state].events()
@@ -69,22 +74,12 @@ class Game:
                 self.screens[self._state].draw()
             clock.tick(40)  # the program will never run at more than 40 frames per second
 
-    def reinit_graphics_after_save(self):
-        for region_name in self.world:
-            for entity in self.world[region_name].region_entities:
-                entity.init_graphics()
-
-    def clean_graphics_before_save(self):
-        for region_name in self.world:
-            for entity in self.world[region_name].region_entities:
-                entity.clean_before_save()
-            self.world[region_name].clean_before_save()
-
     def update_state(self, new_state):
         self._switching_state = new_state
 
     @staticmethod
     def quit():
+        GLOBAL.game.autosave.wait()  # Do not leave a save half written
         pg.quit()
         sys.exit()
 
@@ -97,7 +92,8 @@ class Launcher:
     """
 
     def __init__(self):
-        self.widgets = None
+        self.widgets = WidgetTree()
+        self.menu = None  # The layout of the buttons
         Launcher.init_pygame_subsystem()
         Launcher.load_data()
 
@@ -147,25 +143,25 @@ class Launcher:
                                  callback_function=Launcher.quit,
                                  style_dict={"text_align_x": "CENTER",
                                              "text_align_y": "CENTER"})
-        line = LineAlignedContainer(int(pg.display.get_surface().get_rect().width / 2),
-                                    alignment=LineAlignedContainer.VERTICAL_CENTER,
-                                    widgets=(button_start, button_load, button_quit),
-                                    space=100)
-        self.widgets = line.widgets_as_list()
+        self.menu = Box(Box.VERTICAL, children=(button_start, button_load, button_quit), space=100,
+                        align=Box.CENTER, justify=Box.CENTER)
+        self.menu.layout(pg.display.get_surface().get_rect())
+        self.widgets.add_all(self.menu.children)
 
     def draw(self):
+        if not self.widgets.needs_redraw:
+            return  # Nothing changed since the last frame
+
         # Erase All
         screen = pg.display.get_surface()
         screen.fill((0, 0, 0, 0))
 
-        for widget in self.widgets:
-            widget.draw(screen)
+        self.widgets.draw(screen)
 
         pg.display.flip()
 
     def update(self):
-        for widget in self.widgets:
-            widget.update()
+        self.widgets.update()
 
     def events(self):
         for event in pg.event.get():
@@ -173,16 +169,10 @@ class Launcher:
                 Launcher.quit()
             elif event.type == pg.VIDEORESIZE:
                 pg.display.set_mode((event.w, event.h), pg.RESIZABLE)
-                line = LineAlignedContainer(int(pg.display.get_surface().get_rect().width / 2),
-                                            alignment=LineAlignedContainer.VERTICAL_CENTER,
-                                            widgets=self.widgets,
-                                            space=100)
-                line.move(0, int((event.h - line.rect.height) / 2) - line.rect.top)
+                self.menu.layout(pg.display.get_surface().get_rect())
+                self.widgets.mark_dirty()
             else:
-                handled = False
-                for widget in self.widgets:
-                    if not handled:
-                        handled = widget.handle_event(event)
+                self.widgets.handle_event(event)
 
     def run(self):
         while self.launcher_running:
@@ -197,10 +187,15 @@ class Launcher:
         GLOBAL.game.start()
 
     def load(self):
+        save = SaveGame.most_recent([SAVE_DIRECTORY] + AutoSave.slot_directories())
+        if save is None:
+            GLOBAL.logger.warn("No save to load")
+            return
         self.launcher_running = False
-        with open("savegame", "rb") as f:
-            GLOBAL.game = pick.load(f)[0]
-            GLOBAL.game.reinit_graphics_after_save()
+        GLOBAL.game = Game()
+        GLOBAL.game.post_init()
+        save.load(GLOBAL.game)  # The graphics of the current region are only built when first drawn
+        GLOBAL.game.update_state(Game.GAME_STATE_PLAYING)
 
         # Done: starting the game
         GLOBAL.game.start()
@@ -0,0 +1,120 @@
+from array import array
+from collections import deque
+
+from shared import GLOBAL
+
+"""
+Flow fields (also known as Dijkstra maps): one distance map per target, shared by all the entities going there.
+"""
+
+
+class FlowField:
+    """
+    Distance, in moves, from each tile of a region to a target.
+    The field is computed once with a breadth first search starting at the target (all 8 moves cost 1),
+    then any number of entities can read their next step from it in constant time.
+    Only what does not move is taken into account: the tiles and the static blocking entities (doors, towns...).
+    Moving entities (NPC, player) are left to the move itself, or passed as occupied positions to next_step.
+    """
+
+    UNREACHABLE = -1
+    DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+    def __init__(self, region, target, entity, max_distance=None):
+        """
+        Compute the field
+        :param region: the region on which the field is computed
+        :param target: the position (tuple) the entities want to reach
+        :param entity: an entity representative of the ones using the field (used for the tile blocking rules)
+        :param max_distance: stop the search after this distance (None to cover the full region)
+        """
+        self.target = target
+        self.width = region.tile_width
+        self.height = region.tile_height
+        self.max_distance = max_distance
+        self.distances = array('i', [FlowField.UNREACHABLE]) * (self.width * self.height)
+        self._compute(region, entity)
+
+    @staticmethod
+    def static_blocking_positions(region):
+        """
+        The positions of the blocking entities that do not move by themselves
+        :param region: the region to look at
+        :return: a set of positions
+        """
+        return {entity.pos for entity in region.region_entities if FlowField.is_static_blocker(entity)}
+
+    @staticmethod
+    def is_static_blocker(entity):
+        """
+        :return: True if the entity blocks the way and does not move by itself
+        """
+        player = GLOBAL.game.player if GLOBAL.game is not None else None
+        return entity.blocks and entity.ai is None and entity is not player
+
+    def _compute(self, region, entity):
+        target_x, target_y = self.target
+        if not (0 <= target_x < self.width and 0 <= target_y < self.height):
+            return
+        blocked = FlowField.static_blocking_positions(region)
+        distances = self.distances
+        width, height = self.width, self.height
+        tiles = region.tiles
+
+        distances[target_x * height + target_y] = 0
+        to_visit = deque([(target_x, target_y, 0)])
+        while to_visit:
+            x, y, distance = to_visit.popleft()
+            if self.max_distance is not None and distance >= self.max_distance:
+                continue
+            for (dx, dy) in FlowField.DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height and distances[nx * height + ny] == FlowField.UNREACHABLE:
+                    if (nx, ny) in blocked or tiles[nx][ny].block_for(entity):
+                        continue
+                    distances[nx * height + ny] = distance + 1
+                    to_visit.append((nx, ny, distance + 1))
+
+    def distance_at(self, x, y):
+        """
+        :return: the number of moves to reach the target from (x, y), UNREACHABLE if the target can not be reached
+        """
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return self.distances[x * self.height + y]
+        return FlowField.UNREACHABLE
+
+    def next_step(self, x, y, occupied=None):
+        """
+        The best move to get closer to the target
+        :param x: the current x position
+        :param y: the current y position
+        :param occupied: optional set of positions to avoid (typically other moving entities)
+        :return: a (dx, dy) tuple, or None if no move gets closer to the target
+        """
+        best_distance = self.distance_at(x, y)
+        if best_distance == FlowField.UNREACHABLE and (x, y) != self.target:
+            # We may stand on something blocking (a door...): any reached neighbour is fine
+            best_distance = self.width * self.height
+        best_step = None
+        for (dx, dy) in FlowField.DIRECTIONS:
+            distance = self.distance_at(x + dx, y + dy)
+            if distance != FlowField.UNREACHABLE and distance < best_distance:
+                if occupied is None or (x + dx, y + dy) not in occupied or (x + dx, y + dy) == self.target:
+                    best_distance = distance
+                    best_step = (dx, dy)
+        return best_step
+
+    def depends_on(self, position):
+        """
+        Tell if a change on the position (tile or static blocking entity) may change the field.
+        This is the case if the position or any of its neighbours has been reached.
+        :param position: the position that changed
+        :return: True if the field needs to be recomputed
+        """
+        x, y = position
+        if self.distance_at(x, y) != FlowField.UNREACHABLE:
+            return True
+        for (dx, dy) in FlowField.DIRECTIONS:
+            if self.distance_at(x + dx, y + dy) != FlowField.UNREACHABLE:
+                return True
+        return False
@@ -1,28 +1,52 @@
 import random
+from collections import OrderedDict
 from os import path
 
 import pygame as pg
 
 from default import *
+from region.flowfield import FlowField
 from region.tile import Tile
+from region.triggermap import TriggerMap
+from entity import town
 from entity.town import Town
 from entity.door import Door
 from entity.livingentities import FriendlyEntity
 from entity.building_deco import MuralLamp
 from shared import GLOBAL
-from utilities import AStar, SQ_Location, SQ_MapHandler, Ticker
+from utilities import AStar, FieldOfViewCache, SQ_Location, SQ_MapHandler, Ticker
+
+
+def run_steps(steps):
+    """
+    Run a generator made of steps (see RegionFactory.invoke_steps) to the end
+    :return: the value it returns
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
 
 
 class RegionFactory:
     """
     Used to generate one of the predefined map type.
     Each region is saved according to its name. If the name already exists, simply returns the region.
+    Each region is generated from its own seed, recorded in the region (see the generation attribute) with what is
+    needed to generate it again: a region can be saved as its seed and the changes made since (see
+    save.regionrecord).
     """
 
     REGION_WILDERNESS = "WILDERNESS"
     REGION_DUNGEON = "DUNGEON"
     REGION_TOWN = "TOWN"
 
+    # To increase each time the generation changes: a region can only be generated again by the same version
+    GENERATOR_VERSION = 1
+
+    FRIENDLY_COUNT = 20  # Default number of friendly entities in a wilderness
+
     REGION_DICT = {}
 
     @staticmethod
@@ -30,12 +54,30 @@ class RegionFactory:
                state=None,
                region_type=REGION_WILDERNESS,
                dimension=(81, 121),
+               seed=None,
                **attributes):
         """
+        Generate a region at once (see invoke_steps)
         :param name: The name of the region. Can be used as a future reference
         :param state: All maps are generated using random things. This is to define the seed of the region.
         :param region_type: The type of the region. This can be (so far) a wilderness, a dungeon or a town.
         :param dimension: The dimension of the region
+        :param seed: the seed of the region. If not given, it is drawn from the random generator.
+        """
+        return run_steps(RegionFactory.invoke_steps(name, state=state, region_type=region_type, dimension=dimension,
+                                                    seed=seed, **attributes))
+
+    @staticmethod
+    def invoke_steps(name,
+                     state=None,
+                     region_type=REGION_WILDERNESS,
+                     dimension=(81, 121),
+                     seed=None,
+                     **attributes):
+        """
+        Generate a region step by step: generator yielding the description of each step before doing it, and returning
+        the region. Between two steps, the random generator must be left as the step left it (see WorldGeneration).
+        The parameters are the ones of invoke.
         """
         assert name is not None, "All regions must have a name"
 
@@ -44,26 +86,98 @@ class RegionFactory:
 
         if state is not None:
             random.setstate(state)
+        if seed is None:
+            seed = random.getrandbits(32)
+
+        # The region uses its own random sequence, so that it can be generated again from its seed alone
+        outer_state = random.getstate()
+        random.seed(seed)
+        try:
+            region, parameters = yield from RegionFactory._generate(name, region_type, dimension, attributes)
+            region.choose_tileset()  # Last, so that the rest of the generation does not depend on it
+        finally:
+            random.setstate(outer_state)
+
+        region.generation = {"generator": RegionFactory.GENERATOR_VERSION,
+                             "seed": seed,
+                             "name": name,
+                             "region_type": region_type,
+                             "dimension": dimension,
+                             "parameters": parameters}
+        # The generated entities are numbered in creation order, which is the same each time the region is generated
+        for spawn_key, entity in enumerate(sorted(region.region_entities, key=lambda e: e.uid)):
+            entity.spawn_key = spawn_key
+        region.spawn_count = len(region.region_entities)
 
+        RegionFactory.REGION_DICT["name"] = region
+
+        return region
+
+    @staticmethod
+    def regenerate(generation):
+        """
+        Generate a region again, from what was recorded when it was first generated
+        :param generation: the generation attribute of the region
+        :return: a new region, with the same tiles and entities (including their spawn keys) as the original one
+        """
+        assert generation["generator"] == RegionFactory.GENERATOR_VERSION, \
+            "Region {} was generated by another version".format(generation["name"])
+        parameters = generation["parameters"]
+        if generation["region_type"] == RegionFactory.REGION_WILDERNESS:
+            attributes = {"towns": [Town(name=town_name, wilderness_index=generation["name"])
+                                    for town_name in parameters["towns"]],
+                          "friendly_count": parameters["friendly_count"]}
+        else:
+            attributes = {"building_list": [getattr(town, class_name)(name=building_name)
+                                            for (class_name, building_name) in parameters["buildings"]],
+                          "wilderness_index": parameters["wilderness_index"]}
+        return RegionFactory.invoke(generation["name"],
+                                    region_type=generation["region_type"],
+                                    dimension=generation["dimension"],
+                                    seed=generation["seed"],
+                                    **attributes)
+
+    @staticmethod
+    def _generate(name, region_type, dimension, attributes):
+        """
+        Generator doing the steps of the generation (see invoke_steps)
+        :return: the region, and the parameters needed to generate it again
+        """
         region_correctly_initialized = False
         region = None
+        parameters = None
 
         while not region_correctly_initialized:
             if region_type == RegionFactory.REGION_WILDERNESS:
-                assert "town_list" in attributes, "Wilderness region needs to have a town list"
-                region = WildernessRegion(name, dimension, town_list=attributes["town_list"], with_liquid=True)
+                assert "town_list" in attributes or "towns" in attributes, \
+                    "Wilderness region needs to have a town list"
+                if "towns" in attributes:
+                    towns = attributes["towns"]
+                else:
+                    towns = [town_region.town for town_region in attributes["town_list"]]
+                friendly_count = attributes.get("friendly_count", RegionFactory.FRIENDLY_COUNT)
+                parameters = {"towns": [town_entity.name for town_entity in towns], "friendly_count": friendly_count}
+                region = WildernessRegion(name, dimension, town_list=towns, with_liquid=True, generate=False)
+                yield from region.terrain_steps(with_liquid=True, town_list=towns)
+                # The roads do not change the type of the tiles: an invalid map is dropped before making them
                 region_correctly_initialized = region.is_valid_map()
                 if region_correctly_initialized:
+                    yield from region.road_steps(towns)
+                    yield "inhabitants"
                     # Now we register the entities on the "region"
-                    for town_region in attributes["town_list"]:
-                        town_region.town.assign_entity_to_region(region)
+                    for town_entity in towns:
+                        town_entity.assign_entity_to_region(region)
                     # We add some friendly guys
                     all_positions = region.get_all_available_tiles(without_objects=True, tile_type=Tile.T_GROUND)
-                    for i in range(20):
+                    for i in range(friendly_count):
                         FriendlyEntity("Friendly {}".format(i), all_positions.pop()).assign_entity_to_region(region)
 
             elif region_type == RegionFactory.REGION_TOWN:
                 assert "building_list" in attributes, "Town region needs to have a building list"
+                parameters = {"buildings": [(type(building).__name__, building.name)
+                                            for building in attributes["building_list"]],
+                              "wilderness_index": attributes.get("wilderness_index")}
+                yield "town"
                 region = TownRegion(name, dimension, building_entity_list=attributes["building_list"])
                 region.town = Town(name=name)
                 # We register the building in the town
@@ -100,9 +214,8 @@ class RegionFactory:
                     building.post_init()
 
                 region_correctly_initialized = True  # A town is always correct!
-        RegionFactory.REGION_DICT["name"] = region
 
-        return region
+        return region, parameters
 
 
 class Region:
@@ -112,6 +225,9 @@ class Region:
     The list of entities is kept in the sprite groups and in a set
     """
 
+    FLOW_FIELD_CACHE_SIZE = 16  # Number of targets for which the flow field is kept
+    OPACITY_CHUNK_SIZE = 8  # The opacity of the tiles is versioned per square of this size
+
     def __init__(self, name, dimension):
 
         self.name = name
@@ -126,9 +242,8 @@ class Region:
         # The player one is the 2.
         # They are drawn in the order 0 to 4
         self.region_entities = set()  # the list of entities of this map
-        self.all_groups = []
-        for i in range(5):
-            self.all_groups.append(pg.sprite.Group())
+        self.triggers = TriggerMap()  # the actionable entities, per position
+        self._all_groups = None  # Only built when the region is displayed, see all_groups
 
         self.last_player_position = None
 
@@ -136,6 +251,52 @@ class Region:
         # present on the screen
         self._local_ticker = None
 
+        # Flow fields towards the popular targets, shared by all the entities going there
+        self._flow_fields = OrderedDict()
+
+        # What blocks the view, besides the tiles (closed doors...), and the last fields of view computed
+        self.view_blocking_positions = set()
+        self._opacity_versions = {}  # (chunk x, chunk y) -> version, incremented when the opacity changes
+        self.fov_cache = FieldOfViewCache()
+
+        # How the region was generated, and the number of entities it was generated with (see RegionFactory)
+        self.generation = None
+        self.spawn_count = 0
+
+        self.initial_seed = 1  # The variant of the tileset used to draw the region, see choose_tileset
+
+    @property
+    def all_groups(self):
+        """
+        The sprite groups used to draw the region.
+        They are built on first use, which also creates the graphical component of all the entities of the region.
+        """
+        if self._all_groups is None:
+            self._all_groups = []
+            for i in range(5):
+                self._all_groups.append(pg.sprite.Group())
+            for entity in self.region_entities:
+                entity.attach_graphics(self._all_groups[entity.z_level])
+        return self._all_groups
+
+    def release_graphics(self):
+        """
+        Drop the graphical objects of the region (background, sprite groups, graphical component of the entities)
+        once it is no longer displayed. They are built again the next time the region is displayed.
+        """
+        if self._all_groups is not None:
+            for entity in self.region_entities:
+                entity.detach_graphics()
+            self._all_groups = None
+        self._background = None
+
+    @property
+    def displayed(self):
+        """
+        :return: True if the graphical objects of the region (sprite groups) have been built
+        """
+        return self._all_groups is not None
+
     @property
     def ticker(self):
         if self._local_ticker is None:
@@ -166,8 +327,105 @@ class Region:
     def _create_background(self):
         assert True, "Method create background was called on region instead of sub class"
 
-    def clean_before_save(self):
+    def __getstate__(self):
+        """
+        Everything but the graphical objects and the caches, which are rebuilt on demand
+        """
+        state = self.__dict__.copy()
+        for attribute in ("_background", "_all_groups", "_flow_fields", "fov_cache"):
+            state.pop(attribute, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
         self._background = None
+        self._all_groups = None
+        self._flow_fields = OrderedDict()
+        self.fov_cache = FieldOfViewCache()
+
+    def choose_tileset(self):
+        """
+        Pick the variants of the tileset used to draw the region
+        """
+        self.initial_seed = random.choice((1, 4, 7, 10))
+
+    def delta_state(self):
+        """
+        What the game may have changed in the region since it was generated, besides the entities and the
+        exploration of the tiles. Used when the region is saved as its seed and changes (see save.regionrecord).
+        :return: a dictionary, given back to apply_delta_state
+        """
+        return {"last_player_position": self.last_player_position}
+
+    def apply_delta_state(self, state):
+        """
+        Apply to a freshly generated region the changes returned by delta_state
+        :param state: the dictionary
+        """
+        self.__dict__.update(state)
+
+    def get_entity_by_uid(self, uid):
+        """
+        :param uid: the unique identifier of the entity
+        :return: the entity of the region with this identifier, None if not found
+        """
+        for entity in self.region_entities:
+            if entity.uid == uid:
+                return entity
+        return None
+
+    def get_flow_field(self, target, entity, max_distance=None):
+        """
+        Return the flow field towards the target, computing it only if it is not already known.
+        Fields are shared by all entities with the same tile blocking rules.
+        :param target: the position to reach
+        :param entity: the entity that wants to reach it (only its blocking tile list is used)
+        :param max_distance: see FlowField
+        :return: a FlowField
+        """
+        blocking_key = None if entity.blocking_tile_list is None else tuple(entity.blocking_tile_list)
+        key = (target, blocking_key, max_distance)
+        if key in self._flow_fields:
+            self._flow_fields.move_to_end(key)
+        else:
+            self._flow_fields[key] = FlowField(self, target, entity, max_distance=max_distance)
+            if len(self._flow_fields) > Region.FLOW_FIELD_CACHE_SIZE:
+                self._flow_fields.popitem(last=False)
+        return self._flow_fields[key]
+
+    def invalidate_flow_fields(self, position):
+        """
+        To be called when a tile or a static blocking entity changes at the given position.
+        Only the flow fields that went through this area are dropped.
+        :param position: the position that changed
+        """
+        for key in [key for key, field in self._flow_fields.items() if field.depends_on(position)]:
+            del self._flow_fields[key]
+
+    def opacity_versions(self, x_min, y_min, x_max, y_max):
+        """
+        :return: the tuple of the opacity versions of the chunks covering the given area (bounds included)
+        """
+        size = Region.OPACITY_CHUNK_SIZE
+        return tuple(self._opacity_versions.get((chunk_x, chunk_y), 0)
+                     for chunk_x in range(x_min // size, x_max // size + 1)
+                     for chunk_y in range(y_min // size, y_max // size + 1))
+
+    def opacity_changed(self, position):
+        """
+        To be called when what blocks the view changes at the given position: the fields of view around are outdated
+        :param position: the position that changed
+        """
+        chunk = (position[0] // Region.OPACITY_CHUNK_SIZE, position[1] // Region.OPACITY_CHUNK_SIZE)
+        self._opacity_versions[chunk] = self._opacity_versions.get(chunk, 0) + 1
+
+    def add_view_blocker(self, position):
+        self.view_blocking_positions.add(position)
+        self.opacity_changed(position)
+
+    def remove_view_blocker(self, position):
+        self.view_blocking_positions.discard(position)
+        self.opacity_changed(position)
 
     def remove_extra_blocks(self, replace_with_type=None, replace_with_subtype=None):
         """
@@ -412,7 +670,11 @@ class WildernessRegion(Region):
                  blocking_type=Tile.S_TREE,
                  with_liquid=False,
                  town_list=None,
-                 grotto_list=None):
+                 grotto_list=None,
+                 generate=True):
+        """
+        :param generate: if not set, the map is left as floor: terrain_steps then road_steps generate it step by step
+        """
 
         assert dimension[0] % 2 == 1 and dimension[1] % 2 == 1, "Maze dimensions must be odd"
         Region.__init__(self, name, dimension)  # dimensions doivent être impair!
@@ -421,16 +683,27 @@ class WildernessRegion(Region):
                        for _y in range(self.tile_height)]
                       for _x in range(self.tile_width)]
 
+        if generate:
+            run_steps(self.terrain_steps(blocking_type=blocking_type, with_liquid=with_liquid, town_list=town_list))
+            run_steps(self.road_steps(town_list))
+
+    def terrain_steps(self, blocking_type=Tile.S_TREE, with_liquid=False, town_list=None):
+        """
+        Generate the ground and place the towns: generator yielding the description of each step before doing it
+        """
         # Base Ground
+        yield "ground"
         reftiles = WildernessRegion.generate_algo(self.tile_width, self.tile_height, 40,
                                                   ((3, 5, 1), (2, 5, -1)), empty_center=False)
         # Now add some extra stuff depending on the type of map
         # Grass on the floor - to implement we construct a totally new map. We will apply the previous as a mask.
+        yield "grass"
         grass_tile = WildernessRegion.generate_algo(self.tile_width, self.tile_height, 50, ((3, 5, 1), (1, 6, -1)))
 
         # Some shallow Aquatics
         water_tile = []
         if with_liquid:
+            yield "water"
             water_tile = WildernessRegion.generate_algo(self.tile_width, self.tile_height, 40, ((2, 5, -1),))
 
         for y in range(self.tile_height):
@@ -445,21 +718,26 @@ class WildernessRegion(Region):
                     self.tiles[x][y].tile_subtype = Tile.S_GRASS
 
         list_available_tiles = self.get_all_available_tiles(Tile.T_GROUND, without_objects=True)
-        for town_region in town_list:
-            (town_region.town.x, town_region.town.y) = list_available_tiles.pop()
-
-        # And we add some path on the floor to connect the towns
-        for index_origin, town_origin in enumerate(town_list[:]):
-            for index_destination, town_destination in enumerate(town_list[:]):
-                if index_destination > index_origin:
-                    # Road from town_origin.name, town_destination.name
-                    astar = AStar(SQ_MapHandler(self.tiles, dimension[0], dimension[1]))
-                    p = astar.findPath(SQ_Location(town_origin.town.x, town_origin.town.y),
-                                       SQ_Location(town_destination.town.x, town_destination.town.y))
-
-                    if p:
-                        for n in p.nodes:
-                            self.tiles[n.location.x][n.location.y].tile_subtype = Tile.S_PATH
+        for town_entity in town_list:
+            (town_entity.x, town_entity.y) = list_available_tiles.pop()
+
+    def road_steps(self, town_list):
+        """
+        Add some path on the floor to connect the towns: generator yielding the description of each road before
+        making it
+        """
+        roads = [(town_origin, town_destination)
+                 for index_origin, town_origin in enumerate(town_list)
+                 for town_destination in town_list[index_origin + 1:]]
+        for index, (town_origin, town_destination) in enumerate(roads):
+            yield "road {}/{}".format(index + 1, len(roads))
+            astar = AStar(SQ_MapHandler(self.tiles, self.tile_width, self.tile_height))
+            p = astar.findPath(SQ_Location(town_origin.x, town_origin.y),
+                               SQ_Location(town_destination.x, town_destination.y))
+
+            if p:
+                for n in p.nodes:
+                    self.tiles[n.location.x][n.location.y].tile_subtype = Tile.S_PATH
 
     @staticmethod
     def generate_algo(width, height, initial_noise, repeat_parameters, empty_center=False):
@@ -551,10 +829,7 @@ class WildernessRegion(Region):
         :return: Nothing, just blitting things on _background property
         """
 
-        if not hasattr(self, "save_initial_seed"):
-            self.save_initial_seed = random.choice((1, 4, 7, 10))
-
-        initial_seed = self.save_initial_seed
+        initial_seed = self.initial_seed
         grass_serie = initial_seed + 0
         rock_serie = initial_seed + 1
         dirt_serie = initial_seed + 11
@@ -643,6 +918,7 @@ class TownRegion(Region):
         # generate the town
         self.town = None
         self.door_list = []
+        self.carpet_serie = 13
 
         # first building - the first building is always the entrance :-)
         current_building = building_entity_list[0]
@@ -838,6 +1114,15 @@ class TownRegion(Region):
         # Setup the player starting position near the entrance to wilderness
         self.last_player_position = building_entity_list[0].pos
 
+    def choose_tileset(self):
+        Region.choose_tileset(self)
+        self.carpet_serie = random.choice((13, 16, 19, 22))
+
+    def delta_state(self):
+        state = Region.delta_state(self)
+        state["town"] = self.town  # The town entity lives in the wilderness
+        return state
+
     def _generate_building(self, min_size, max_size, modulo_rest=2, name=None, one_connection=False):
         """
         Generate a building according to the criteria
@@ -919,16 +1204,11 @@ class TownRegion(Region):
         Build background using dawnlike tileset - Redefined here
         :return: Nothing, just blitting things on _background property
         """
-        if not hasattr(self, "save_carpet"):
-            self.save_carpet = random.choice((13, 16, 19, 22))
-        carpet_serie = self.save_carpet
+        carpet_serie = self.carpet_serie
 
         wall_serie = 1
 
-        if not hasattr(self, "save_initial_seed"):
-            self.save_initial_seed = random.choice((1, 4, 7, 10))
-
-        initial_seed = self.save_initial_seed
+        initial_seed = self.initial_seed
         grass_serie = initial_seed + 0
         rock_serie = initial_seed + 1
         dirt_serie = initial_seed + 11
@@ -42,11 +42,7 @@ class Tile:
         return self.tile_subtype in entity.blocking_tile_list
 
     def block_view_for(self, entity):
-        if hasattr(entity, "blocking_view_tile_list"):
-            if self.tile_type in entity.blocking_view_tile_list:
-                return True
-            else:
-                return False
-        elif self.tile_type in {Tile.T_VOID, Tile.T_BLOCK}:
-            return True
-        return False
\ No newline at end of file
+        if entity.blocking_view_list is None:
+            # We apply the default list... We base ourselves only on the type
+            return self.tile_type in {Tile.T_VOID, Tile.T_BLOCK}
+        return self.tile_type in entity.blocking_view_list
@@ -0,0 +1,55 @@
+"""
+Index of the actionable entities of a region, per tile.
+"""
+
+
+class TriggerMap:
+    """
+    For each tile, the actionable entities (doors, towns, buildings...) that are triggered when something enters it.
+    Entities register their actionable when they enter the region; the footprint of an actionable is refreshed
+    when its owner moves or when its radius/area changes, only touching the tiles that are concerned.
+    """
+
+    def __init__(self):
+        self._cells = {}  # position -> tuple of actionables covering this position
+        self._footprints = {}  # actionable -> the positions it was registered on
+
+    def at(self, position):
+        """
+        :param position: the position to test
+        :return: a tuple (possibly empty) of the actionables covering the position
+        """
+        return self._cells.get(position, ())
+
+    def register(self, actionable):
+        footprint = frozenset(actionable.footprint())
+        self._footprints[actionable] = footprint
+        for position in footprint:
+            self._cells[position] = self._cells.get(position, ()) + (actionable,)
+
+    def unregister(self, actionable):
+        footprint = self._footprints.pop(actionable, ())
+        for position in footprint:
+            self._remove_from_cell(position, actionable)
+
+    def refresh(self, actionable):
+        """
+        Update the footprint of an already registered actionable (owner moved, radius changed...)
+        :param actionable: the actionable to refresh
+        """
+        if actionable not in self._footprints:
+            return
+        old_footprint = self._footprints[actionable]
+        new_footprint = frozenset(actionable.footprint())
+        for position in old_footprint - new_footprint:
+            self._remove_from_cell(position, actionable)
+        for position in new_footprint - old_footprint:
+            self._cells[position] = self._cells.get(position, ()) + (actionable,)
+        self._footprints[actionable] = new_footprint
+
+    def _remove_from_cell(self, position, actionable):
+        remaining = tuple(registered for registered in self._cells.get(position, ()) if registered is not actionable)
+        if remaining:
+            self._cells[position] = remaining
+        else:
+            self._cells.pop(position, None)
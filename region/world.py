@@ -0,0 +1,234 @@
+from collections.abc import MutableMapping
+import random
+import time
+import uuid
+
+from entity.town import Entrance, GuildFighter
+from region.region import RegionFactory
+from utilities import MName
+
+"""
+The world: all the regions of a game, by name.
+"""
+
+
+class World(MutableMapping):
+    """
+    A dictionary of regions (wilderness, towns...) which also tracks which regions changed.
+    Each region has a version, changed each time the region is marked dirty: a save only needs to write the
+    regions whose version differs from the one it wrote last time. Versions are unique to the World instance that
+    made them, so that a game loaded twice from the same save does not produce two different regions with the
+    same version.
+    Regions coming from a save are unpickled when first accessed: this is how the references from one region to
+    another are resolved while loading, and a game can start while most of its regions are still in the save.
+    """
+
+    def __init__(self, world_id=None):
+        self.world_id = world_id or uuid.uuid4().hex  # Identifies the world across saves
+        self._regions = {}
+        self._loaders = {}  # name -> function returning the region, for the regions not yet loaded
+        self._loading = []  # [name, region or None] of the regions being loaded, the innermost last
+        self._versions = {}
+        self._session = uuid.uuid4().hex  # Makes the versions of this instance unique
+        self._changes = 0
+
+    def __getitem__(self, name):
+        if name not in self._regions and name in self._loaders:
+            for loading_name, region in self._loading:
+                if loading_name == name:
+                    # A region loaded meanwhile refers back to this one: it gets the region not yet filled
+                    if region is None:
+                        raise RuntimeError("Region {} refers to itself before being created".format(name))
+                    return region
+            self._loading.append([name, None])
+            try:
+                region = self._loaders[name]()
+            finally:
+                self._loading.pop()
+            self._regions[name] = region
+            del self._loaders[name]
+        return self._regions[name]
+
+    def __setitem__(self, name, region):
+        self._regions[name] = region
+        self._loaders.pop(name, None)
+        self.mark_dirty(name)
+
+    def __delitem__(self, name):
+        self._regions.pop(name, None)
+        self._loaders.pop(name, None)
+        self._versions.pop(name, None)
+
+    def __iter__(self):
+        return iter(list(self._regions) + list(self._loaders))
+
+    def __len__(self):
+        return len(self._regions) + len(self._loaders)
+
+    def __contains__(self, name):
+        return name in self._regions or name in self._loaders
+
+    def add_pending(self, name, loader, version):
+        """
+        Declare a region that will be loaded on first access
+        :param name: the name of the region
+        :param loader: function without parameter returning the region
+        :param version: the version of the region when it was saved
+        """
+        self._loaders[name] = loader
+        self._versions[name] = version
+
+    def loading(self, region):
+        """
+        To be called by a loader as soon as the region is created, before filling it: the regions it loads meanwhile
+        can then refer back to it
+        :param region: the region being loaded
+        """
+        if self._loading:
+            self._loading[-1][1] = region
+
+    def is_loaded(self, name):
+        return name in self._regions
+
+    def loaded_regions(self):
+        """
+        :return: the regions already loaded (iterating on the world loads all of them)
+        """
+        return list(self._regions.values())
+
+    def pending_loader(self, name):
+        """
+        :return: the loader given to add_pending for the region, None if the region is loaded
+        """
+        return self._loaders.get(name)
+
+    def mark_dirty(self, name):
+        """
+        To be called when something changed in the region, so that the next save writes it
+        :param name: the name of the region
+        """
+        self._changes += 1
+        self._versions[name] = (self._session, self._changes)
+
+    def version(self, name):
+        return self._versions.get(name)
+
+
+class WorldGeneration:
+    """
+    The generation of a wilderness and its towns, as a job done one step (one region) at a time, so that a screen can
+    show the progress and keep handling the events between two steps.
+    The job uses its own random sequence, taken from the random generator when created: what runs between two steps
+    (drawing widgets...) does not change the world generated.
+    """
+
+    def __init__(self,
+                 world,
+                 town_count=None,
+                 dimension=(81, 121),
+                 friendly_count=RegionFactory.FRIENDLY_COUNT):
+        """
+        :param world: the world to fill
+        :param town_count: the number of towns, random (2 to 6) if not given
+        :param dimension: the dimension of the wilderness (odd numbers)
+        :param friendly_count: the number of friendly entities in the wilderness
+        """
+        if town_count is None:
+            town_count = random.randint(2, 6)
+        # One per town, then the wilderness: its terrain (3), its roads and its inhabitants. Each map dropped as
+        # invalid adds its terrain steps: the count is a guess until finished.
+        self.step_count = town_count + 3 + town_count * (town_count - 1) // 2 + 1
+        self.done = 0  # Number of steps done
+        self.stage = None  # Description of the next step, None before the first step and when finished
+        self.timings = []  # (description, seconds) of each step done
+        self.result = None  # The wilderness and the position of its first town, when finished
+        self.finished = False
+
+        self._steps = self._generate(world, town_count, dimension, friendly_count)
+        self._random_state = random.getstate()
+
+    def step(self):
+        """
+        Run the next step
+        :return: True when the world is generated (see result)
+        """
+        if self.finished:
+            return True
+        start = time.perf_counter()
+        outer_state = random.getstate()
+        random.setstate(self._random_state)
+        try:
+            next_stage = next(self._steps)
+        except StopIteration as stop:
+            next_stage = None
+            self.result = stop.value
+            self.finished = True
+        finally:
+            self._random_state = random.getstate()
+            random.setstate(outer_state)
+
+        if self.stage is not None:
+            self.timings.append((self.stage, time.perf_counter() - start))
+            self.done = min(self.done + 1, self.step_count - 1)
+        if self.finished:
+            self.done = self.step_count
+        self.stage = next_stage
+        return self.finished
+
+    @staticmethod
+    def _generate(world, town_count, dimension, friendly_count):
+        """
+        Generator doing the steps: it yields the description of the next step before doing it
+        :return: the wilderness, and the position of its first town (where the player starts)
+        """
+        name = MName.place_name()
+        town_list = []
+        for _j in range(town_count):
+            name_town = "{}'s Town".format(MName.person_name())
+            yield "Town " + name_town
+            town_region = RegionFactory.invoke(name_town,
+                                               wilderness_index=name,
+                                               region_type=RegionFactory.REGION_TOWN,
+                                               building_list=(Entrance(),
+                                                              # Bank(),
+                                                              # GuildMule(),
+                                                              GuildFighter(),
+                                                              # Shop(),
+                                                              # Tavern(), Trade(), Townhall(), Temple()
+                                                              )
+                                               )
+            town_list.append(town_region)
+            world[name_town] = town_region
+
+        wilderness_steps = RegionFactory.invoke_steps(name,
+                                                      region_type=RegionFactory.REGION_WILDERNESS,
+                                                      dimension=dimension,
+                                                      town_list=town_list,
+                                                      friendly_count=friendly_count)
+        while True:
+            try:
+                wilderness_stage = next(wilderness_steps)
+            except StopIteration as stop:
+                wilderness = stop.value
+                break
+            yield "Wilderness {} - {}".format(name, wilderness_stage)
+        world[name] = wilderness
+        return wilderness, town_list[0].town.pos
+
+
+def generate_world(world,
+                   town_count=None,
+                   dimension=(81, 121),
+                   friendly_count=RegionFactory.FRIENDLY_COUNT):
+    """
+    Generate a wilderness and its towns at once, and add them to the world (see WorldGeneration)
+    :param world: the world to fill
+    :param town_count: the number of towns, random (2 to 6) if not given
+    :param dimension: the dimension of the wilderness (odd numbers)
+    :param friendly_count: the number of friendly entities in the wilderness
+    :return: the wilderness, and the position of its first town (where the player starts)
+    """
+    generation = WorldGeneration(world, town_count=town_count, dimension=dimension, friendly_count=friendly_count)
+    while not generation.step():
+        pass
+    return generation.result
@@ -0,0 +1,98 @@
+import os
+import threading
+
+from save.savegame import SaveGame, SAVE_DIRECTORY
+from shared import GLOBAL
+
+"""
+Automatic saves, written in the background while the game goes on.
+"""
+
+AUTOSAVE_TURNS = 50  # Number of player turns between two autosaves
+AUTOSAVE_SLOTS = 3
+
+
+class AutoSave:
+    """
+    Save the game every few turns, in rotating slots (directories), so that the last autosaves are always available.
+    The snapshot is taken at the end of a turn, when nothing moves; compressing and writing the files is then done
+    by a worker thread. A single save is written at a time: if the previous one is not done yet, the autosave waits
+    for the next turn.
+    """
+
+    def __init__(self, every=AUTOSAVE_TURNS, slots=AUTOSAVE_SLOTS):
+        """
+        :param every: the number of player turns between two autosaves
+        :param slots: the number of slots used in rotation
+        """
+        self.every = every
+        self.saves = [SaveGame(directory) for directory in AutoSave.slot_directories(slots)]
+        self.turns = 0
+        self._next_slot = self._oldest_slot()
+        self._thread = None
+
+    @staticmethod
+    def slot_directories(slots=AUTOSAVE_SLOTS):
+        return [os.path.join(SAVE_DIRECTORY, "autosave_{}".format(slot)) for slot in range(slots)]
+
+    def _oldest_slot(self):
+        """
+        :return: the index of the slot to write first: an empty one, or the one with the oldest save
+        """
+        oldest = 0
+        oldest_time = None
+        for index, save in enumerate(self.saves):
+            header = save.read_header()
+            saved_at = header.get("saved_at", 0) if header is not None else 0
+            if oldest_time is None or saved_at < oldest_time:
+                oldest, oldest_time = index, saved_at
+        return oldest
+
+    @property
+    def busy(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def end_of_turn(self, game):
+        """
+        To be called once the turn is over (all the entities played): autosave if it is time to
+        :param game: the game
+        :return: True if an autosave was started
+        """
+        self.turns += 1
+        if self.turns < self.every or self.busy:
+            return False
+        self.turns = 0
+        save = self.saves[self._next_slot]
+        self._next_slot = (self._next_slot + 1) % len(self.saves)
+        self.save_in_background(game, save)
+        return True
+
+    def save_in_background(self, game, save, message=None):
+        """
+        Take a snapshot of the game now, and write it in a worker thread
+        :param game: the game
+        :param save: the SaveGame to write to
+        :param message: to inform of once the save is written, if given (a failure is always reported)
+        """
+        self.wait()
+        snapshot = save.snapshot(game)
+        self._thread = threading.Thread(target=AutoSave._write, args=(save, snapshot, message), name="Save")
+        self._thread.start()
+
+    @staticmethod
+    def _write(save, snapshot, message=None):
+        try:
+            save.write(snapshot)
+        except Exception as e:
+            GLOBAL.logger.error("Save in {} failed: {}".format(save.directory, e))
+        else:
+            if message is not None:
+                GLOBAL.logger.inform(message)
+
+    def wait(self):
+        """
+        Wait until the save being written (if any) is complete
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
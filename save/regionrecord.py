@@ -0,0 +1,404 @@
+import io
+import pickle
+import struct
+import zlib
+
+from entity.gameentity import GameEntity
+from region.region import Region, RegionFactory
+from region.tile import Tile
+from save import schema
+from save.schema import FULL, MISSING, SCHEMA_VERSION, SEEDED
+
+"""
+Region records: the binary format of a region in a save.
+A full record is a small header, the tiles packed as bytes and compressed, then the entities of the region and the
+rest of the region state, pickled.
+A seeded record is for the regions made by the RegionFactory: it only holds how the region was generated and what
+changed since (explored tiles, generated entities moved, changed or gone, other entities). The region is generated
+again when loaded, so the tiles must not have changed since the generation.
+The version in the header is the version of the schema (see save.schema). The entities are saved as tables, one per
+class, with one column per attribute: the record is read as tables first, upgraded by the migrations if it is older,
+then the entities are built from the rows.
+The tables are preceded by the list of the entities (class and uid), so that the entities can be created empty
+before reading the tables: the references between entities of the region are then saved as their uid.
+"""
+
+RECORD_MAGIC = b"DGRG"
+SEEDED_RECORD_MAGIC = b"DGSD"
+RECORD_VERSION = SCHEMA_VERSION
+# magic, version, width, height, size of the compressed tiles (of the explored bitset for a seeded record)
+RECORD_HEADER = struct.Struct("<4sHHHI")
+
+# Byte code of each tile type and sub type. Append only: the position in the tuple is what is saved.
+TILE_TYPES = (Tile.T_VOID, Tile.T_BLOCK, Tile.T_GROUND, Tile.T_LIQUID)
+TILE_SUBTYPES = (Tile.S_VOID, Tile.S_TREE, Tile.S_WALL, Tile.S_BOULDER, Tile.S_DEEP_WATER, Tile.S_FLOOR, Tile.S_PATH,
+                 Tile.S_GRASS, Tile.S_CARPET, Tile.S_SPECIAL, Tile.S_WATER, Tile.S_LAVA)
+TILE_TYPE_CODES = {tile_type: code for code, tile_type in enumerate(TILE_TYPES)}
+TILE_SUBTYPE_CODES = {tile_subtype: code for code, tile_subtype in enumerate(TILE_SUBTYPES)}
+
+
+class RecordPickler(pickle.Pickler):
+    """
+    Pickle the content of a record (a region, or the index).
+    The other regions, and the entities living in other regions, are not pickled with the record but replaced by
+    references (region name, entity uid), resolved when loading by the RecordUnpickler.
+    The entities of the region, saved in the tables, are replaced by their uid; in a seeded record, the generated
+    entities of the region are replaced by their spawn key.
+    """
+
+    def __init__(self, file, region=None, seeded=False, local=()):
+        """
+        :param file: the file to write to
+        :param region: the region saved in this record, None for the index
+        :param seeded: True for a seeded record
+        :param local: the entities of the region saved in the tables
+        """
+        pickle.Pickler.__init__(self, file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.region = region
+        self.seeded = seeded
+        self.local = {entity.uid: entity for entity in local}
+        self.references = set()  # The names of the other regions referred to: they are loaded with this one
+
+    def persistent_id(self, obj):
+        if obj is MISSING:
+            return "missing",
+        if isinstance(obj, Region):
+            if obj is self.region:
+                return "self",
+            self.references.add(obj.name)
+            return "region", obj.name
+        elif isinstance(obj, GameEntity):
+            if self.local.get(obj.uid) is obj:
+                return "local", obj.uid
+            if obj.current_region_name is not None and \
+                    (self.region is None or obj.current_region_name != self.region.name):
+                self.references.add(obj.current_region_name)
+                return "entity", obj.current_region_name, obj.uid
+            if self.seeded and obj.spawn_key is not None and obj.current_region_name == self.region.name:
+                return "spawn", obj.spawn_key
+        return None
+
+
+class RecordUnpickler(pickle.Unpickler):
+    """
+    Unpickle a record, resolving the references to the other regions through the world (loading them if needed)
+    """
+
+    def __init__(self, file, world, region=None):
+        """
+        :param file: the file to read from
+        :param world: the world, to look for the other regions
+        :param region: the region being loaded (not yet filled), None for the index
+        """
+        pickle.Unpickler.__init__(self, file)
+        self.world = world
+        self.region = region
+        self.spawned = {}  # spawn key -> entity, for a seeded record
+        self.local = {}  # uid -> entity, for the entities of the tables
+
+    def persistent_load(self, pid):
+        if pid[0] == "local":
+            return self.local[pid[1]]
+        if pid[0] == "missing":
+            return MISSING
+        if pid[0] == "self":
+            return self.region
+        if pid[0] == "spawn":
+            return self.spawned[pid[1]]
+        if pid[0] == "region":
+            return self.world[pid[1]]
+        if pid[0] == "entity":
+            entity = self.world[pid[1]].get_entity_by_uid(pid[2])
+            if entity is not None:
+                return entity
+        raise pickle.UnpicklingError("Unknown reference in save: {}".format(pid))
+
+
+def pack_tiles(tiles, width, height):
+    """
+    :param tiles: the tiles of a region (list of columns)
+    :return: the bytes: all the type codes, then all the sub type codes, then the explored bitset
+    """
+    count = width * height
+    types = bytearray(count)
+    subtypes = bytearray(count)
+    index = 0
+    for column in tiles:
+        for tile in column:
+            types[index] = TILE_TYPE_CODES[tile.tile_type]
+            subtypes[index] = TILE_SUBTYPE_CODES[tile.tile_subtype]
+            index += 1
+    return bytes(types + subtypes) + pack_explored(tiles, width, height)
+
+
+def pack_explored(tiles, width, height):
+    """
+    :return: the explored bitset of the tiles, as in pack_tiles
+    """
+    explored = bytearray((width * height + 7) // 8)
+    index = 0
+    for column in tiles:
+        for tile in column:
+            if tile.explored:
+                explored[index >> 3] |= 1 << (index & 7)
+            index += 1
+    return bytes(explored)
+
+
+def unpack_explored(data, tiles):
+    """
+    Set the explored flag of the tiles from a bitset made by pack_explored
+    """
+    index = 0
+    for column in tiles:
+        for tile in column:
+            tile.explored = bool(data[index >> 3] & (1 << (index & 7)))
+            index += 1
+
+
+def unpack_tiles(data, width, height):
+    """
+    :param data: bytes produced by pack_tiles
+    :return: the tiles (list of columns)
+    """
+    count = width * height
+    types, subtypes, explored = data[:count], data[count:2 * count], data[2 * count:]
+    new_tile = Tile.__new__  # Skips __init__: all the attributes are set right after
+    tiles = []
+    index = 0
+    for x in range(width):
+        column = []
+        for y in range(height):
+            tile = new_tile(Tile)
+            tile.tile_type = TILE_TYPES[types[index]]
+            tile.tile_subtype = TILE_SUBTYPES[subtypes[index]]
+            tile.explored = bool(explored[index >> 3] & (1 << (index & 7)))
+            column.append(tile)
+            index += 1
+        tiles.append(column)
+    return tiles
+
+
+def entity_tables(entities):
+    """
+    :param entities: the entities to save
+    :return: the entities as tables, one per class name: {column: [values]}, the rows sorted by uid. An entity
+    without one of the attributes of its class gets MISSING in this column.
+    """
+    rows = {}
+    for entity in sorted(entities, key=lambda entity: entity.uid):
+        rows.setdefault(type(entity).__name__, []).append(entity.__getstate__())
+    tables = {}
+    for class_name, states in rows.items():
+        columns = {}
+        for state in states:
+            columns.update(dict.fromkeys(state))
+        tables[class_name] = {column: [state.get(column, MISSING) for state in states] for column in columns}
+    return tables
+
+
+class RegionSnapshot:
+    """
+    The content of a region record, taken at a given time but not yet compressed nor written.
+    It shares nothing with the live region: it can be written from another thread while the game goes on.
+    """
+
+    def __init__(self, magic, width, height, tile_data, content, references=()):
+        """
+        :param magic: the kind of record (RECORD_MAGIC or SEEDED_RECORD_MAGIC)
+        :param width: width of the region, in tiles
+        :param height: height of the region, in tiles
+        :param tile_data: the tiles, as produced by pack_tiles (or pack_explored for a seeded record)
+        :param content: the pickled entities and state of the region
+        :param references: the names of the other regions the record refers to (loaded with it)
+        """
+        self.magic = magic
+        self.width = width
+        self.height = height
+        self.tile_data = tile_data
+        self.content = content
+        self.references = frozenset(references)
+
+
+def snapshot_region(region, seeded=False):
+    """
+    :param region: the region to save
+    :param seeded: if set, a region made by the RegionFactory is saved as a seeded record
+    :return: a RegionSnapshot of the region
+    """
+    if seeded and region.generation is not None:
+        return snapshot_seeded_region(region)
+    state = region.__getstate__()
+    del state["tiles"]
+    entities = list(state.pop("region_entities"))
+    tables = entity_tables(entities)
+    content = io.BytesIO()
+    pickler = RecordPickler(content, region=region, local=entities)
+    pickler.dump({"region_class": type(region).__name__,
+                  "entities": {class_name: table["uid"] for class_name, table in tables.items()}})
+    pickler.dump({"region": state, "entities": tables, "spawned": None})
+    return RegionSnapshot(RECORD_MAGIC, region.tile_width, region.tile_height,
+                          pack_tiles(region.tiles, region.tile_width, region.tile_height), content.getvalue(),
+                          references=pickler.references)
+
+
+def snapshot_seeded_region(region):
+    """
+    :param region: the region to save, made by the RegionFactory
+    :return: a RegionSnapshot of the region, for a seeded record
+    """
+    spawned = []  # The generated entities still in the region
+    others = []
+    for entity in region.region_entities:
+        if entity.spawn_key is None:
+            others.append(entity)
+        else:
+            spawned.append(entity)
+    spawned.sort(key=lambda entity: entity.spawn_key)
+    tables = entity_tables(others)
+    content = io.BytesIO()
+    pickler = RecordPickler(content, region=region, seeded=True, local=others)
+    pickler.dump(region.generation)
+    pickler.dump({"region_class": type(region).__name__,
+                  "entities": {class_name: table["uid"] for class_name, table in tables.items()}})
+    pickler.dump({"region": region.delta_state(),
+                  "entities": tables,
+                  "spawned": {"spawn_key": [entity.spawn_key for entity in spawned],
+                              "uid": [entity.uid for entity in spawned],
+                              "x": [entity.x for entity in spawned],
+                              "y": [entity.y for entity in spawned],
+                              "delta": [entity.delta_state() for entity in spawned]}})
+    return RegionSnapshot(SEEDED_RECORD_MAGIC, region.tile_width, region.tile_height,
+                          pack_explored(region.tiles, region.tile_width, region.tile_height), content.getvalue(),
+                          references=pickler.references)
+
+
+def write_snapshot(file, snapshot):
+    """
+    Write the record of a region from its snapshot
+    :param file: a binary file
+    :param snapshot: a RegionSnapshot
+    """
+    tile_data = zlib.compress(snapshot.tile_data)
+    file.write(RECORD_HEADER.pack(snapshot.magic, RECORD_VERSION, snapshot.width, snapshot.height, len(tile_data)))
+    file.write(tile_data)
+    file.write(snapshot.content)
+
+
+def write_region(file, region):
+    """
+    Write the record of a region
+    :param file: a binary file
+    :param region: the region to write
+    """
+    write_snapshot(file, snapshot_region(region))
+
+
+def read_region(file, world):
+    """
+    Read the record of a region, upgrading it if it was written with an older version of the schema
+    :param file: a binary file, positioned at the start of the record
+    :param world: the world, to resolve the references to the other regions
+    :return: the region
+    """
+    magic, version, width, height, tile_size = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+    if magic not in (RECORD_MAGIC, SEEDED_RECORD_MAGIC) or not 1 <= version <= RECORD_VERSION:
+        raise pickle.UnpicklingError("Not a region record (or unsupported version {})".format(version))
+    tile_data = zlib.decompress(file.read(tile_size))
+    unpickler = RecordUnpickler(file, world)
+    if magic == SEEDED_RECORD_MAGIC:
+        kind = SEEDED
+        region = RegionFactory.regenerate(unpickler.load())
+        unpack_explored(tile_data, region.tiles)
+        unpickler.spawned = {entity.spawn_key: entity for entity in region.region_entities}
+    else:
+        kind = FULL
+        region = None  # Created from the record, which knows its class
+
+    if version == 1:
+        region, record = _read_tables_v1(unpickler, region)
+    else:
+        region, record = _read_tables(unpickler, region)
+    record["kind"] = kind
+    schema.migrate(record, version)
+
+    for table in record["entities"].values():
+        columns = list(table)
+        for values in zip(*table.values()):
+            state = {column: value for column, value in zip(columns, values) if value is not MISSING}
+            unpickler.local[state["uid"]].__setstate__(state)
+    if kind == FULL:
+        region.__setstate__(record["region"])
+        region.tiles = unpack_tiles(tile_data, width, height)
+        region.region_entities = set(unpickler.local.values())
+    else:
+        _apply_seeded_record(region, record, unpickler)
+    return region
+
+
+def _read_tables(unpickler, region):
+    """
+    Read the list of the entities, create them empty, then read the tables
+    :param region: the region, None to create it (full record)
+    :return: the region and the record (see save.schema)
+    """
+    entities = unpickler.load()
+    if region is None:
+        region_class = schema.region_class(entities["region_class"])
+        region = region_class.__new__(region_class)
+    unpickler.region = region
+    unpickler.world.loading(region)
+    for class_name, uids in entities["entities"].items():
+        entity_class = schema.entity_class(class_name)
+        for uid in uids:
+            unpickler.local[uid] = entity_class.__new__(entity_class)
+    record = unpickler.load()
+    record["region_class"] = entities["region_class"]
+    return region, record
+
+
+def _read_tables_v1(unpickler, region):
+    """
+    Read a record of version 1, where the entities were pickled as objects, and turn it into tables
+    """
+    if region is None:
+        region_class = unpickler.load()
+        region = region_class.__new__(region_class)
+        unpickler.region = region
+        unpickler.world.loading(region)
+        entities, state = unpickler.load()
+        spawned = None
+    else:
+        unpickler.region = region
+        unpickler.world.loading(region)
+        spawned_entities, entities, state = unpickler.load()
+        spawn_keys = sorted(spawned_entities)
+        spawned = {"spawn_key": spawn_keys}
+        for index, column in enumerate(("uid", "x", "y", "delta")):
+            spawned[column] = [spawned_entities[spawn_key][index] for spawn_key in spawn_keys]
+    for entity in entities:
+        unpickler.local[entity.uid] = entity
+    return region, {"region_class": type(region).__name__, "region": state, "entities": entity_tables(entities),
+                    "spawned": spawned}
+
+
+def _apply_seeded_record(region, record, unpickler):
+    """
+    Apply the changes saved in a seeded record to the region generated again
+    """
+    spawned = record["spawned"]
+    kept = set(spawned["spawn_key"])
+    for spawn_key, entity in unpickler.spawned.items():
+        if spawn_key not in kept:
+            entity.remove_entity_from_region(region)
+    for spawn_key, uid, x, y, entity_state in zip(spawned["spawn_key"], spawned["uid"], spawned["x"], spawned["y"],
+                                                   spawned["delta"]):
+        entity = unpickler.spawned[spawn_key]
+        entity.uid = uid
+        if entity.pos != (x, y):
+            (entity.x, entity.y) = (x, y)
+            entity.position_changed()
+        entity.apply_delta_state(entity_state)
+    for entity in unpickler.local.values():
+        entity.assign_entity_to_region(region)
+    region.apply_delta_state(record["region"])
@@ -0,0 +1,303 @@
+import contextlib
+import gc
+import io
+import os
+import pickle
+import time
+
+from entity.gameentity import GameEntity
+from region.world import World
+from save.regionrecord import RecordPickler, RecordUnpickler, SEEDED_RECORD_MAGIC, read_region, snapshot_region, \
+    write_snapshot
+from shared import GLOBAL
+
+"""
+Save and load of a game.
+A save is a directory, with an index (player, current region, list of the regions) and one record per region.
+"""
+
+SAVE_DIRECTORY = "savegames"
+INDEX_FILE = "index.sav"
+SAVE_VERSION = 4
+
+
+class GameSnapshot:
+    """
+    Everything a save writes, taken at a given time: the index, the player and the regions to rewrite.
+    It shares nothing with the live game, so it can be written from another thread.
+    """
+
+    def __init__(self, header, player, regions):
+        """
+        :param header: the header of the index
+        :param player: the pickled player
+        :param regions: dictionary file name -> RegionSnapshot (or the record itself, as bytes), the region records
+        to write
+        """
+        self.header = header
+        self.player = player
+        self.regions = regions
+
+
+class RecordLoader:
+    """
+    Load a region from its record in a save directory. Given to the world (see World.add_pending), which calls it
+    when the region is first accessed.
+    """
+
+    def __init__(self, save, file_name, world):
+        """
+        :param save: the SaveGame of the directory
+        :param file_name: the name of the record
+        :param world: the world the region belongs to
+        """
+        self.save = save
+        self.file_name = file_name
+        self.world = world
+
+    def __call__(self):
+        return self.save._read_region(self.file_name, self.world)
+
+    def read_record(self):
+        """
+        :return: the record, as bytes: a region not loaded yet is copied as is to another save
+        """
+        with open(self.save._path(self.file_name), "rb") as f:
+            return f.read()
+
+
+class SaveGame:
+    """
+    Write and read a save directory.
+    The index remembers the version (see World) of each region record: saving again to the same directory only
+    rewrites the regions that changed since.
+    A save never overwrites a file the current index refers to: region records get new names, and the index is
+    replaced at once when everything is written. If the game stops in the middle of a save, the previous one is
+    intact.
+    """
+
+    def __init__(self, directory=SAVE_DIRECTORY, seeded=False):
+        """
+        :param directory: the save directory
+        :param seeded: if set, the regions made by the RegionFactory are saved as their seed and changes: the records
+        are much smaller, but loading a region generates it again (roads between the towns...), which is far slower
+        than reading a full record
+        """
+        self.directory = directory
+        self.seeded = seeded
+        self._header = None  # The header of the last save written or read in this directory
+
+    def _path(self, file_name):
+        return os.path.join(self.directory, file_name)
+
+    def exists(self):
+        return os.path.exists(self._path(INDEX_FILE))
+
+    def read_header(self):
+        """
+        :return: the first part of the index (everything but the player), None if there is no save
+        """
+        if not self.exists():
+            return None
+        with open(self._path(INDEX_FILE), "rb") as f:
+            return pickle.load(f)
+
+    @staticmethod
+    def most_recent(directories):
+        """
+        :param directories: the directories to look into
+        :return: the SaveGame of the most recent save found, None if there is none
+        """
+        found = None
+        saved_at = None
+        for directory in directories:
+            save = SaveGame(directory)
+            header = save.read_header()
+            if header is not None and header["version"] == SAVE_VERSION and \
+                    (saved_at is None or header["saved_at"] > saved_at):
+                found, saved_at = save, header["saved_at"]
+        return found
+
+    def save(self, game):
+        """
+        Save the game, writing only the regions that changed since the last save in this directory
+        :param game: the game to save
+        :return: the number of region records written
+        """
+        return self.write(self.snapshot(game))
+
+    def snapshot(self, game):
+        """
+        Take what needs to be written to save the game in this directory. Must be called between two turns.
+        :param game: the game to save
+        :return: a GameSnapshot, to give to write
+        """
+        if self._header is None:
+            self._header = self.read_header()
+        saved_regions = {}
+        references = {}  # region name -> the names of the regions its record refers to
+        next_file = 0
+        if self._header is not None and self._header["version"] == SAVE_VERSION and \
+                self._header["world_id"] == game.world.world_id:
+            saved_regions = self._header["regions"]
+            references = dict(self._header.get("references", {}))
+            next_file = self._header["next_file"]
+
+        # The current region changes all the time (entities moving, tiles explored...)
+        game.world.mark_dirty(game.current_region.name)
+
+        regions = {}
+        snapshots = {}
+        for name in game.world:
+            version = game.world.version(name)
+            if name in saved_regions:
+                file_name, saved_version = saved_regions[name]
+                if saved_version == version and os.path.exists(self._path(file_name)):
+                    regions[name] = (file_name, version)
+                    continue
+            file_name = "region_{}.sav".format(next_file)
+            next_file += 1
+            loader = game.world.pending_loader(name)
+            if isinstance(loader, RecordLoader):
+                snapshots[file_name] = loader.read_record()  # Not loaded, so unchanged since it was saved
+            else:
+                snapshots[file_name] = snapshot_region(game.world[name], seeded=self.seeded)
+                references[name] = snapshots[file_name].references
+            regions[name] = (file_name, version)
+        player = io.BytesIO()
+        player_pickler = RecordPickler(player)
+        player_pickler.dump(game.player)
+        if self.seeded:
+            next_file = self._first_regions_as_full(game, {game.current_region.name} | player_pickler.references,
+                                                    regions, snapshots, references, next_file)
+
+        header = {"version": SAVE_VERSION,
+                  "world_id": game.world.world_id,
+                  "regions": regions,
+                  "references": {name: references[name] for name in regions if name in references},
+                  "current_region": game.current_region.name,
+                  "next_uid": GameEntity.UID_COUNTER,
+                  "next_file": next_file,
+                  "saved_at": time.time()}
+        return GameSnapshot(header, player.getvalue(), snapshots)
+
+    def _first_regions_as_full(self, game, first_regions, regions, snapshots, references, next_file):
+        """
+        The regions read before the first frame (the current region, the regions the player refers to, and the
+        regions they refer to, see load) are saved as full records, even in a seeded save: generating them again would
+        delay the first frame.
+        :param first_regions: the names of the current region and of the regions the player refers to
+        :param regions: name -> (file name, version), of all the regions
+        :param snapshots: file name -> snapshot, of the records to write
+        :param references: name -> the names of the regions its record refers to
+        :param next_file: the number of the next record file
+        :return: the number of the next record file
+        """
+        checked = set()
+        to_check = list(first_regions)
+        while to_check:
+            name = to_check.pop()
+            if name in checked or name not in regions:
+                continue
+            checked.add(name)
+            file_name, version = regions[name]
+            if self._record_magic(file_name, snapshots) == SEEDED_RECORD_MAGIC:
+                snapshot = snapshot_region(game.world[name])
+                if file_name not in snapshots:
+                    # The seeded record is in the current save, which must not be overwritten: a new file
+                    file_name = "region_{}.sav".format(next_file)
+                    next_file += 1
+                    regions[name] = (file_name, version)
+                snapshots[file_name] = snapshot
+                references[name] = snapshot.references
+            to_check.extend(references.get(name, ()))
+        return next_file
+
+    def _record_magic(self, file_name, snapshots):
+        """
+        :return: the kind of a record (RECORD_MAGIC or SEEDED_RECORD_MAGIC), to write or already written
+        """
+        snapshot = snapshots.get(file_name)
+        if snapshot is None:
+            with open(self._path(file_name), "rb") as f:
+                return f.read(len(SEEDED_RECORD_MAGIC))
+        if isinstance(snapshot, bytes):
+            return snapshot[:len(SEEDED_RECORD_MAGIC)]
+        return snapshot.magic
+
+    def write(self, snapshot):
+        """
+        Write a snapshot taken by this SaveGame. Can be called from another thread.
+        :param snapshot: the GameSnapshot
+        :return: the number of region records written
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for file_name, region_snapshot in snapshot.regions.items():
+            with self._open_atomic(file_name) as f:
+                if isinstance(region_snapshot, bytes):
+                    f.write(region_snapshot)
+                else:
+                    write_snapshot(f, region_snapshot)
+        with self._open_atomic(INDEX_FILE) as f:
+            pickle.dump(snapshot.header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.write(snapshot.player)
+        self._header = snapshot.header
+
+        # Records no longer in the index: older versions of the regions, or left by an interrupted save
+        kept_files = {file_name for (file_name, version) in snapshot.header["regions"].values()}
+        for file_name in os.listdir(self.directory):
+            if file_name.startswith("region_") and file_name not in kept_files:
+                os.remove(self._path(file_name))
+
+        GLOBAL.logger.debug("Saved {} region(s) out of {} in {}".format(
+            len(snapshot.regions), len(snapshot.header["regions"]), self.directory))
+        return len(snapshot.regions)
+
+    @contextlib.contextmanager
+    def _open_atomic(self, file_name):
+        """
+        Open a file to write: it is written under a temporary name and only takes its real name once complete
+        :param file_name: the name of the file
+        """
+        temporary_path = self._path(file_name + ".tmp")
+        with open(temporary_path, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self._path(file_name))
+
+    def _read_region(self, file_name, world):
+        # Reading a region creates a lot of objects (tiles...) and nothing to collect: the collector would only
+        # slow it down
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(self._path(file_name), "rb") as f:
+                return read_region(f, world)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def load(self, game):
+        """
+        Load the save into the game: world, player and current region.
+        Only the current region (and the regions it refers to) is read now: the others are read from the save when
+        first accessed.
+        :param game: the game to fill
+        :return: Nothing
+        """
+        assert self.exists(), "No save found in {}".format(self.directory)
+        with open(self._path(INDEX_FILE), "rb") as f:
+            header = pickle.load(f)
+            self._header = header
+            assert header["version"] == SAVE_VERSION, "Unsupported save version {}".format(header["version"])
+
+            world = World(world_id=header["world_id"])
+            for name, (file_name, version) in header["regions"].items():
+                world.add_pending(name, RecordLoader(self, file_name, world), version)
+            GameEntity.UID_COUNTER = max(GameEntity.UID_COUNTER, header["next_uid"])
+            game.world = world
+            game.player = RecordUnpickler(f, world).load()
+
+        game.current_region = world[header["current_region"]]
+        game.invalidate_fog_of_war = True
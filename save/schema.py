@@ -0,0 +1,126 @@
+from entity.gameentity import GameEntity
+from region.region import Region
+
+# All the entity classes must be known to find them by name
+import entity.building_deco
+import entity.door
+import entity.livingentities
+import entity.player
+import entity.town
+
+"""
+Schema of the region records: version, classes by name, and the migrations from one version to the next.
+A record is read as a dictionary of tables before anything is built from it, so that the data of an older version
+can be upgraded first, table by table:
+- "kind": FULL or SEEDED
+- "region_class": the name of the class of the region
+- "region": the state of the region (the changes since the generation for a seeded record)
+- "entities": the entities, one table per class name: {column: [values]}, one column per attribute plus "uid".
+  MISSING marks an attribute the entity did not have.
+- "spawned": for a seeded record, the generated entities still in the region, as one table with the columns
+  spawn_key, uid, x, y and delta (see GameEntity.delta_state). None for a full record.
+"""
+
+SCHEMA_VERSION = 2
+
+FULL = "full"
+SEEDED = "seeded"
+
+# Classes renamed since a save was written: old name -> new name
+RENAMED_CLASSES = {}
+
+# Version -> function upgrading a record of this version to the next one
+MIGRATIONS = {}
+
+
+class Missing:
+    """
+    Type of MISSING: the value of a column for an entity without this attribute
+    """
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = Missing()
+
+
+def _subclasses(base):
+    classes = {base.__name__: base}
+    for subclass in base.__subclasses__():
+        for name, klass in _subclasses(subclass).items():
+            assert classes.get(name, klass) is klass, "Two classes named {} in the save schema".format(name)
+            classes[name] = klass
+    return classes
+
+
+def entity_class(name):
+    """
+    :param name: the name of the class, as saved
+    :return: the entity class
+    """
+    return _subclasses(GameEntity)[RENAMED_CLASSES.get(name, name)]
+
+
+def region_class(name):
+    """
+    :param name: the name of the class, as saved
+    :return: the region class
+    """
+    return _subclasses(Region)[RENAMED_CLASSES.get(name, name)]
+
+
+def migration(version):
+    """
+    Register a migration: decorate a function upgrading a record (dictionary of tables, see above) of the given
+    version to the next one, in place
+    :param version: the version upgraded by the function
+    """
+    def register(function):
+        assert version not in MIGRATIONS, "Migration from version {} already defined".format(version)
+        MIGRATIONS[version] = function
+        return function
+    return register
+
+
+def migrate(record, version):
+    """
+    Upgrade a record to the current version
+    :param record: the record, as a dictionary of tables
+    :param version: the version it was written with
+    """
+    while version < SCHEMA_VERSION:
+        MIGRATIONS[version](record)
+        version += 1
+
+
+def add_column(record, class_name, column, default):
+    """
+    Add a column with the same value for all the entities of a class
+    """
+    table = record["entities"].get(class_name)
+    if table is not None and column not in table:
+        table[column] = [default] * len(table["uid"])
+
+
+def rename_column(record, class_name, column, new_column):
+    table = record["entities"].get(class_name)
+    if table is not None and column in table:
+        table[new_column] = table.pop(column)
+
+
+@migration(1)
+def tileset_attributes(record):
+    """
+    Version 2: the tileset variants of a region are regular attributes (initial_seed and carpet_serie, set when the
+    region is generated), instead of save_initial_seed and save_carpet, created on first display if missing.
+    """
+    region = record["region"]
+    for old_name, new_name in (("save_initial_seed", "initial_seed"), ("save_carpet", "carpet_serie")):
+        if old_name in region:
+            region[new_name] = region.pop(old_name)
+    if record["kind"] == FULL:
+        # Never displayed: the default variants (a seeded region is generated with its own)
+        region.setdefault("initial_seed", 1)
+        if record["region_class"] == "TownRegion":
+            region.setdefault("carpet_serie", 13)
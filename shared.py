@@ -9,10 +9,13 @@ class Global:
     def __init__(self):
         self._global_ticker = None  # Each region will have its own local ticker as well...
         self._global_bus = None
+        self._stats = None  # The numerical stats of all the entities, see utilities.StatStore
         self._log_message = True
         self._logger = utilities.Logger()
         self._images = {}
         self._fonts = {}
+        self._text_measures = {}
+        self._text_surfaces = utilities.SurfaceCache()
         self.game = None
 
     @property
@@ -30,6 +33,12 @@ class Global:
             print("Ticker initialized")
         return self._global_ticker
 
+    @property
+    def stats(self):
+        if self._stats is None:
+            self._stats = utilities.StatStore()
+        return self._stats
+
     @property
     def logger(self):
         if self._log_message:
@@ -46,14 +55,6 @@ class Global:
             pass
             # self._fonts = utilities.load_all_fonts()
 
-    def clean_before_save(self):
-        """
-        Clean the dictionary
-        This is mandatory before saving to a file
-        :return:
-        """
-        self._images = None
-
     def img(self, image_key):
         if image_key not in self._images:
             self.logger.error("Key [" + image_key + "] not in image dictionary")
@@ -70,5 +71,31 @@ class Global:
             self._fonts[key] = pg.font.Font(os.path.join(FONT_FOLDER, font_key), size)
         return self._fonts[key]
 
+    def text(self, font_key, size, text, color, antialias=True):
+        """
+        Render a text, or give the surface already rendered for the same text, font and colour.
+        The surface is shared: it must only be blitted.
+        :param font_key: the font file name, as for font
+        :param size: the font size
+        :param text: the text to render
+        :param color: the colour of the text
+        :param antialias: True to render with antialiasing
+        :return: the surface
+        """
+        key = (font_key, size, text, tuple(color), antialias)
+        surface = self._text_surfaces.get(key)
+        if surface is None:
+            surface = self._text_surfaces.put(key, self.font(font_key, size).render(text, antialias, color))
+        return surface
+
+    def text_measure(self, font_key, size):
+        """
+        :return: the utilities.TextMeasure of the font, shared by all the widgets using it
+        """
+        key = (font_key, size)
+        if key not in self._text_measures:
+            self._text_measures[key] = utilities.TextMeasure(self.font(font_key, size))
+        return self._text_measures[key]
+
 
-GLOBAL = Global()
\ No newline at end of file
+GLOBAL = Global()
@@ -0,0 +1,41 @@
+import pytest
+
+from benchmark.save_roundtrip import check_identical, create_game, init_headless
+import main as game_main
+from save.regionrecord import RECORD_MAGIC, SEEDED_RECORD_MAGIC
+from save.savegame import SaveGame
+
+"""
+Save a generated world and load it back, in both record formats: the loaded world must be identical.
+"""
+
+
+@pytest.fixture(scope="module")
+def game():
+    init_headless()
+    return create_game(3, town_count=2)
+
+
+@pytest.mark.parametrize("seeded", (False, True), ids=("records", "seeded"))
+def test_round_trip(game, tmp_path, seeded):
+    save = SaveGame(str(tmp_path), seeded=seeded)
+    save.save(game)
+
+    loaded = game_main.Game()
+    loaded.post_init()
+    SaveGame(str(tmp_path), seeded=seeded).load(loaded)
+    check_identical(game, loaded)
+
+
+@pytest.mark.parametrize("seeded", (False, True), ids=("records", "seeded"))
+def test_record_format(game, tmp_path, seeded):
+    save = SaveGame(str(tmp_path), seeded=seeded)
+    save.save(game)
+
+    magics = set()
+    for region_file in tmp_path.glob("region_*.sav"):
+        with open(str(region_file), "rb") as f:
+            magics.add(f.read(4))
+    # The current region is always a full record, so that the game starts without generating anything
+    assert RECORD_MAGIC in magics
+    assert (SEEDED_RECORD_MAGIC in magics) == seeded
@@ -1,4 +1,6 @@
 import pygame as pg
+from array import array
+from collections import OrderedDict
 from default import *
 import random as rd
 
@@ -33,15 +35,34 @@ class Ticker(object):
     def _advance_ticks(self, interval):
         for i in range(interval):
             things_to_do = self.schedule.pop(self.ticks, [])
+            # Consecutive objects whose class defines a take_group_turn play together, in a single call: the objects
+            # still play in the order they were scheduled
+            group, take_group_turn = [], None
             for obj in things_to_do:
                 if obj is not None:
-                    obj.take_turn()
+                    obj_group_turn = getattr(type(obj), "take_group_turn", None)
+                    if group and obj_group_turn != take_group_turn:
+                        take_group_turn(group, self)
+                        group = []
+                    take_group_turn = obj_group_turn
+                    if take_group_turn is None:
+                        obj.take_turn()
+                    else:
+                        group.append(obj)
+            if group:
+                take_group_turn(group, self)
             self.ticks += 1
 
     def advance_ticks(self):
+        """
+        Play the ticks used by the last action of the player
+        :return: True if a turn was played (the player acted)
+        """
         if self.ticks_to_advance > 0:
             self._advance_ticks(self.ticks_to_advance)
             self.ticks_to_advance = 0
+            return True
+        return False
 
     def unregister(self, obj):
         if obj is not None:
@@ -50,6 +71,75 @@ class Ticker(object):
                     self.schedule[key].remove(obj)
 
 
+class StatStore(object):
+    """
+    Numerical stats of the entities (attack, money, age...), stored by column in contiguous arrays.
+    Each entity holding stats owns a row (its stat id), and reads/writes its values through StatField descriptors.
+    Operations on a whole column (sum, add) can be done here, without touching the entities.
+    """
+
+    COLUMNS = ("attack", "protection", "wage_base", "strength", "friendship", "money", "food_level", "age",
+               "charisma", "erudition")
+
+    def __init__(self):
+        self.columns = {column: array('l') for column in StatStore.COLUMNS}
+        self._free_ids = []
+
+    def __len__(self):
+        return len(self.columns[StatStore.COLUMNS[0]]) - len(self._free_ids)
+
+    def allocate(self):
+        """
+        Reserve a row, all values set to 0
+        :return: the stat id
+        """
+        if self._free_ids:
+            stat_id = self._free_ids.pop()
+            for column in self.columns.values():
+                column[stat_id] = 0
+            return stat_id
+        for column in self.columns.values():
+            column.append(0)
+        return len(self.columns[StatStore.COLUMNS[0]]) - 1
+
+    def release(self, stat_id):
+        """
+        Free a row so that it can be reused. The values are reset when it is allocated again.
+        :param stat_id: the id of the row
+        """
+        self._free_ids.append(stat_id)
+
+    def get(self, column, stat_id):
+        return self.columns[column][stat_id]
+
+    def set(self, column, stat_id, value):
+        self.columns[column][stat_id] = value
+
+    def sum(self, column, stat_ids):
+        """
+        :param column: the stat to sum
+        :param stat_ids: the rows to consider
+        :return: the sum of the stat for the given rows
+        """
+        values = self.columns[column]
+        return sum(values[stat_id] for stat_id in stat_ids)
+
+    def add(self, column, delta, stat_ids=None):
+        """
+        Add a value to a stat, for the given rows or for all the rows.
+        Free rows are reset when they are allocated again, so they can be updated like the others.
+        :param column: the stat to update
+        :param delta: the value to add (may be negative)
+        :param stat_ids: the rows to update, None for all of them
+        """
+        values = self.columns[column]
+        if stat_ids is None:
+            self.columns[column] = array('l', [value + delta for value in values])
+        else:
+            for stat_id in stat_ids:
+                values[stat_id] += delta
+
+
 class Publisher(object):
     """
     Dispatch messages
@@ -540,118 +630,24 @@ class MName:
 
 
 class FieldOfView:
-    RAYS = 360  # Should be 360!
-
-    STEP = 3  # The step of for cycle. More = Faster, but large steps may
-    # cause artifacts. Step 3 is great for radius 10.
+    """
+    Symmetric shadowcasting (see Albert Ford, "Symmetric Shadowcasting").
+    Each of the four quadrants around the entity is scanned row by row; the rows are cut by the walls into
+    visible spans, bounded by slopes which are kept as integer fractions (numerator, denominator) so that the
+    result is exact. A floor tile is visible from the origin if and only if the origin is visible from it.
+    Only the tiles in the radius are looked at: their opacity is copied once into a scratch buffer, reused
+    between the calls.
+    """
 
     RAD = 5  # FOV radius.
 
-    # Tables of precalculated values of sin(x / (180 / pi)) and cos(x / (180 / pi))
-
-    SINTABLE = [
-        0.00000, 0.01745, 0.03490, 0.05234, 0.06976, 0.08716, 0.10453,
-        0.12187, 0.13917, 0.15643, 0.17365, 0.19081, 0.20791, 0.22495, 0.24192,
-        0.25882, 0.27564, 0.29237, 0.30902, 0.32557, 0.34202, 0.35837, 0.37461,
-        0.39073, 0.40674, 0.42262, 0.43837, 0.45399, 0.46947, 0.48481, 0.50000,
-        0.51504, 0.52992, 0.54464, 0.55919, 0.57358, 0.58779, 0.60182, 0.61566,
-        0.62932, 0.64279, 0.65606, 0.66913, 0.68200, 0.69466, 0.70711, 0.71934,
-        0.73135, 0.74314, 0.75471, 0.76604, 0.77715, 0.78801, 0.79864, 0.80902,
-        0.81915, 0.82904, 0.83867, 0.84805, 0.85717, 0.86603, 0.87462, 0.88295,
-        0.89101, 0.89879, 0.90631, 0.91355, 0.92050, 0.92718, 0.93358, 0.93969,
-        0.94552, 0.95106, 0.95630, 0.96126, 0.96593, 0.97030, 0.97437, 0.97815,
-        0.98163, 0.98481, 0.98769, 0.99027, 0.99255, 0.99452, 0.99619, 0.99756,
-        0.99863, 0.99939, 0.99985, 1.00000, 0.99985, 0.99939, 0.99863, 0.99756,
-        0.99619, 0.99452, 0.99255, 0.99027, 0.98769, 0.98481, 0.98163, 0.97815,
-        0.97437, 0.97030, 0.96593, 0.96126, 0.95630, 0.95106, 0.94552, 0.93969,
-        0.93358, 0.92718, 0.92050, 0.91355, 0.90631, 0.89879, 0.89101, 0.88295,
-        0.87462, 0.86603, 0.85717, 0.84805, 0.83867, 0.82904, 0.81915, 0.80902,
-        0.79864, 0.78801, 0.77715, 0.76604, 0.75471, 0.74314, 0.73135, 0.71934,
-        0.70711, 0.69466, 0.68200, 0.66913, 0.65606, 0.64279, 0.62932, 0.61566,
-        0.60182, 0.58779, 0.57358, 0.55919, 0.54464, 0.52992, 0.51504, 0.50000,
-        0.48481, 0.46947, 0.45399, 0.43837, 0.42262, 0.40674, 0.39073, 0.37461,
-        0.35837, 0.34202, 0.32557, 0.30902, 0.29237, 0.27564, 0.25882, 0.24192,
-        0.22495, 0.20791, 0.19081, 0.17365, 0.15643, 0.13917, 0.12187, 0.10453,
-        0.08716, 0.06976, 0.05234, 0.03490, 0.01745, 0.00000, -0.01745, -0.03490,
-        -0.05234, -0.06976, -0.08716, -0.10453, -0.12187, -0.13917, -0.15643,
-        -0.17365, -0.19081, -0.20791, -0.22495, -0.24192, -0.25882, -0.27564,
-        -0.29237, -0.30902, -0.32557, -0.34202, -0.35837, -0.37461, -0.39073,
-        -0.40674, -0.42262, -0.43837, -0.45399, -0.46947, -0.48481, -0.50000,
-        -0.51504, -0.52992, -0.54464, -0.55919, -0.57358, -0.58779, -0.60182,
-        -0.61566, -0.62932, -0.64279, -0.65606, -0.66913, -0.68200, -0.69466,
-        -0.70711, -0.71934, -0.73135, -0.74314, -0.75471, -0.76604, -0.77715,
-        -0.78801, -0.79864, -0.80902, -0.81915, -0.82904, -0.83867, -0.84805,
-        -0.85717, -0.86603, -0.87462, -0.88295, -0.89101, -0.89879, -0.90631,
-        -0.91355, -0.92050, -0.92718, -0.93358, -0.93969, -0.94552, -0.95106,
-        -0.95630, -0.96126, -0.96593, -0.97030, -0.97437, -0.97815, -0.98163,
-        -0.98481, -0.98769, -0.99027, -0.99255, -0.99452, -0.99619, -0.99756,
-        -0.99863, -0.99939, -0.99985, -1.00000, -0.99985, -0.99939, -0.99863,
-        -0.99756, -0.99619, -0.99452, -0.99255, -0.99027, -0.98769, -0.98481,
-        -0.98163, -0.97815, -0.97437, -0.97030, -0.96593, -0.96126, -0.95630,
-        -0.95106, -0.94552, -0.93969, -0.93358, -0.92718, -0.92050, -0.91355,
-        -0.90631, -0.89879, -0.89101, -0.88295, -0.87462, -0.86603, -0.85717,
-        -0.84805, -0.83867, -0.82904, -0.81915, -0.80902, -0.79864, -0.78801,
-        -0.77715, -0.76604, -0.75471, -0.74314, -0.73135, -0.71934, -0.70711,
-        -0.69466, -0.68200, -0.66913, -0.65606, -0.64279, -0.62932, -0.61566,
-        -0.60182, -0.58779, -0.57358, -0.55919, -0.54464, -0.52992, -0.51504,
-        -0.50000, -0.48481, -0.46947, -0.45399, -0.43837, -0.42262, -0.40674,
-        -0.39073, -0.37461, -0.35837, -0.34202, -0.32557, -0.30902, -0.29237,
-        -0.27564, -0.25882, -0.24192, -0.22495, -0.20791, -0.19081, -0.17365,
-        -0.15643, -0.13917, -0.12187, -0.10453, -0.08716, -0.06976, -0.05234,
-        -0.03490, -0.01745, -0.00000
-    ]
-
-    COSTABLE = [
-        1.00000, 0.99985, 0.99939, 0.99863, 0.99756, 0.99619, 0.99452,
-        0.99255, 0.99027, 0.98769, 0.98481, 0.98163, 0.97815, 0.97437, 0.97030,
-        0.96593, 0.96126, 0.95630, 0.95106, 0.94552, 0.93969, 0.93358, 0.92718,
-        0.92050, 0.91355, 0.90631, 0.89879, 0.89101, 0.88295, 0.87462, 0.86603,
-        0.85717, 0.84805, 0.83867, 0.82904, 0.81915, 0.80902, 0.79864, 0.78801,
-        0.77715, 0.76604, 0.75471, 0.74314, 0.73135, 0.71934, 0.70711, 0.69466,
-        0.68200, 0.66913, 0.65606, 0.64279, 0.62932, 0.61566, 0.60182, 0.58779,
-        0.57358, 0.55919, 0.54464, 0.52992, 0.51504, 0.50000, 0.48481, 0.46947,
-        0.45399, 0.43837, 0.42262, 0.40674, 0.39073, 0.37461, 0.35837, 0.34202,
-        0.32557, 0.30902, 0.29237, 0.27564, 0.25882, 0.24192, 0.22495, 0.20791,
-        0.19081, 0.17365, 0.15643, 0.13917, 0.12187, 0.10453, 0.08716, 0.06976,
-        0.05234, 0.03490, 0.01745, 0.00000, -0.01745, -0.03490, -0.05234, -0.06976,
-        -0.08716, -0.10453, -0.12187, -0.13917, -0.15643, -0.17365, -0.19081,
-        -0.20791, -0.22495, -0.24192, -0.25882, -0.27564, -0.29237, -0.30902,
-        -0.32557, -0.34202, -0.35837, -0.37461, -0.39073, -0.40674, -0.42262,
-        -0.43837, -0.45399, -0.46947, -0.48481, -0.50000, -0.51504, -0.52992,
-        -0.54464, -0.55919, -0.57358, -0.58779, -0.60182, -0.61566, -0.62932,
-        -0.64279, -0.65606, -0.66913, -0.68200, -0.69466, -0.70711, -0.71934,
-        -0.73135, -0.74314, -0.75471, -0.76604, -0.77715, -0.78801, -0.79864,
-        -0.80902, -0.81915, -0.82904, -0.83867, -0.84805, -0.85717, -0.86603,
-        -0.87462, -0.88295, -0.89101, -0.89879, -0.90631, -0.91355, -0.92050,
-        -0.92718, -0.93358, -0.93969, -0.94552, -0.95106, -0.95630, -0.96126,
-        -0.96593, -0.97030, -0.97437, -0.97815, -0.98163, -0.98481, -0.98769,
-        -0.99027, -0.99255, -0.99452, -0.99619, -0.99756, -0.99863, -0.99939,
-        -0.99985, -1.00000, -0.99985, -0.99939, -0.99863, -0.99756, -0.99619,
-        -0.99452, -0.99255, -0.99027, -0.98769, -0.98481, -0.98163, -0.97815,
-        -0.97437, -0.97030, -0.96593, -0.96126, -0.95630, -0.95106, -0.94552,
-        -0.93969, -0.93358, -0.92718, -0.92050, -0.91355, -0.90631, -0.89879,
-        -0.89101, -0.88295, -0.87462, -0.86603, -0.85717, -0.84805, -0.83867,
-        -0.82904, -0.81915, -0.80902, -0.79864, -0.78801, -0.77715, -0.76604,
-        -0.75471, -0.74314, -0.73135, -0.71934, -0.70711, -0.69466, -0.68200,
-        -0.66913, -0.65606, -0.64279, -0.62932, -0.61566, -0.60182, -0.58779,
-        -0.57358, -0.55919, -0.54464, -0.52992, -0.51504, -0.50000, -0.48481,
-        -0.46947, -0.45399, -0.43837, -0.42262, -0.40674, -0.39073, -0.37461,
-        -0.35837, -0.34202, -0.32557, -0.30902, -0.29237, -0.27564, -0.25882,
-        -0.24192, -0.22495, -0.20791, -0.19081, -0.17365, -0.15643, -0.13917,
-        -0.12187, -0.10453, -0.08716, -0.06976, -0.05234, -0.03490, -0.01745,
-        -0.00000, 0.01745, 0.03490, 0.05234, 0.06976, 0.08716, 0.10453, 0.12187,
-        0.13917, 0.15643, 0.17365, 0.19081, 0.20791, 0.22495, 0.24192, 0.25882,
-        0.27564, 0.29237, 0.30902, 0.32557, 0.34202, 0.35837, 0.37461, 0.39073,
-        0.40674, 0.42262, 0.43837, 0.45399, 0.46947, 0.48481, 0.50000, 0.51504,
-        0.52992, 0.54464, 0.55919, 0.57358, 0.58779, 0.60182, 0.61566, 0.62932,
-        0.64279, 0.65606, 0.66913, 0.68200, 0.69466, 0.70711, 0.71934, 0.73135,
-        0.74314, 0.75471, 0.76604, 0.77715, 0.78801, 0.79864, 0.80902, 0.81915,
-        0.82904, 0.83867, 0.84805, 0.85717, 0.86603, 0.87462, 0.88295, 0.89101,
-        0.89879, 0.90631, 0.91355, 0.92050, 0.92718, 0.93358, 0.93969, 0.94552,
-        0.95106, 0.95630, 0.96126, 0.96593, 0.97030, 0.97437, 0.97815, 0.98163,
-        0.98481, 0.98769, 0.99027, 0.99255, 0.99452, 0.99619, 0.99756, 0.99863,
-        0.99939, 0.99985, 1.00000
-    ]
+    # Transformations from (row, column) in a quadrant to (dx, dy) on the map: north, east, south, west
+    QUADRANTS = ((lambda row, col: (col, -row)),
+                 (lambda row, col: (row, col)),
+                 (lambda row, col: (col, row)),
+                 (lambda row, col: (-row, col)))
+
+    _opacity = bytearray()  # Scratch buffer: 1 for each tile of the radius box that blocks the view
 
     @staticmethod
     def get_vision_matrix_for(entity, region, radius=RAD, flag_explored=False, ignore_entity_at=None):
@@ -661,54 +657,232 @@ class FieldOfView:
         :param radius: the number of tiles the user can go throught
         :param flag_explored: any unexplored tile will become explored (good for player, but not NPC)
         :param ignore_entity_at: will ignore any entity at positions (like player) - this is a list
-        :return: the Field of view, with True for each tile that is visible
+        :return: the set of the visible positions (frozen, as it may be shared through the region cache)
+        """
+        if ignore_entity_at is not None:
+            visible = FieldOfView.compute(entity, region, radius=radius, ignore_entity_at=ignore_entity_at)
+            if flag_explored:
+                FieldOfView._flag_explored(region, visible)
+            return visible
+
+        key = region.fov_cache.key_for(entity, region, radius)
+        entry = region.fov_cache.get(key)
+        if entry is None:
+            entry = region.fov_cache.put(key, FieldOfView.compute(entity, region, radius=radius))
+        if flag_explored and not entry.explored_flagged:
+            # Seen from the same place with the same walls: no need to flag twice
+            FieldOfView._flag_explored(region, entry.visible)
+            entry.explored_flagged = True
+        return entry.visible
+
+    @staticmethod
+    def _flag_explored(region, visible):
+        for (x, y) in visible:
+            region.tiles[x][y].explored = True
+
+    @staticmethod
+    def compute(entity, region, radius=RAD, ignore_entity_at=None):
+        """
+        :return: the set of the positions visible from the entity position, within the radius
+        """
+        origin_x, origin_y = entity.pos
+        view_blocking_positions = region.view_blocking_positions
+        side = 2 * radius + 1
+        if len(FieldOfView._opacity) < side * side:
+            FieldOfView._opacity = bytearray(side * side)
+        opacity = FieldOfView._opacity
+        tiles = region.tiles
+        for dx in range(-radius, radius + 1):
+            x = origin_x + dx
+            index = (dx + radius) * side + radius
+            for dy in range(-radius, radius + 1):
+                y = origin_y + dy
+                if 0 <= x < region.tile_width and 0 <= y < region.tile_height:
+                    opacity[index + dy] = (tiles[x][y].block_view_for(entity) or (x, y) in view_blocking_positions) \
+                        and (ignore_entity_at is None or (x, y) not in ignore_entity_at)
+                else:
+                    opacity[index + dy] = 2  # Outside of the region: blocks, but is never visible
+
+        visible = {(origin_x, origin_y)}
+        max_distance = radius * radius + radius  # Gives a rounder shape than radius * radius
+        for transform in FieldOfView.QUADRANTS:
+            FieldOfView._scan_quadrant(transform, origin_x, origin_y, radius, max_distance, opacity, side, visible)
+        return visible
+
+    @staticmethod
+    def _scan_quadrant(transform, origin_x, origin_y, radius, max_distance, opacity, side, visible):
+        # Each row is (depth, start slope numerator, start slope denominator, end slope numerator, denominator)
+        rows = [(1, -1, 1, 1, 1)]
+        while rows:
+            depth, start_num, start_den, end_num, end_den = rows.pop()
+            if depth > radius:
+                continue
+            # Columns from round_ties_up(depth * start_slope) to round_ties_down(depth * end_slope)
+            min_col = (2 * depth * start_num + start_den) // (2 * start_den)
+            max_col = -((end_den - 2 * depth * end_num) // (2 * end_den))
+            previous_wall = None
+            for col in range(min_col, max_col + 1):
+                dx, dy = transform(depth, col)
+                tile_opacity = opacity[(dx + radius) * side + dy + radius]
+                is_wall = tile_opacity != 0
+                if tile_opacity != 2 and dx * dx + dy * dy <= max_distance:
+                    # Walls are always shown, floors only if the tile is seen symmetrically
+                    if is_wall or (col * start_den >= depth * start_num and col * end_den <= depth * end_num):
+                        visible.add((origin_x + dx, origin_y + dy))
+                if previous_wall is True and not is_wall:
+                    # Slope of the left edge of the tile: (2 * col - 1) / (2 * depth)
+                    start_num, start_den = 2 * col - 1, 2 * depth
+                if previous_wall is False and is_wall:
+                    rows.append((depth + 1, start_num, start_den, 2 * col - 1, 2 * depth))
+                previous_wall = is_wall
+            if previous_wall is False:
+                rows.append((depth + 1, start_num, start_den, end_num, end_den))
+
+
+class FieldOfViewCache(object):
+    """
+    The last fields of view computed on a region, least recently used dropped first.
+    A field of view only depends on the position, the radius, the view blocking rules of the entity and the opacity
+    of the tiles around: the opacity is summed up by the versions of the region chunks covering the radius, which
+    the region increments when something changes (a door opens...). Entries computed with an old version are simply
+    never found again, and leave the cache with time.
+    """
+
+    SIZE = 128
+
+    class Entry(object):
+        __slots__ = ("visible", "explored_flagged")
+
+        def __init__(self, visible):
+            self.visible = frozenset(visible)
+            self.explored_flagged = False
+
+    def __init__(self, size=SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def key_for(entity, region, radius):
+        x, y = entity.pos
+        blocking = None if entity.blocking_view_list is None else tuple(entity.blocking_view_list)
+        return x, y, radius, blocking, region.opacity_versions(x - radius, y - radius, x + radius, y + radius)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, visible):
+        entry = FieldOfViewCache.Entry(visible)
+        self._entries[key] = entry
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class TextMeasure(object):
+    """
+    Width of text in a given font, without rendering it: the width of each word (font.size, which creates no surface)
+    is kept, least recently used dropped first. Wrapping a text is then only additions on known widths.
+    """
+
+    SIZE = 4096
+
+    def __init__(self, font, size=SIZE):
         """
-        fov = [[False for y in range(region.tile_height)] for x in
-               range(region.tile_width)]
-
-        # It works like this:
-        # It starts at entity coordinates and cast 360 rays
-        # (if step is 1, less is step is more than 1) in every direction,
-        # until it hits a wall.
-        # When ray hits floor, it is set as visible.
-
-        # Ray is casted by adding to x (initialy it is player's x coord)
-        # value of sin(i degrees) and to y (player's y) value of cos(i degrees),
-        # RAD times, and checking for collision with wall every step.
-
-        # First: the entity itself is visible!
-        fov[entity.x][entity.y] = True  # Make tile visible
-        if flag_explored:
-            region.tiles[entity.x][entity.y].explored = True
-
-        for i in range(0, FieldOfView.RAYS + 1, FieldOfView.STEP):
-            ax = FieldOfView.SINTABLE[i]  # Get precalculated value sin(x / (180 / pi))
-            ay = FieldOfView.COSTABLE[i]  # cos(x / (180 / pi))
-
-            x = entity.x  # Entity x
-            y = entity.y  # Entity y
-
-            for z in range(radius):  # Cast the ray
-                x += ax
-                y += ay
-
-                round_x = int(round(x))
-                round_y = int(round(y))
-                if round_x < 0 or round_y < 0 or round_x > region.tile_width or \
-                        round_y > region.tile_height:  # Ray is out of range
-                    break
-
-                fov[round_x][round_y] = True  # Make tile visible
-                if flag_explored:
-                    region.tiles[round_x][round_y].explored = True
-                if ignore_entity_at is not None:
-                    if (round_x, round_y) not in ignore_entity_at and \
-                            region.tiles[round_x][round_y].block_view_for(entity):
-                        break
-                elif region.tiles[round_x][round_y].block_view_for(entity):  # Stop ray if it hit
-                    break
-
-        return fov
+        :param font: the pygame font
+        :param size: the maximum number of widths kept
+        """
+        self.font = font
+        self.size = size
+        self._widths = OrderedDict()
+
+    def __len__(self):
+        return len(self._widths)
+
+    def width(self, text):
+        """
+        :return: the width in pixels of the text, once rendered
+        """
+        width = self._widths.get(text)
+        if width is None:
+            width = self.font.size(text)[0]
+            self._widths[text] = width
+            if len(self._widths) > self.size:
+                self._widths.popitem(last=False)
+        else:
+            self._widths.move_to_end(text)
+        return width
+
+    def wrap(self, text, available_width, separator=" "):
+        """
+        Split a text into lines no wider than the available width, breaking on the separator
+        :return: the list of lines
+        """
+        separator_width = self.width(separator)
+        lines = []
+        current_line = ""
+        current_width = 0
+        for word in text.split(separator):
+            word_width = self.width(word)
+            if word_width > available_width:
+                raise Exception("Dimension too small for word! {}".format(word))
+            if current_width == 0:
+                current_line = word
+                current_width = word_width
+            elif current_width + separator_width + word_width <= available_width:
+                current_line = current_line + separator + word
+                current_width += separator_width + word_width
+            else:
+                lines.append(current_line)
+                current_line = word
+                current_width = word_width
+        if current_line != "":
+            lines.append(current_line)
+        return lines
+
+
+class SurfaceCache(object):
+    """
+    Surfaces drawn once and shared by all the widgets: rendered texts (see Global.text), backgrounds of the labels...
+    They are kept until the surfaces kept go over a size in bytes, least recently used dropped first.
+    The surfaces are shared: they must only be blitted, never drawn on.
+    """
+
+    MAX_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    @staticmethod
+    def surface_bytes(surface):
+        return surface.get_bytesize() * surface.get_width() * surface.get_height()
+
+    def get(self, key):
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+        return surface
+
+    def put(self, key, surface):
+        previous = self._surfaces.pop(key, None)
+        if previous is not None:
+            self.bytes -= SurfaceCache.surface_bytes(previous)
+        self._surfaces[key] = surface
+        self.bytes += SurfaceCache.surface_bytes(surface)
+        while self.bytes > self.max_bytes and len(self._surfaces) > 1:
+            _, dropped = self._surfaces.popitem(last=False)
+            self.bytes -= SurfaceCache.surface_bytes(dropped)
+        return surface
 
 
 # Graphical utilities